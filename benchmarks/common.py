@@ -0,0 +1,95 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database by default so they never
+touch the configured database. Set the ``DATABASE_*`` environment variables
+to benchmark against a (disposable) PostgreSQL database instead.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(database: str = None) -> dict:
+    """
+    Configure Django against a benchmark database and apply migrations.
+
+    Args:
+        database: SQLite file to use (default: a new temporary file). Ignored
+            when DATABASE_ENGINE is already set in the environment.
+
+    Returns:
+        The DATABASE_* environment variables, for passing to subprocesses.
+    """
+    sys.path.insert(0, PROJECT_ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_service.settings')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('DJANGO_LOG_LEVEL', 'WARNING')
+    if 'DATABASE_ENGINE' not in os.environ:
+        if database is None:
+            fd, database = tempfile.mkstemp(prefix='user-bench-', suffix='.sqlite3')
+            os.close(fd)
+        os.environ['DATABASE_ENGINE'] = 'django.db.backends.sqlite3'
+        os.environ['DATABASE_NAME'] = database
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    return {key: value for key, value in os.environ.items() if key.startswith('DATABASE_')}
+
+
+def seed_users(count: int, prefix: str = 'bench') -> list:
+    """
+    Insert ``count`` users with bulk_create and return their ids.
+
+    Every user shares one password hash so seeding does not spend its time
+    in PBKDF2.
+    """
+    from django.contrib.auth.hashers import make_password
+    from users.models import User
+
+    password = make_password('bench-password')
+    users = [
+        User(
+            id=uuid.uuid4(),
+            email=f'{prefix}{i}@example.com',
+            username=f'{prefix}{i}',
+            first_name='Bench',
+            last_name=f'User{i}',
+            password=password,
+            is_verified=i % 3 != 0,
+        )
+        for i in range(count)
+    ]
+    for user in users:
+        user.search_text = user.build_search_text()
+    User.objects.bulk_create(users, batch_size=1000)
+    return [str(user.id) for user in users]
+
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    """Return the ``pct`` percentile of already-sorted samples (nearest rank)."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """Summarize per-call latencies (seconds) into a result row in milliseconds."""
+    samples = sorted(latencies)
+    return {
+        'calls': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p90_ms': round(percentile(samples, 90) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0,
+    }
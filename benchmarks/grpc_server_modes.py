@@ -0,0 +1,135 @@
+"""
+Side-by-side benchmark of the threaded and asyncio gRPC servers.
+
+Seeds a benchmark database, starts ``manage.py rungrpc`` and
+``manage.py rungrpc --async`` in turn as subprocesses with the same number
+of worker threads, and drives each with the same number of concurrent
+in-flight RPCs from an asyncio client.
+
+Usage:
+    python benchmarks/grpc_server_modes.py
+    python benchmarks/grpc_server_modes.py --rpc ListUsers --concurrency 500 --requests 20000
+    python benchmarks/grpc_server_modes.py --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import PROJECT_ROOT, seed_users, setup_django, summarize
+
+
+def free_port() -> int:
+    """Return a TCP port that is currently free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int, workers: int, db_env: dict, cache: bool) -> subprocess.Popen:
+    """Start ``rungrpc`` in the given mode as a subprocess."""
+    command = [sys.executable, 'manage.py', 'rungrpc', '--port', str(port), '--workers', str(workers)]
+    if mode == 'async':
+        command.append('--async')
+    env = dict(os.environ, **db_env)
+    if not cache:
+        env['USER_CACHE_MAX_ENTRIES'] = '0'
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def build_request(rpc: str, user_ids: list):
+    """Return a request factory for ``rpc``."""
+    from users.grpc_generated.proto.user.v1 import user_pb2
+    from users.grpc_generated.proto.common.v1 import common_pb2
+
+    if rpc == 'GetUser':
+        return lambda: user_pb2.GetUserRequest(user_id=random.choice(user_ids))
+    if rpc == 'BatchGetUsers':
+        return lambda: user_pb2.BatchGetUsersRequest(user_ids=random.sample(user_ids, 50))
+    if rpc == 'ListUsers':
+        return lambda: user_pb2.ListUsersRequest(pagination=common_pb2.PaginationRequest(page_size=20))
+    raise ValueError(f'Unsupported RPC: {rpc}')
+
+
+async def drive(port: int, rpc: str, make_request, concurrency: int, requests: int) -> dict:
+    """Issue ``requests`` calls with ``concurrency`` in flight and summarize latencies."""
+    import grpc
+    from users.grpc_generated.proto.user.v1 import user_pb2_grpc
+
+    async with grpc.aio.insecure_channel(f'127.0.0.1:{port}') as channel:
+        await asyncio.wait_for(channel.channel_ready(), timeout=30)
+        method = getattr(user_pb2_grpc.UserServiceStub(channel), rpc)
+
+        # Warm up connections, caches and the server's thread pool
+        await asyncio.gather(*(method(make_request()) for _ in range(min(concurrency, 100))))
+
+        latencies = []
+        errors = 0
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    await method(make_request())
+                except grpc.aio.AioRpcError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark threaded vs asyncio gRPC servers')
+    parser.add_argument('--rpc', default='GetUser', choices=['GetUser', 'BatchGetUsers', 'ListUsers'])
+    parser.add_argument('--users', type=int, default=5000, help='Users to seed (default: 5000)')
+    parser.add_argument('--workers', type=int, default=10, help='Server worker threads (default: 10)')
+    parser.add_argument('--concurrency', type=int, default=200, help='RPCs in flight (default: 200)')
+    parser.add_argument('--requests', type=int, default=5000, help='Measured calls per mode (default: 5000)')
+    parser.add_argument('--cache', action='store_true', help='Leave the user cache enabled')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    db_env = setup_django()
+    user_ids = seed_users(args.users)
+    make_request = build_request(args.rpc, user_ids)
+
+    results = []
+    for mode in ('threaded', 'async'):
+        port = free_port()
+        process = start_server(mode, port, args.workers, db_env, args.cache)
+        try:
+            row = asyncio.run(drive(port, args.rpc, make_request, args.concurrency, args.requests))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        row.update(mode=mode, rpc=args.rpc, workers=args.workers, concurrency=args.concurrency)
+        results.append(row)
+
+    print(f"{'mode':<10}{'rps':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for row in results:
+        print(f"{row['mode']:<10}{row['throughput_rps']:>10}{row['p50_ms']:>10}"
+              f"{row['p90_ms']:>10}{row['p99_ms']:>10}{row['errors']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
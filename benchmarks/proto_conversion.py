@@ -0,0 +1,127 @@
+"""
+Micro-benchmark of User -> protobuf conversion.
+
+Measures users/sec for converting one user and for building a 100-row page,
+comparing the original ``_user_to_proto`` implementation (kept here as the
+baseline) with ``users.converters``. The page benchmarks include the query,
+so the ``values_list`` path is credited for skipping model instantiation.
+
+Usage:
+    python benchmarks/proto_conversion.py
+    python benchmarks/proto_conversion.py --rounds 500 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import seed_users, setup_django
+
+
+def legacy_user_to_proto(user):
+    """The pre-``users.converters`` implementation, for comparison."""
+    from google.protobuf.timestamp_pb2 import Timestamp
+    from users.grpc_generated.proto.user.v1 import user_pb2
+
+    proto_user = user_pb2.User(
+        id=str(user.id),
+        email=user.email,
+        display_name=user.username or user.get_full_name(),
+        first_name=user.first_name,
+        last_name=user.last_name,
+        email_verified=user.is_verified,
+        phone_verified=False,
+    )
+    if user.phone_number:
+        proto_user.phone.e164 = user.phone_number
+    if not user.is_active:
+        proto_user.status = user_pb2.USER_STATUS_DEACTIVATED
+    elif not user.is_verified:
+        proto_user.status = user_pb2.USER_STATUS_PENDING_VERIFICATION
+    else:
+        proto_user.status = user_pb2.USER_STATUS_ACTIVE
+    if user.is_superuser:
+        proto_user.roles.append(user_pb2.USER_ROLE_ADMIN)
+    else:
+        proto_user.roles.append(user_pb2.USER_ROLE_CUSTOMER)
+    if user.date_joined:
+        created_ts = Timestamp()
+        created_ts.FromDatetime(user.date_joined)
+        proto_user.audit.created_at.CopyFrom(created_ts)
+    if user.updated_at:
+        updated_ts = Timestamp()
+        updated_ts.FromDatetime(user.updated_at)
+        proto_user.audit.updated_at.CopyFrom(updated_ts)
+    if user.last_login:
+        last_login_ts = Timestamp()
+        last_login_ts.FromDatetime(user.last_login)
+        proto_user.last_login_at.CopyFrom(last_login_ts)
+    return proto_user
+
+
+def measure(fn, users_per_call: int, rounds: int) -> dict:
+    """Call ``fn`` ``rounds`` times and return a result row."""
+    for _ in range(min(rounds, 10)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.perf_counter() - started
+    converted = users_per_call * rounds
+    return {
+        'users': converted,
+        'users_per_sec': round(converted / elapsed),
+        'us_per_user': round(elapsed / converted * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark User -> protobuf conversion')
+    parser.add_argument('--rounds', type=int, default=200, help='Calls per case (default: 200)')
+    parser.add_argument('--page-size', type=int, default=100, help='Rows per page (default: 100)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    setup_django()
+    seed_users(max(args.page_size, 1000))
+
+    from users.converters import USER_FIELDS, row_to_proto, user_to_proto
+    from users.models import User
+
+    page_size = args.page_size
+    user = User.objects.first()
+    row = User.objects.values_list(*USER_FIELDS).first()
+    page = User.objects.order_by('-date_joined', '-id')[:page_size]
+
+    cases = [
+        ('single', 'legacy (model)', lambda: legacy_user_to_proto(user), 1, args.rounds * 100),
+        ('single', 'user_to_proto (model)', lambda: user_to_proto(user), 1, args.rounds * 100),
+        ('single', 'row_to_proto (values)', lambda: row_to_proto(row), 1, args.rounds * 100),
+        (f'page of {page_size}', 'legacy (query + models)',
+         lambda: [legacy_user_to_proto(u) for u in page.all()], page_size, args.rounds),
+        (f'page of {page_size}', 'user_to_proto (query + models)',
+         lambda: [user_to_proto(u) for u in page.all()], page_size, args.rounds),
+        (f'page of {page_size}', 'row_to_proto (query + values)',
+         lambda: [row_to_proto(r) for r in page.values_list(*USER_FIELDS)], page_size, args.rounds),
+    ]
+
+    results = []
+    for case, path, fn, users_per_call, rounds in cases:
+        row_result = measure(fn, users_per_call, rounds)
+        row_result.update(case=case, path=path)
+        results.append(row_result)
+
+    print(f"{'case':<14}{'path':<34}{'users/sec':>12}{'us/user':>10}")
+    for result in results:
+        print(f"{result['case']:<14}{result['path']:<34}{result['users_per_sec']:>12}{result['us_per_user']:>10}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark of ``GET /api/users/me/`` rendering.
+
+Measures requests/sec for the current user endpoint with the original
+``UserSerializer`` + DRF ``JSONRenderer`` pair (kept here as the baseline)
+and with ``UserReadSerializer`` + ``ORJSONRenderer``. Requests are built with
+``APIRequestFactory`` and carry a real access token, so JWT authentication
+is included; the user comes from the auth cache after the first call, as in
+a warm server. Both paths must produce identical bodies.
+
+Usage:
+    python benchmarks/rest_current_user.py
+    python benchmarks/rest_current_user.py --requests 20000 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import seed_users, setup_django
+
+
+def measure(view, request, count: int) -> dict:
+    """Dispatch ``request`` to ``view`` ``count`` times and return a result row."""
+    for _ in range(min(count, 100)):
+        view(request).render()
+    started = time.perf_counter()
+    for _ in range(count):
+        view(request).render()
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': count,
+        'requests_per_sec': round(count / elapsed),
+        'us_per_request': round(elapsed / count * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GET /api/users/me/')
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per path (default: 5000)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    setup_django()
+    user_id = seed_users(1)[0]
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.tokens import AccessToken
+    from users.models import User
+    from users.serializers import UserSerializer
+    from users.views import CurrentUserView
+
+    class LegacyCurrentUserView(CurrentUserView):
+        renderer_classes = [JSONRenderer]
+
+        def get_serializer_class(self):
+            return UserSerializer
+
+    user = User.objects.get(pk=user_id)
+    token = AccessToken.for_user(user)
+    request = APIRequestFactory().get(
+        '/api/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_ACCEPT='application/json')
+
+    paths = [
+        ('legacy (UserSerializer + JSONRenderer)', LegacyCurrentUserView.as_view()),
+        ('fast (UserReadSerializer + ORJSONRenderer)', CurrentUserView.as_view()),
+    ]
+    bodies = {view(request).render().content for _, view in paths}
+    if len(bodies) != 1:
+        sys.exit(f'Responses differ: {bodies}')
+
+    results = []
+    for path, view in paths:
+        result = measure(view, request, args.requests)
+        result['path'] = path
+        results.append(result)
+
+    print(f"{'path':<46}{'requests/sec':>14}{'us/request':>12}")
+    for result in results:
+        print(f"{result['path']:<46}{result['requests_per_sec']:>14}{result['us_per_request']:>12}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
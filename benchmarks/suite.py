@@ -0,0 +1,467 @@
+"""
+Benchmark suite covering every gRPC method and REST endpoint.
+
+Runs each ``UserServiceServicer`` method in-process (no network) and each
+endpoint of ``users/urls.py`` through DRF's test client (URL routing,
+middleware, authentication and rendering included) against a seeded
+benchmark database. For every case it reports latency percentiles,
+throughput and database queries per call. ``--json`` writes the results with
+sorted keys, so runs on two commits can be diffed, and ``--compare`` prints
+the change against an earlier file.
+
+Each case starts with empty in-process caches, runs warm-up calls, then a
+sample of calls with queries captured (queries per call), then the timed
+calls. The gRPC lookups empty the user cache before every call (outside the
+timing), so they measure the database path; their ``[cached]`` variants
+measure cache hits. Calls that change data work
+on users seeded for them, outside the timed loop, so every case is
+repeatable. Cases that hash passwords (CreateUser, register, login, password
+change) or export every user cost up to hundreds of milliseconds per call and
+run ``--slow-calls`` times.
+
+Every method of the UserService descriptor and every URL pattern needs a
+case; the suite refuses to run otherwise. RPCs answering UNIMPLEMENTED are
+reported as skipped.
+
+Usage:
+    python benchmarks/suite.py
+    python benchmarks/suite.py --json before.json
+    python benchmarks/suite.py --json after.json --compare before.json
+    python benchmarks/suite.py --filter 'grpc\\.(GetUser|ListUsers)$' --calls 5000
+    python benchmarks/suite.py --no-cache   # measure the database paths
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import PROJECT_ROOT, seed_users, setup_django, summarize
+
+PASSWORD = 'Bench-Password-0'
+BATCH = 50
+# Users the [cached] cases cycle through
+HOT_USERS = 10
+# RPCs served from the user cache, benchmarked without and with cache hits
+LOOKUPS = {'GetUser', 'GetUserByEmail', 'BatchGetUsers', 'BatchGetUsersByEmail'}
+
+
+class Unimplemented(Exception):
+    """Raised by a call to an RPC that answers UNIMPLEMENTED."""
+
+
+class Case:
+    """One benchmarked call; ``make(count)`` prepares inputs and returns ``call(i) -> ok``."""
+
+    def __init__(self, name: str, make, slow: bool = False, cold: bool = False):
+        self.name = name
+        self.make = make
+        self.slow = slow
+        self.cold = cold  # empty the user cache before every call
+
+
+class Context:
+    """In-process stand-in for grpc.ServicerContext."""
+
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def abort(self, code, details):
+        self.code, self.details = code, details
+        raise RuntimeError(details)
+
+    def is_active(self):
+        return True
+
+    def invocation_metadata(self):
+        return ()
+
+
+class Fixture:
+    """Seeded users shared by the cases."""
+
+    def __init__(self, users: int):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from users.models import User
+
+        self.user_ids = seed_users(users)
+        self.emails = [f'bench{i}@example.com' for i in range(users)]
+        self.admin = User.objects.create_superuser(email='bench-admin@example.com', password=PASSWORD)
+        self.admin_token = str(AccessToken.for_user(self.admin))
+        self.access_tokens = [
+            str(AccessToken.for_user(user)) for user in User.objects.filter(id__in=self.user_ids[:BATCH * 2])
+        ]
+        self.run = uuid.uuid4().hex[:8]
+
+    def pool(self, count: int, name: str, **fields) -> list:
+        """Seed ``count`` users only the calling case touches; returns the users."""
+        from users.models import User
+
+        ids = seed_users(count, prefix=f'{name}-{self.run}-')
+        if fields:
+            User.objects.filter(id__in=ids).update(**fields)
+        return list(User.objects.filter(id__in=ids).order_by('email'))
+
+
+def grpc_cases(fixture: Fixture) -> list:
+    """Return a case per UserService method."""
+    import grpc
+    from google.protobuf.empty_pb2 import Empty
+    from users.grpc_generated.proto.user.v1 import user_pb2
+    from users.grpc_servicer import UserServiceServicer
+
+    servicer = UserServiceServicer()
+    ids, emails, tokens = fixture.user_ids, fixture.emails, fixture.access_tokens
+
+    def rpc(method: str, make_request, prewarm: int = 0):
+        def make(count):
+            handler = getattr(servicer, method)
+            requests = make_request(count)
+            for i in range(prewarm):
+                handler(requests(i), Context())
+
+            def call(i):
+                context = Context()
+                response = handler(requests(i), context)
+                if hasattr(response, '__next__'):
+                    for _ in response:
+                        pass
+                if context.code == grpc.StatusCode.UNIMPLEMENTED:
+                    raise Unimplemented()
+                return context.code in (None, grpc.StatusCode.OK)
+            return call
+        return make
+
+    def each(factory):
+        """Request factory for requests that do not depend on prepared data."""
+        return lambda count: factory
+
+    def batch(values):
+        return lambda i: [values[(i * BATCH + j) % len(values)] for j in range(BATCH)]
+
+    def update_user(i):
+        request = user_pb2.UpdateUserRequest(user_id=ids[i % len(ids)])
+        request.user.first_name = f'Bench{i}'
+        request.update_mask.paths.append('first_name')
+        return request
+
+    def on_pool(request_class, name, **fields):
+        def prepare(count):
+            users = fixture.pool(count, name, **fields)
+            return lambda i: request_class(user_id=str(users[i].id))
+        return prepare
+
+    def list_pages(count):
+        # Walk the listing page by page, starting over after the last page
+        tokens = ['']
+        while True:
+            response = servicer.ListUsers(
+                user_pb2.ListUsersRequest(pagination={'page_size': 20, 'page_token': tokens[-1]}), Context())
+            if not response.pagination.next_page_token:
+                break
+            tokens.append(response.pagination.next_page_token)
+        return lambda i: user_pb2.ListUsersRequest(
+            pagination={'page_size': 20, 'page_token': tokens[i % len(tokens)]})
+
+    queries = [f'bench{i}' for i in range(0, len(ids), 7)]
+    cases = {
+        'CreateUser': (each(lambda i: user_pb2.CreateUserRequest(
+            email=f'create-{fixture.run}-{i}@example.com', password=PASSWORD)), True),
+        'GetUser': (each(lambda i: user_pb2.GetUserRequest(user_id=ids[i % len(ids)])), False),
+        'GetUserByEmail': (each(lambda i: user_pb2.GetUserByEmailRequest(email=emails[i % len(emails)])), False),
+        'UpdateUser': (each(update_user), False),
+        'DeleteUser': (on_pool(user_pb2.DeleteUserRequest, 'delete'), False),
+        'DeactivateUser': (on_pool(user_pb2.DeactivateUserRequest, 'deactivate'), False),
+        'ReactivateUser': (on_pool(user_pb2.ReactivateUserRequest, 'reactivate', is_active=False), False),
+        'ListUsers': (list_pages, False),
+        'SearchUsers': (each(lambda i: user_pb2.SearchUsersRequest(
+            query=queries[i % len(queries)], pagination={'page_size': 20})), False),
+        'HealthCheck': (each(lambda i: Empty()), False),
+        'BatchGetUsers': (each(lambda i: user_pb2.BatchGetUsersRequest(user_ids=batch(ids)(i))), False),
+        'BatchGetUsersByEmail': (each(lambda i: user_pb2.BatchGetUsersByEmailRequest(emails=batch(emails)(i))), False),
+        'ValidateToken': (each(lambda i: user_pb2.ValidateTokenRequest(token=tokens[i % len(tokens)])), False),
+        'ValidateTokens': (each(lambda i: user_pb2.ValidateTokensRequest(tokens=batch(tokens)(i))), False),
+        'ExportUsers': (each(lambda i: user_pb2.ExportUsersRequest(batch_size=500)), True),
+    }
+
+    result = []
+    service = user_pb2.DESCRIPTOR.services_by_name['UserService']
+    for method in service.methods:
+        if method.name in cases:
+            make_request, slow = cases.pop(method.name)
+        else:
+            # Unimplemented so far: an empty request, reported as skipped
+            request_class = getattr(user_pb2, method.input_type.name, Empty)
+            make_request, slow = each(lambda i, request_class=request_class: request_class()), False
+        result.append(Case(f'grpc.{method.name}', rpc(method.name, make_request), slow, method.name in LOOKUPS))
+    if cases:
+        sys.exit(f'Benchmark cases for unknown RPCs: {sorted(cases)}')
+
+    hot_ids, hot_emails = ids[:HOT_USERS], emails[:HOT_USERS]
+    result += [
+        Case('grpc.GetUser[cached]', rpc('GetUser', each(
+            lambda i: user_pb2.GetUserRequest(user_id=hot_ids[i % HOT_USERS])), HOT_USERS)),
+        Case('grpc.GetUserByEmail[cached]', rpc('GetUserByEmail', each(
+            lambda i: user_pb2.GetUserByEmailRequest(email=hot_emails[i % HOT_USERS])), HOT_USERS)),
+        Case('grpc.BatchGetUsers[cached]', rpc('BatchGetUsers', each(
+            lambda i: user_pb2.BatchGetUsersRequest(user_ids=batch(ids)(0))), 1)),
+    ]
+    return result
+
+
+def rest_cases(fixture: Fixture) -> list:
+    """Return a case per (URL pattern, HTTP method) of users/urls.py."""
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+    from users import urls
+
+    client = APIClient(SERVER_NAME='localhost', HTTP_ACCEPT='application/json')
+    admin = {'HTTP_AUTHORIZATION': f'Bearer {fixture.admin_token}'}
+
+    def endpoint(method: str, expected: int, make_request):
+        def make(count):
+            requests = make_request(count)
+            send = getattr(client, method.lower())
+
+            def call(i):
+                url, data, headers = requests(i)
+                return send(url, data, format='json', **headers).status_code == expected
+            return call
+        return make
+
+    def fixed(url, data=None, headers=admin):
+        return lambda count: lambda i: (url, data, headers)
+
+    def delete_me(count):
+        # Each call deactivates a different seeded user
+        users = fixture.pool(count, 'delete-me')
+        auth = [{'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} for user in users]
+        return lambda i: (reverse('users:current_user'), None, auth[i])
+
+    def logout(count):
+        refresh = [str(RefreshToken.for_user(fixture.admin)) for _ in range(count)]
+        return lambda i: (reverse('users:logout'), {'refresh': refresh[i]}, admin)
+
+    def login(count):
+        user = fixture.pool(1, 'login')[0]
+        user.set_password(PASSWORD)
+        user.save(update_fields=['password'])
+        return lambda i: (reverse('users:login'), {'email': user.email, 'password': PASSWORD}, {})
+
+    def change_password(count):
+        user = fixture.pool(1, 'password')[0]
+        user.set_password(PASSWORD)
+        user.save(update_fields=['password'])
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        # Alternate between two passwords
+        return lambda i: (reverse('users:change_password'), {
+            'old_password': f'Bench-Password-{i % 2}',
+            'new_password': f'Bench-Password-{(i + 1) % 2}',
+            'new_password_confirm': f'Bench-Password-{(i + 1) % 2}',
+        }, headers)
+
+    def register(count):
+        return lambda i: (reverse('users:register'), {
+            'email': f'register-{fixture.run}-{i}@example.com',
+            'password': PASSWORD,
+            'password_confirm': PASSWORD,
+        }, {})
+
+    def user_detail(count):
+        ids = fixture.user_ids
+        return lambda i: (reverse('users:user_detail', kwargs={'id': ids[i % len(ids)]}), None, admin)
+
+    profile = {'username': 'bench-admin', 'first_name': 'Bench', 'last_name': 'Admin', 'phone_number': ''}
+    cases = {
+        ('health', 'GET'): (200, fixed(reverse('users:health'), headers={}), False),
+        ('register', 'POST'): (201, register, True),
+        ('login', 'POST'): (200, login, True),
+        ('logout', 'POST'): (200, logout, False),
+        ('current_user', 'GET'): (200, fixed(reverse('users:current_user')), False),
+        ('current_user', 'PUT'): (200, fixed(reverse('users:current_user'), profile), False),
+        ('current_user', 'PATCH'): (200, fixed(reverse('users:current_user'), {'first_name': 'Bench'}), False),
+        ('current_user', 'DELETE'): (200, delete_me, False),
+        ('change_password', 'POST'): (200, change_password, True),
+        ('user_list', 'GET'): (200, fixed(reverse('users:user_list') + '?page_size=20'), False),
+        ('user_detail', 'GET'): (200, user_detail, False),
+    }
+
+    result = []
+    for pattern in urls.urlpatterns:
+        view = pattern.callback.view_class
+        for method in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+            if not hasattr(view, method.lower()):
+                continue
+            key = (pattern.name, method)
+            if key not in cases:
+                sys.exit(f'No benchmark case for {method} {pattern.pattern} ({pattern.name})')
+            expected, make_request, slow = cases.pop(key)
+            result.append(Case(
+                f'rest.{pattern.name}.{method}', endpoint(method, expected, make_request), slow))
+    if cases:
+        sys.exit(f'Benchmark cases for unknown endpoints: {sorted(cases)}')
+    return result
+
+
+def run_case(case: Case, calls: int, warmup: int, query_sample: int) -> dict:
+    """Warm up, count queries on a sample of calls, then time ``calls`` calls."""
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    from users.authentication import auth_user_cache
+    from users.cache import user_cache
+
+    user_cache.clear()
+    auth_user_cache.clear()
+    call = case.make(warmup + query_sample + calls)
+    reset = user_cache.clear if case.cold else (lambda: None)
+    try:
+        for i in range(warmup):
+            reset()
+            call(i)
+    except Unimplemented:
+        return {'skipped': 'UNIMPLEMENTED'}
+
+    with ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        for i in range(warmup, warmup + query_sample):
+            reset()
+            call(i)
+    queries = sum(len(capture.captured_queries) for capture in captured)
+
+    latencies = []
+    errors = 0
+    for i in range(warmup + query_sample, warmup + query_sample + calls):
+        reset()
+        started = time.perf_counter()
+        ok = call(i)
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+    # Sequential calls: throughput is one thread's, without the cache resets
+    elapsed = sum(latencies)
+
+    result = summarize(latencies, elapsed, errors)
+    result['queries_per_call'] = round(queries / query_sample, 2) if query_sample else None
+    return result
+
+
+def git_commit() -> str:
+    """Return the checked out commit, marked ``-dirty`` with local changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def print_results(results: dict, baseline: dict = None):
+    """Print a table of results, with the change against ``baseline`` if given."""
+    def change(name, key):
+        old = (baseline or {}).get(name, {}).get(key)
+        new = results[name].get(key)
+        if old is None or new is None:
+            return ''
+        if key == 'queries_per_call':
+            return '' if old == new else f' (was {old:g})'
+        return f' ({(new - old) / old * 100:+.0f}%)' if old else ''
+
+    print(f"{'case':<34}{'calls':>7}{'rps':>18}{'p50 ms':>18}{'p99 ms':>18}{'queries':>16}")
+    for name in sorted(results):
+        result = results[name]
+        if 'skipped' in result:
+            print(f"{name:<34}{'skipped: ' + result['skipped']:>41}")
+            continue
+        print(f"{name:<34}{result['calls']:>7}"
+              f"{str(result['throughput_rps']) + change(name, 'throughput_rps'):>18}"
+              f"{str(result['p50_ms']) + change(name, 'p50_ms'):>18}"
+              f"{str(result['p99_ms']) + change(name, 'p99_ms'):>18}"
+              f"{str(result['queries_per_call']) + change(name, 'queries_per_call'):>16}"
+              + (f"  {result['errors']} errors" if result['errors'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every gRPC method and REST endpoint')
+    parser.add_argument('--users', type=int, default=2000, help='Users to seed (default: 2000)')
+    parser.add_argument('--calls', type=int, default=1000, help='Timed calls per case (default: 1000)')
+    parser.add_argument('--slow-calls', type=int, default=20,
+                        help='Timed calls for password hashing and export cases (default: 20)')
+    parser.add_argument('--warmup', type=int, default=50, help='Warm-up calls per case (default: 50)')
+    parser.add_argument('--query-sample', type=int, default=20,
+                        help='Calls per case run with queries captured (default: 20)')
+    parser.add_argument('--filter', help='Only run cases whose name matches this regular expression')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the gRPC user and REST auth caches')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Show the change against results written by an earlier run')
+    args = parser.parse_args()
+
+    # Query logging and debug cursors would be part of every measurement
+    os.environ.setdefault('DEBUG', 'False')
+    os.environ.setdefault('METRICS_PORT', '0')
+    if args.no_cache:
+        os.environ['USER_CACHE_MAX_ENTRIES'] = '0'
+        os.environ['AUTH_USER_CACHE_MAX_ENTRIES'] = '0'
+    setup_django()
+    # Keep per-call log lines (e.g. deleted users) out of the measurements
+    logging.disable(logging.WARNING)
+
+    from django.db import connection
+
+    fixture = Fixture(args.users)
+    cases = grpc_cases(fixture) + rest_cases(fixture)
+    if args.filter:
+        cases = [case for case in cases if re.search(args.filter, case.name)]
+
+    results = {}
+    for case in cases:
+        if case.slow:
+            calls, warmup, query_sample = args.slow_calls, 1, min(args.query_sample, 5)
+        else:
+            calls, warmup, query_sample = args.calls, args.warmup, args.query_sample
+        print(f'{case.name} ...', file=sys.stderr)
+        results[case.name] = run_case(case, calls, warmup, query_sample)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.json:
+        output = {
+            'meta': {
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'users': args.users,
+                'calls': args.calls,
+                'slow_calls': args.slow_calls,
+                'cache': not args.no_cache,
+            },
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
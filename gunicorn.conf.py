@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for the REST API (see scripts/start_dual_server.sh).
+
+Workers record metrics in prometheus_client multiprocess mode, and the
+master serves the sum of all of them on ``REST_METRICS_PORT``. Without
+``PROMETHEUS_MULTIPROC_DIR`` in the environment a fresh directory is used.
+
+Each worker also starts its health checks (``users.health``) right away, so
+the first ``/api/health/`` probe is answered from a finished round.
+"""
+import os
+import tempfile
+
+# Before any worker imports prometheus_client
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='rest-metrics-')
+
+
+def when_ready(server):
+    """Serve the metrics of every worker from one port, before the workers start."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_service.settings')
+    from django.conf import settings
+    from users.metrics import reset_multiprocess_dir, start_http_server
+
+    reset_multiprocess_dir()
+    port = getattr(settings, 'REST_METRICS_PORT', 0)
+    if port:
+        server.metrics_server = start_http_server(port, getattr(settings, 'METRICS_ADDR', '127.0.0.1'))
+
+
+def post_fork(server, worker):
+    """Leave the metrics port to the master."""
+    metrics_server = getattr(server, 'metrics_server', None)
+    if metrics_server:
+        metrics_server.server_close()
+
+
+def post_worker_init(worker):
+    """Start this worker's health checks once the application is loaded."""
+    from users.health import health_monitor
+
+    health_monitor.start()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of an exited worker."""
+    from users.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
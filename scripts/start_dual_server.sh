@@ -11,9 +11,15 @@ echo ""
 echo "🗄️  Running database migrations..."
 python manage.py migrate --noinput
 
+# Worker metrics (prometheus_client multiprocess mode), one directory per server
+METRICS_DIR="${METRICS_DIR:-/tmp/metrics}"
+mkdir -p "$METRICS_DIR/rest" "$METRICS_DIR/grpc"
+
 # Start REST API server in background
 echo "🌐 Starting REST API server on port 8000..."
-gunicorn user_service.wsgi:application \
+# The gunicorn master serves the metrics of all workers on REST_METRICS_PORT
+PROMETHEUS_MULTIPROC_DIR="$METRICS_DIR/rest" gunicorn user_service.wsgi:application \
+    --config gunicorn.conf.py \
     --bind 0.0.0.0:8000 \
     --workers 4 \
     --threads 2 \
@@ -24,9 +30,11 @@ gunicorn user_service.wsgi:application \
 REST_PID=$!
 echo "✓ REST API server started (PID: $REST_PID)"
 
-# Start gRPC server in background
-echo "⚡ Starting gRPC server on port 50051..."
-python manage.py rungrpc --port 50051 --workers 10 &
+# Start gRPC server in background (GRPC_PROCESSES workers share the port)
+GRPC_PROCESSES="${GRPC_PROCESSES:-1}"
+echo "⚡ Starting gRPC server on port 50051 ($GRPC_PROCESSES process(es))..."
+PROMETHEUS_MULTIPROC_DIR="$METRICS_DIR/grpc" \
+    python manage.py rungrpc --port 50051 --workers 10 --processes "$GRPC_PROCESSES" &
 GRPC_PID=$!
 echo "✓ gRPC server started (PID: $GRPC_PID)"
 
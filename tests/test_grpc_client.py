@@ -2,14 +2,28 @@
 Test gRPC client for UserService.
 
 This script demonstrates how to call the gRPC service and can be used for testing.
+With ``--load`` it becomes a load generator: a weighted mix of RPCs over
+several channels, either closed-loop (a fixed number of calls in flight) or
+open-loop (a constant arrival rate), with per-method HdrHistogram latencies.
 
 Usage:
     python tests/test_grpc_client.py
+    python tests/test_grpc_client.py --load --mix GetUser=80,ListUsers=10,CreateUser=5,GetUserByEmail=5
+    python tests/test_grpc_client.py --load --rate 2000 --channels 8 --duration 60 --hgrm results/
 """
+import argparse
+import asyncio
+import json
 import os
+import random
 import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
 import grpc
 from google.protobuf.empty_pb2 import Empty
+from google.protobuf.field_mask_pb2 import FieldMask
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -183,12 +197,376 @@ def run_tests(host='localhost', port=50051):
         channel.close()
 
 
-if __name__ == '__main__':
-    import argparse
+# Load generation
+
+DEFAULT_MIX = 'GetUser=80,ListUsers=10,CreateUser=5,GetUserByEmail=5'
+
+# Latencies are recorded in microseconds, from 1us to 60s, to 3 significant digits
+HISTOGRAM_RANGE = (1, 60_000_000, 3)
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+BATCH_SIZE = 50
+
+
+class UserPool:
+    """Ids and emails of existing users, picked at random by the request builders."""
+
+    def __init__(self, users=()):
+        self.ids = [user_id for user_id, _ in users]
+        self.emails = [email for _, email in users]
+
+    def add(self, user):
+        self.ids.append(user.id)
+        self.emails.append(user.email)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _create_user_request(pool):
+    return user_pb2.CreateUserRequest(
+        email=f"load-{uuid.uuid4().hex}@example.com",
+        password="SecurePassword123!",
+        first_name="Load",
+        last_name="Test",
+    )
+
+
+def _update_user_request(pool):
+    return user_pb2.UpdateUserRequest(
+        user_id=random.choice(pool.ids),
+        user=user_pb2.User(first_name=f"Load{random.randrange(1000)}"),
+        update_mask=FieldMask(paths=['first_name']),
+    )
+
+
+# Request builders for the RPCs a load mix may contain
+REQUEST_BUILDERS = {
+    'HealthCheck': lambda pool: Empty(),
+    'GetUser': lambda pool: user_pb2.GetUserRequest(user_id=random.choice(pool.ids)),
+    'GetUserByEmail': lambda pool: user_pb2.GetUserByEmailRequest(email=random.choice(pool.emails)),
+    'BatchGetUsers': lambda pool: user_pb2.BatchGetUsersRequest(
+        user_ids=random.sample(pool.ids, min(BATCH_SIZE, len(pool)))),
+    'ListUsers': lambda pool: user_pb2.ListUsersRequest(
+        pagination=common_pb2.PaginationRequest(page_size=20)),
+    'SearchUsers': lambda pool: user_pb2.SearchUsersRequest(
+        query=random.choice(pool.emails).split('@')[0],
+        pagination=common_pb2.PaginationRequest(page_size=20)),
+    'CreateUser': _create_user_request,
+    'UpdateUser': _update_user_request,
+}
+
+# RPCs that need existing users to pick from
+NEEDS_USERS = {'GetUser', 'GetUserByEmail', 'BatchGetUsers', 'SearchUsers', 'UpdateUser'}
+
+
+def parse_mix(spec):
+    """Parse ``GetUser=80,ListUsers=10,...`` into a dict of RPC name to weight."""
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in REQUEST_BUILDERS:
+            raise argparse.ArgumentTypeError(
+                f"unsupported RPC {name!r} (choose from {', '.join(REQUEST_BUILDERS)})")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for {name}: {weight!r}")
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+class Recorder:
+    """Per-method latency histograms and error counts of one measurement window."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+
+    def histogram(self, rpc):
+        from hdrh.histogram import HdrHistogram
+
+        if rpc not in self.histograms:
+            self.histograms[rpc] = HdrHistogram(*HISTOGRAM_RANGE)
+        return self.histograms[rpc]
+
+    def record(self, rpc, seconds):
+        self.histogram(rpc).record_value(max(1, round(seconds * 1_000_000)))
+
+    def error(self, rpc, code):
+        errors = self.errors.setdefault(rpc, {})
+        errors[code] = errors.get(code, 0) + 1
+
+    def dump(self):
+        """Return the histograms and errors in a picklable, JSON-friendly form."""
+        return {
+            'histograms': {rpc: h.encode().decode() for rpc, h in self.histograms.items()},
+            'errors': self.errors,
+        }
+
+    def merge(self, dump):
+        """Add the histograms and errors dumped by another recorder."""
+        from hdrh.histogram import HdrHistogram
+
+        for rpc, encoded in dump['histograms'].items():
+            self.histogram(rpc).add(HdrHistogram.decode(encoded))
+        for rpc, errors in dump['errors'].items():
+            for code, count in errors.items():
+                self.errors.setdefault(rpc, {})
+                self.errors[rpc][code] = self.errors[rpc].get(code, 0) + count
+
+
+async def generate_load(target, mix, users, options):
+    """
+    Drive ``target`` with the RPC mix for the warm-up and measurement windows.
+
+    Closed-loop (``options.rate`` unset) keeps ``options.concurrency`` calls in
+    flight. Open-loop issues calls at ``options.rate`` per second whether or
+    not earlier ones have completed, and measures each latency from the
+    intended send time, so a stalled server is not hidden by a stalled client.
+
+    Args:
+        target: Server address (host:port)
+        mix: Dict of RPC name to weight
+        users: List of (id, email) tuples to read and update
+        options: Parsed load options
+
+    Returns:
+        Dict with the dumped Recorder plus the peak number of calls in flight
+        and the peak delay of the sender behind its schedule (open-loop).
+    """
+    # A local subchannel pool gives every channel its own connection
+    channels = [
+        grpc.aio.insecure_channel(target, options=[('grpc.use_local_subchannel_pool', 1)])
+        for _ in range(options.channels)
+    ]
+    stubs = [user_pb2_grpc.UserServiceStub(channel) for channel in channels]
+    names, weights = list(mix), list(mix.values())
+    pool = UserPool(users)
+    recorder = Recorder()
+    stats = {'in_flight': 0, 'max_in_flight': 0, 'max_send_lag': 0.0}
+
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(channel.channel_ready() for channel in channels))
+    started = loop.time()
+    measure_from = started + options.warmup
+    stop = measure_from + options.duration
+
+    async def call(stub, rpc, intended):
+        stats['in_flight'] += 1
+        stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            response = await getattr(stub, rpc)(REQUEST_BUILDERS[rpc](pool), timeout=options.deadline)
+        except grpc.aio.AioRpcError as e:
+            if intended >= measure_from:
+                recorder.error(rpc, e.code().name)
+            return
+        finally:
+            stats['in_flight'] -= 1
+        if intended >= measure_from:
+            recorder.record(rpc, loop.time() - intended)
+        if rpc == 'CreateUser':
+            pool.add(response.user)
+
+    async def closed_loop_worker(stub):
+        while (now := loop.time()) < stop:
+            await call(stub, random.choices(names, weights)[0], now)
 
+    try:
+        if options.rate:
+            pending = set()
+            sent = 0
+            while (intended := started + sent / options.rate) < stop:
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif intended >= measure_from:
+                    stats['max_send_lag'] = max(stats['max_send_lag'], -delay)
+                rpc = random.choices(names, weights)[0]
+                task = asyncio.ensure_future(call(stubs[sent % len(stubs)], rpc, intended))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                sent += 1
+            await asyncio.gather(*pending)
+        else:
+            await asyncio.gather(*(
+                closed_loop_worker(stubs[i % len(stubs)]) for i in range(options.concurrency)
+            ))
+    finally:
+        await asyncio.gather(*(channel.close() for channel in channels))
+
+    return {
+        'recorder': recorder.dump(),
+        'max_in_flight': stats['max_in_flight'],
+        'max_send_lag': stats['max_send_lag'],
+    }
+
+
+def _generate_load_process(target, mix, users, options):
+    return asyncio.run(generate_load(target, mix, users, options))
+
+
+def split_options(options):
+    """Split channels, concurrency and rate evenly over ``options.processes``."""
+    shares = []
+    for i in range(options.processes):
+        share = argparse.Namespace(**vars(options))
+        share.channels = max(1, _share(options.channels, options.processes, i))
+        share.concurrency = max(1, _share(options.concurrency, options.processes, i))
+        share.rate = options.rate / options.processes if options.rate else None
+        shares.append(share)
+    return shares
+
+
+def _share(total, parts, index):
+    return total // parts + (1 if index < total % parts else 0)
+
+
+def fetch_users(channel, limit):
+    """Return up to ``limit`` (id, email) tuples, creating users if there are none."""
+    stub = user_pb2_grpc.UserServiceStub(channel)
+    users = []
+    page_token = ''
+    while len(users) < limit:
+        response = stub.ListUsers(user_pb2.ListUsersRequest(
+            pagination=common_pb2.PaginationRequest(page_size=100, page_token=page_token)))
+        users.extend((user.id, user.email) for user in response.users)
+        page_token = response.pagination.next_page_token
+        if not page_token:
+            break
+
+    if not users:
+        print(f"No users found, creating {min(limit, 100)}...")
+        for _ in range(min(limit, 100)):
+            user = stub.CreateUser(_create_user_request(None)).user
+            users.append((user.id, user.email))
+    return users[:limit]
+
+
+def print_report(recorder, elapsed):
+    """Print per-method call counts, throughput and latency percentiles."""
+    from hdrh.histogram import HdrHistogram
+
+    total = HdrHistogram(*HISTOGRAM_RANGE)
+    header = ''.join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+    print(f"\n{'method':<16}{'calls':>9}{'errors':>8}{'rps':>10}{header}{'max ms':>10}")
+
+    def row(name, histogram, errors):
+        calls = histogram.get_total_count()
+        percentiles = ''.join(
+            f"{histogram.get_value_at_percentile(pct) / 1000:>10.2f}" for pct in PERCENTILES)
+        print(f"{name:<16}{calls:>9}{errors:>8}{calls / elapsed:>10.1f}{percentiles}"
+              f"{histogram.get_max_value() / 1000:>10.2f}")
+
+    for rpc in sorted(set(recorder.histograms) | set(recorder.errors)):
+        histogram = recorder.histogram(rpc)
+        total.add(histogram)
+        row(rpc, histogram, sum(recorder.errors.get(rpc, {}).values()))
+    row('all', total, sum(sum(errors.values()) for errors in recorder.errors.values()))
+
+    for rpc, errors in sorted(recorder.errors.items()):
+        details = ', '.join(f"{code}={count}" for code, count in sorted(errors.items()))
+        print(f"  {rpc} errors: {details}")
+
+
+def write_results(recorder, directory, summary):
+    """Write one .hgrm percentile distribution per method plus results.json."""
+    os.makedirs(directory, exist_ok=True)
+    for rpc, histogram in recorder.histograms.items():
+        with open(os.path.join(directory, f"{rpc}.hgrm"), 'wb') as f:
+            histogram.output_percentile_distribution(f, 1000)
+    with open(os.path.join(directory, 'results.json'), 'w') as f:
+        json.dump(dict(summary, **recorder.dump()), f, indent=2)
+
+
+def run_load(host='localhost', port=50051, options=None):
+    """Run a load test and print the per-method latency report."""
+    target = f'{host}:{port}'
+    mix = options.mix
+    print(f"Connecting to gRPC server at {target}...")
+
+    users = []
+    if NEEDS_USERS & set(mix):
+        with grpc.insecure_channel(target) as channel:
+            users = fetch_users(channel, options.users)
+
+    weight = sum(mix.values())
+    print("Mix: " + ', '.join(f"{rpc} {w / weight:.0%}" for rpc, w in mix.items()))
+    if options.rate:
+        print(f"Open loop at {options.rate:g} RPC/s", end='')
+    else:
+        print(f"Closed loop with {options.concurrency} calls in flight", end='')
+    print(f" over {options.channels} channels and {options.processes} process(es), "
+          f"{options.warmup:g}s warm-up + {options.duration:g}s measured, {len(users)} users")
+
+    if options.processes == 1:
+        results = [asyncio.run(generate_load(target, mix, users, options))]
+    else:
+        shares = split_options(options)
+        with ProcessPoolExecutor(options.processes) as executor:
+            futures = [
+                executor.submit(_generate_load_process, target, mix, users, share)
+                for share in shares
+            ]
+            results = [future.result() for future in futures]
+
+    recorder = Recorder()
+    for result in results:
+        recorder.merge(result['recorder'])
+    print_report(recorder, options.duration)
+
+    summary = {
+        'target': target,
+        'mix': mix,
+        'rate': options.rate,
+        'concurrency': None if options.rate else options.concurrency,
+        'channels': options.channels,
+        'processes': options.processes,
+        'duration': options.duration,
+        'max_in_flight': sum(result['max_in_flight'] for result in results),
+        'max_send_lag_ms': round(max(result['max_send_lag'] for result in results) * 1000, 2),
+        'time': time.time(),
+    }
+    print(f"\nPeak calls in flight: {summary['max_in_flight']}")
+    if options.rate:
+        print(f"Peak sender lag: {summary['max_send_lag_ms']} ms")
+        if summary['max_send_lag_ms'] > 10:
+            print("⚠ The client fell behind its schedule; add --processes to measure the server")
+
+    if options.hgrm:
+        write_results(recorder, options.hgrm, summary)
+        print(f"Wrote histograms to {options.hgrm}")
+
+
+if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Test gRPC UserService')
     parser.add_argument('--host', default='localhost', help='gRPC server host')
     parser.add_argument('--port', type=int, default=50051, help='gRPC server port')
 
+    load = parser.add_argument_group('load generation')
+    load.add_argument('--load', action='store_true', help='Run a load test instead of the smoke tests')
+    load.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                      help=f'Weighted RPC mix (default: {DEFAULT_MIX})')
+    load.add_argument('--rate', type=float,
+                      help='Open loop: RPCs per second (default: closed loop)')
+    load.add_argument('--concurrency', type=int, default=64,
+                      help='Closed loop: calls in flight (default: 64)')
+    load.add_argument('--channels', type=int, default=4, help='gRPC channels (default: 4)')
+    load.add_argument('--processes', type=int, default=1,
+                      help='Client processes sharing the channels, calls and rate (default: 1)')
+    load.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds first (default: 5)')
+    load.add_argument('--duration', type=float, default=30, help='Measured seconds (default: 30)')
+    load.add_argument('--deadline', type=float, default=10, help='Per-call deadline in seconds (default: 10)')
+    load.add_argument('--users', type=int, default=1000,
+                      help='Existing users to read and update (default: 1000)')
+    load.add_argument('--hgrm', metavar='DIR',
+                      help='Write per-method .hgrm percentile distributions and results.json here')
+
     args = parser.parse_args()
-    run_tests(host=args.host, port=args.port)
+    if args.load:
+        run_load(host=args.host, port=args.port, options=args)
+    else:
+        run_tests(host=args.host, port=args.port)
@@ -5,6 +5,7 @@ Django settings for user_service project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,9 +79,53 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASSWORD', os.getenv('DB_PASSWORD', '')),
         'HOST': os.getenv('DATABASE_HOST', os.getenv('DB_HOST', 'localhost')),
         'PORT': os.getenv('DATABASE_PORT', os.getenv('DB_PORT', '5432')),
+        # Reuse a thread's connection for this many seconds (0 closes it after
+        # each request or RPC), checking it before reuse
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True').lower() in ('true', '1', 'yes'),
     }
 }
 
+# Read replicas (users.routers): comma-separated host[:port] entries sharing
+# the primary's other settings, or database file paths with SQLite
+READ_REPLICAS = []
+for _index, _replica in enumerate(filter(None, map(str.strip, os.getenv('DATABASE_REPLICAS', '').split(','))), 1):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        # A separate test database, so tests can tell replica reads apart
+        _location = {'NAME': _replica}
+    else:
+        _host, _, _port = _replica.partition(':')
+        # Tests read replicas through the primary's test database
+        _location = {'HOST': _host, 'PORT': _port or DATABASES['default']['PORT'], 'TEST': {'MIRROR': 'default'}}
+    DATABASES[f'replica{_index}'] = {**DATABASES['default'], **_location}
+    READ_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['users.routers.PrimaryReplicaRouter']
+
+# Replicas lagging more than REPLICA_MAX_LAG seconds are not read from (lag is
+# measured every REPLICA_LAG_CHECK_INTERVAL seconds); users written by this
+# process are read from the primary for REPLICA_STICKY_SECONDS (at least
+# REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL)
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Shared cache (Redis, needs the redis package) that pins users written by any
+# process to the primary; without it other processes may read a replica that
+# is up to REPLICA_MAX_LAG seconds behind
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+REPLICA_STICKY_CACHE = None
+if os.getenv('REPLICA_STICKY_REDIS_URL'):
+    REPLICA_STICKY_CACHE = 'replica_sticky'
+    CACHES[REPLICA_STICKY_CACHE] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REPLICA_STICKY_REDIS_URL'),
+    }
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
@@ -115,13 +161,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # orjson; falls back to DRF's JSONRenderer if it is not installed
+        'users.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Returns 429 when the password hashing pool is saturated
+    'EXCEPTION_HANDLER': 'users.views.exception_handler',
 }
 
 # JWT Settings
@@ -137,6 +190,7 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
 }
 
 # CORS Settings
@@ -145,10 +199,62 @@ CORS_ALLOWED_ORIGINS = os.getenv(
     'http://localhost:3000,http://127.0.0.1:3000'
 ).split(',')
 CORS_ALLOW_CREDENTIALS = True
+# Conditional requests on user resources (users.etags)
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 
 # gRPC Settings
 GRPC_PORT = int(os.getenv('GRPC_PORT', 50051))
 
+# Database connections of gRPC worker threads (users.db_pool): seconds after
+# which an unused connection is closed, by its own thread
+GRPC_DB_IDLE_TIMEOUT = float(os.getenv('GRPC_DB_IDLE_TIMEOUT', 60))
+
+# In-process user cache used by GetUser / GetUserByEmail
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+
+# Users cached by the REST API's JWT authentication (users.authentication)
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_USER_CACHE_MAX_ENTRIES', 10000))
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 10))
+
+# Seconds between reloads of the inactive-user set used by ValidateToken
+TOKEN_VALIDATION_RECONCILE_INTERVAL = int(os.getenv('TOKEN_VALIDATION_RECONCILE_INTERVAL', 30))
+
+# last_login write-behind buffer (users.last_login): seconds between bulk
+# flushes (0 writes on every login) and pending users that force a flush
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', 5))
+LAST_LOGIN_FLUSH_SIZE = int(os.getenv('LAST_LOGIN_FLUSH_SIZE', 1000))
+
+# Seconds between background health checks (users.health); probes are served
+# from the last result and report unhealthy once it is three intervals old
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+
+# Refresh token blacklist Bloom filter (users.token_blacklist): minimum size,
+# seconds between fetches of tokens blacklisted by other processes (0 before
+# every check) and seconds between full rebuilds
+TOKEN_BLACKLIST_BLOOM_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000))
+TOKEN_BLACKLIST_SYNC_INTERVAL = float(os.getenv('TOKEN_BLACKLIST_SYNC_INTERVAL', 1))
+TOKEN_BLACKLIST_REBUILD_INTERVAL = int(os.getenv('TOKEN_BLACKLIST_REBUILD_INTERVAL', 3600))
+
+# Password hashing pool (users.hashing): worker processes per server process
+# (0 hashes inline) and operations allowed to run or queue before returning
+# 429/RESOURCE_EXHAUSTED. Every gunicorn worker and gRPC process has its own
+# pool: keep (gunicorn workers + gRPC processes) x workers within the cores
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 1))
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 64))
+
+# Prometheus endpoint of the gRPC server (0 disables). With --processes N the
+# supervisor serves all workers, which needs PROMETHEUS_MULTIPROC_DIR (users.metrics)
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9464))
+# Prometheus endpoint of the gunicorn master, for all workers (0 disables)
+REST_METRICS_PORT = int(os.getenv('REST_METRICS_PORT', 9564))
+# Interface the metrics ports listen on; keep them off the public network
+METRICS_ADDR = os.getenv('METRICS_ADDR', '127.0.0.1')
+
+# SearchUsers backend (dotted path); empty picks one for the database vendor
+USER_SEARCH_BACKEND = os.getenv('USER_SEARCH_BACKEND', '')
+
 # Logging
 LOGGING = {
     'version': 1,
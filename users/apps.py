@@ -10,3 +10,7 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'Users'
+
+    def ready(self):
+        """Register signal handlers."""
+        from . import signals  # noqa: F401
@@ -0,0 +1,144 @@
+"""
+JWT authentication classes that avoid the per-request user query.
+
+simplejwt's ``JWTAuthentication`` loads the user row on every authenticated
+request. ``CachedJWTAuthentication`` (the ``REST_FRAMEWORK`` default) keeps
+recently authenticated users in a per-process TTL + LRU cache keyed by the
+``user_id`` claim, so repeated requests with the same token make no
+auth-related queries. Entries are dropped by the ``post_save``/``post_delete``
+handlers in ``users.signals``; changes made by another process are picked up
+once ``AUTH_USER_CACHE_TTL`` expires, except deactivations and deletes, which
+drop the entry as soon as the inactive-user set of ``users.token_validation``
+has them.
+
+``StatelessJWTAuthentication`` does not load the user at all: it returns a
+``TokenUser`` built from the token claims and rejects deactivated users
+through the inactive-user set of ``users.token_validation``. Use it on views
+that only need the user id.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .token_validation import inactive_users
+
+
+class AuthUserCache:
+    """Bounded TTL + LRU cache of User instances keyed by user id."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 10.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of users kept before LRU eviction
+            ttl: Seconds an entry stays valid after it was stored
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user id -> (expires_at, user)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def generation(self) -> int:
+        """Return the invalidation generation to pass to ``set`` (see ``UserCache``)."""
+        return self._generation
+
+    def get(self, user_id: str):
+        """Return a copy of the cached user for ``user_id`` or None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            user = entry[1]
+        # Views mutate request.user; never hand out the cached instance
+        return copy.copy(user)
+
+    def set(self, user_id: str, user, generation: Optional[int] = None):
+        """Store a copy of ``user`` unless it was invalidated since ``generation``."""
+        if self.max_entries <= 0:
+            return
+        user = copy.copy(user)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop the cached user."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+auth_user_cache = AuthUserCache(
+    max_entries=getattr(settings, 'AUTH_USER_CACHE_MAX_ENTRIES', 10000),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 10),
+)
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as e:
+        raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Drop-in ``JWTAuthentication`` that resolves users through ``auth_user_cache``."""
+
+    def get_user(self, validated_token):
+        user_id = _user_id(validated_token)
+        key = str(user_id)
+        user = auth_user_cache.get(key)
+        if user is not None and inactive_users.is_inactive(key):
+            # Deactivated or deleted by another process since it was cached
+            auth_user_cache.invalidate(key)
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if user is None:
+            generation = auth_user_cache.generation()
+            try:
+                user = self.user_model.objects.for_user(user_id).get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            auth_user_cache.set(key, user, generation)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """Authenticate as a ``TokenUser`` from the token claims, rejecting inactive users."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and inactive_users.is_inactive(str(user.id)):
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
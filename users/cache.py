@@ -0,0 +1,138 @@
+"""
+In-process read-through cache for user lookups.
+
+Entries hold the already-built protobuf ``User`` message so that cache hits in
+the gRPC servicer skip both the database and ``_user_to_proto``. Entries are
+keyed by user id, with a secondary index on the lowercased email, and are
+invalidated by the ``post_save``/``post_delete`` handlers in ``users.signals``.
+
+The cache is per process: writes made by another process (e.g. the REST API
+workers) are only picked up once the TTL expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+
+class UserCache:
+    """Bounded TTL + LRU cache of protobuf User messages."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of users kept before LRU eviction
+            ttl: Seconds an entry stays valid after it was stored
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user id -> (expires_at, proto user)
+        self._emails = {}  # lowercased email -> user id
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        """
+        Return the current invalidation generation.
+
+        Callers read this before loading a user from the database and pass it
+        to ``set`` so that a row invalidated mid-load is not cached stale.
+        """
+        return self._generation
+
+    def get_by_id(self, user_id: str):
+        """Return the cached proto user for ``user_id`` or None."""
+        with self._lock:
+            return self._get(user_id)
+
+    def get_by_email(self, email: str):
+        """Return the cached proto user for ``email`` or None."""
+        with self._lock:
+            user_id = self._emails.get(email.lower())
+            if user_id is None:
+                self.misses += 1
+                return None
+            return self._get(user_id)
+
+    def set(self, proto_user, generation: Optional[int] = None):
+        """
+        Store a proto user.
+
+        Args:
+            proto_user: ``user_pb2.User`` message; must not be mutated afterwards
+            generation: Value of ``generation()`` taken before the DB read
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(proto_user.id)
+            self._entries[proto_user.id] = (time.monotonic() + self.ttl, proto_user)
+            self._emails[proto_user.email.lower()] = proto_user.id
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._emails.pop(evicted.email.lower(), None)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str, email: Optional[str] = None):
+        """Drop the entry for ``user_id`` and any entry indexed under ``email``."""
+        with self._lock:
+            self._generation += 1
+            self._remove(user_id)
+            if email:
+                other_id = self._emails.get(email.lower())
+                if other_id is not None:
+                    self._remove(other_id)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._emails.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, proto_user = entry
+        if expires_at < time.monotonic():
+            self._remove(user_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return proto_user
+
+    def _remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            email = entry[1].email.lower()
+            if self._emails.get(email) == user_id:
+                del self._emails[email]
+
+
+user_cache = UserCache(
+    max_entries=getattr(settings, 'USER_CACHE_MAX_ENTRIES', 10000),
+    ttl=getattr(settings, 'USER_CACHE_TTL', 30),
+)
@@ -0,0 +1,91 @@
+"""
+User -> protobuf conversion for the gRPC servicer.
+
+Every RPC that returns users goes through here, so the converter avoids the
+per-user overhead of the straightforward implementation:
+
+- scalar fields are passed to the message constructor in one call;
+- timestamps are written straight into ``audit.created_at`` etc. as
+  seconds/nanos instead of building and copying temporary ``Timestamp``s;
+- status and role enums come from precomputed lookup tables.
+
+List RPCs select ``USER_FIELDS`` with ``values_list`` and convert the tuples
+with ``row_to_proto``, skipping model instantiation entirely.
+"""
+from datetime import datetime, timezone
+
+from users.grpc_generated.proto.user.v1 import user_pb2
+
+# Columns read by row_to_proto, in tuple order
+USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'phone_number',
+    'is_active', 'is_verified', 'is_superuser', 'date_joined', 'updated_at', 'last_login',
+)
+
+# (is_active, is_verified) -> UserStatus
+_STATUSES = {
+    (True, True): user_pb2.USER_STATUS_ACTIVE,
+    (True, False): user_pb2.USER_STATUS_PENDING_VERIFICATION,
+    (False, True): user_pb2.USER_STATUS_DEACTIVATED,
+    (False, False): user_pb2.USER_STATUS_DEACTIVATED,
+}
+
+# is_superuser -> roles
+_ROLES = {
+    True: (user_pb2.USER_ROLE_ADMIN,),
+    False: (user_pb2.USER_ROLE_CUSTOMER,),
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+
+def user_to_proto(user) -> user_pb2.User:
+    """Convert a User model instance to a protobuf User message."""
+    return _build(
+        user.id, user.email, user.username, user.first_name, user.last_name, user.phone_number,
+        user.is_active, user.is_verified, user.is_superuser, user.date_joined, user.updated_at,
+        user.last_login,
+    )
+
+
+def row_to_proto(row) -> user_pb2.User:
+    """
+    Convert a ``values_list(*USER_FIELDS)`` row to a protobuf User message.
+
+    Extra trailing columns (e.g. a sort key) are ignored.
+    """
+    return _build(
+        row[0], row[1], row[2], row[3], row[4], row[5],
+        row[6], row[7], row[8], row[9], row[10], row[11],
+    )
+
+
+def _build(user_id, email, username, first_name, last_name, phone_number,
+           is_active, is_verified, is_superuser, date_joined, updated_at, last_login) -> user_pb2.User:
+    proto_user = user_pb2.User(
+        id=str(user_id),
+        email=email,
+        display_name=username or f'{first_name} {last_name}'.strip() or email,
+        first_name=first_name,
+        last_name=last_name,
+        email_verified=is_verified,
+        status=_STATUSES[is_active, is_verified],
+        roles=_ROLES[is_superuser],
+    )
+    if phone_number:
+        proto_user.phone.e164 = phone_number
+    if date_joined:
+        _set_timestamp(proto_user.audit.created_at, date_joined)
+    if updated_at:
+        _set_timestamp(proto_user.audit.updated_at, updated_at)
+    if last_login:
+        _set_timestamp(proto_user.last_login_at, last_login)
+    return proto_user
+
+
+def _set_timestamp(timestamp, value: datetime):
+    # Same result as Timestamp.FromDatetime: naive datetimes are taken as UTC
+    delta = value - (_NAIVE_EPOCH if value.tzinfo is None else _EPOCH)
+    timestamp.seconds = delta.days * 86400 + delta.seconds
+    timestamp.nanos = delta.microseconds * 1000
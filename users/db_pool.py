@@ -0,0 +1,231 @@
+"""
+Lifecycle of the database connections of gRPC worker threads.
+
+Django keeps one connection per thread and recycles it on the request
+started/finished signals of its HTTP handlers, which gRPC never sends: a
+worker thread otherwise holds its connection forever, idle or broken after a
+database restart. ``ConnectionPool.lease()`` wraps every RPC with the
+request lifecycle Django expects. Before and after the RPC each connection
+of the thread goes through ``close_if_unusable_or_obsolete()``, which
+applies ``CONN_MAX_AGE`` (reuse a connection up to that age) and
+``CONN_HEALTH_CHECKS`` (ping a reused connection before its first query).
+
+On top of that the pool:
+
+* closes a connection left idle for ``idle_timeout`` seconds, so a quiet
+  server releases its connections and a busy one never trusts a connection
+  the database or a proxy may have dropped meanwhile
+* reports open, idle and checked-out connections in ``grpc_db_connections``
+
+A Django connection must only be used and closed by the thread that owns
+it. Expired connections are therefore closed either by their thread before
+its next RPC, or by the sweeper started with ``start(executor)``: every
+``idle_timeout / 2`` seconds it hands a no-op task to each idle worker
+thread of the executor, and the task closes that thread's expired
+connections. Each thread holds at most one connection per configured
+database, so the worker count bounds the number open.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Seconds a sweep task waits for the other idle threads to take theirs
+SWEEP_WAIT = 1.0
+
+DB_CONNECTIONS = Gauge(
+    'grpc_db_connections', 'Database connections held by gRPC worker threads, by state.', ('state',),
+    multiprocess_mode='livesum')
+DB_CONNECTIONS_CLOSED = Counter(
+    'grpc_db_connections_closed_total', 'Idle gRPC worker connections closed by the pool, by reason.',
+    ('reason',))
+
+
+class _Slot:
+    """The connections of one worker thread."""
+
+    __slots__ = ('wrappers', 'leased', 'idle_since')
+
+    def __init__(self):
+        self.wrappers = ()
+        self.leased = False
+        self.idle_since = 0.0
+
+
+class ConnectionPool:
+    """Recycle the per-thread Django connections used by RPCs."""
+
+    def __init__(self, idle_timeout: float = 60.0):
+        """
+        Initialize the pool.
+
+        Args:
+            idle_timeout: Seconds after which an unused connection is closed
+                before its next RPC (0 closes connections after every RPC)
+        """
+        self.idle_timeout = idle_timeout
+        self._slots = {}  # thread id -> _Slot
+        self._lock = threading.Lock()
+        self._executor = None
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def start(self, executor):
+        """
+        Start closing idle connections of ``executor``'s worker threads in the background.
+
+        Args:
+            executor: ThreadPoolExecutor running the RPCs that lease connections
+        """
+        if self.idle_timeout <= 0 or self._sweeper is not None:
+            return
+        self._executor = executor
+        self._sweeper = threading.Thread(target=self._run, name='grpc-db-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def sweep(self) -> int:
+        """
+        Hand a no-op task to each idle worker thread, closing its expired connections.
+
+        Returns:
+            Number of tasks submitted
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not any(self._expired(slot, now) for slot in self._slots.values()):
+                return 0
+            busy = sum(1 for slot in self._slots.values() if slot.leased)
+        # One task per idle thread: each waits for the others, so no thread takes two
+        idle = len(getattr(self._executor, '_threads', ())) - busy
+        if idle <= 0:
+            return 0
+        barrier = threading.Barrier(idle)
+        for submitted in range(idle):
+            try:
+                self._executor.submit(self._close_expired, barrier)
+            except RuntimeError:  # executor shut down
+                barrier.abort()
+                return submitted
+        return idle
+
+    @contextmanager
+    def lease(self):
+        """Hold this thread's connections for the duration of an RPC."""
+        slot = self.checkout()
+        try:
+            yield
+        finally:
+            self.checkin(slot)
+
+    def checkout(self) -> _Slot:
+        """Mark the calling thread's connections in use and recycle them if needed."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            slot = self._slots.get(thread_id)
+            if slot is None:
+                slot = self._slots[thread_id] = _Slot()
+            expired = self._expired(slot, time.monotonic())
+            slot.leased = True
+        if expired:
+            _close(slot.wrappers, 'idle')
+        _recycle()
+        with self._lock:
+            self._update_gauges()
+        return slot
+
+    def checkin(self, slot: _Slot):
+        """Return the calling thread's connections after an RPC."""
+        _recycle()
+        if self.idle_timeout <= 0:
+            connections.close_all()
+        wrappers = tuple(
+            wrapper for wrapper in connections.all(initialized_only=True) if wrapper.connection is not None
+        )
+        with self._lock:
+            if wrappers:
+                slot.wrappers = wrappers
+                slot.leased = False
+                slot.idle_since = time.monotonic()
+            else:
+                # Nothing open (e.g. answered from a cache): free the slot
+                self._slots.pop(threading.get_ident(), None)
+            self._update_gauges()
+
+    def shutdown(self):
+        """Close the connections of every idle thread; call once the workers are stopped."""
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+        with self._lock:
+            idle = [thread_id for thread_id, slot in self._slots.items() if not slot.leased]
+            slots = [self._slots.pop(thread_id) for thread_id in idle]
+            self._update_gauges()
+        for slot in slots:
+            _close(slot.wrappers, 'shutdown', shared=True)
+
+    def _run(self):
+        while not self._stop.wait(self.idle_timeout / 2):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('Idle database connection sweep failed')
+
+    def _close_expired(self, barrier: threading.Barrier):
+        """Sweep task: close the calling worker thread's connections if they expired."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            slot = self._slots.get(thread_id)
+            expired = slot is not None and not slot.leased and self._expired(slot, time.monotonic())
+            if expired:
+                del self._slots[thread_id]
+        if expired:
+            _close(slot.wrappers, 'idle')
+            with self._lock:
+                self._update_gauges()
+        try:
+            barrier.wait(SWEEP_WAIT)
+        except threading.BrokenBarrierError:
+            pass
+
+    def _expired(self, slot: _Slot, now: float) -> bool:
+        return bool(slot.wrappers) and not slot.leased and now - slot.idle_since >= self.idle_timeout
+
+    def _update_gauges(self):
+        # Live connections, not threads: a leased thread may not have connected yet
+        open_connections = checked_out = 0
+        for slot in self._slots.values():
+            live = sum(1 for wrapper in slot.wrappers if wrapper.connection is not None)
+            open_connections += live
+            if slot.leased:
+                checked_out += live
+        DB_CONNECTIONS.labels('open').set(open_connections)
+        DB_CONNECTIONS.labels('checked_out').set(checked_out)
+        DB_CONNECTIONS.labels('idle').set(open_connections - checked_out)
+
+
+def _close(wrappers, reason: str, shared: bool = False):
+    """Close ``wrappers``; ``shared`` when they belong to another (stopped) thread."""
+    for wrapper in wrappers:
+        if shared:
+            wrapper.inc_thread_sharing()
+        try:
+            wrapper.close()
+        except Exception as e:
+            logger.warning(f'Failed to close idle database connection: {e}')
+        finally:
+            if shared:
+                wrapper.dec_thread_sharing()
+    DB_CONNECTIONS_CLOSED.labels(reason).inc()
+
+
+def _recycle():
+    """Django's request_started/finished handling for the calling thread."""
+    for wrapper in connections.all(initialized_only=True):
+        wrapper.close_if_unusable_or_obsolete()
@@ -0,0 +1,74 @@
+"""
+Strong ETags for user resources.
+
+A user's ETag is derived from its id and ``updated_at``, which ``save()``
+bumps on every change, so it is known without rendering the user: a
+conditional GET is answered from an ``updated_at``-only lookup, and an
+``If-Match`` write is a compare-and-set on ``updated_at``.
+
+The ETag is ``"<id hex>-<updated_at in microseconds since the epoch, hex>"``;
+clients must treat it as opaque.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class PreconditionFailed(APIException):
+    """Raised when ``If-Match`` does not match the current version."""
+
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The user was modified since it was read.'
+    default_code = 'precondition_failed'
+
+
+def user_etag(user_id, updated_at: datetime) -> str:
+    """Return the quoted strong ETag of a user version."""
+    micros = (updated_at - EPOCH) // MICROSECOND
+    return quote_etag(f'{user_id.hex}-{micros:x}')
+
+
+def if_none_match(request, user_id, updated_at: datetime) -> bool:
+    """Return True if the request's ``If-None-Match`` matches this version (answer 304)."""
+    header = request.headers.get('If-None-Match')
+    if not header or updated_at is None:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    etag = user_etag(user_id, updated_at)
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    return any(candidate.removeprefix('W/') == etag for candidate in etags)
+
+
+def if_match_versions(request, user_id):
+    """
+    Return the ``updated_at`` values ``If-Match`` accepts for a user.
+
+    Returns None when there is no ``If-Match`` header or it is ``*`` (the user
+    exists, so any version matches), otherwise a possibly empty list: weak
+    ETags and ETags of other users never match.
+    """
+    header = request.headers.get('If-Match')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return None
+    versions = []
+    for etag in etags:
+        if etag.startswith('W/'):
+            continue
+        id_hex, _, micros = etag.strip('"').partition('-')
+        if id_hex != user_id.hex:
+            continue
+        try:
+            versions.append(EPOCH + int(micros, 16) * MICROSECOND)
+        except (ValueError, OverflowError):
+            continue
+    return versions
@@ -0,0 +1,203 @@
+"""
+asyncio (grpc.aio) adapter for UserService.
+
+Every RPC of ``UserServiceServicer`` is exposed as a coroutine that runs the
+synchronous implementation on a bounded thread pool, so thousands of RPCs can
+wait on the event loop while at most ``max_workers`` of them hold a thread
+and a database connection. User cache hits for ``GetUser`` and
+``GetUserByEmail`` and ``HealthCheck`` (served from the cached report of
+``users.health``) are answered on the event loop without a thread hop.
+Calls on the worker threads hold a ``users.db_pool`` lease, which recycles
+the thread's database connection around each one.
+"""
+import asyncio
+import logging
+import threading
+from concurrent import futures
+
+from django.conf import settings
+
+from users.cache import user_cache
+from users.db_pool import ConnectionPool
+from users.grpc_servicer import UserServiceServicer, health_check_response
+from users.health import health_monitor
+from users.metrics import current_query_stats, record_queries
+from users.grpc_generated.proto.user.v1 import user_pb2, user_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+# Messages a streaming RPC may buffer ahead of a slow client
+STREAM_BUFFER_SIZE = 4
+
+
+class OffloadedContext:
+    """
+    Servicer context handed to sync RPC code running on a worker thread.
+
+    Status codes and details are recorded here and copied onto the real
+    ``grpc.aio.ServicerContext`` back on the event loop, and ``is_active``
+    turns False once the event loop side stops consuming a stream; everything
+    else is delegated to the real context.
+    """
+
+    def __init__(self, context):
+        self._context = context
+        self.code = None
+        self.details = None
+        self.cancelled = threading.Event()
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def is_active(self) -> bool:
+        return not self.cancelled.is_set()
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+    def apply(self):
+        """Copy the recorded status onto the real context."""
+        if self.code is not None:
+            self._context.set_code(self.code)
+        if self.details is not None:
+            self._context.set_details(self.details)
+
+
+class AsyncUserServiceServicer(user_pb2_grpc.UserServiceServicer):
+    """grpc.aio servicer that offloads UserServiceServicer calls to threads."""
+
+    def __init__(self, max_workers: int = 10, servicer: UserServiceServicer = None):
+        """
+        Initialize the servicer.
+
+        Args:
+            max_workers: Size of the thread pool used for blocking ORM calls
+            servicer: Sync servicer to delegate to (default: a new one)
+        """
+        self.servicer = servicer or UserServiceServicer()
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='grpc-aio-db',
+        )
+        self.connection_pool = ConnectionPool(idle_timeout=getattr(settings, 'GRPC_DB_IDLE_TIMEOUT', 60))
+        self.connection_pool.start(self.executor)
+
+    async def call(self, name: str, request, context):
+        """Run the sync RPC ``name`` on the thread pool."""
+        offloaded = OffloadedContext(context)
+        loop = asyncio.get_running_loop()
+        method = getattr(self.servicer, name)
+        # Handed over explicitly: running the call in a copy of this context
+        # would also give it a fresh Django connection every time
+        stats = current_query_stats.get()
+
+        def run():
+            with self.connection_pool.lease(), record_queries(stats):
+                return method(request, offloaded)
+
+        response = await loop.run_in_executor(self.executor, run)
+        offloaded.apply()
+        return response
+
+    async def GetUser(self, request, context):
+        """Get user by ID, answering cache hits on the event loop."""
+        proto_user = user_cache.get_by_id(request.user_id)
+        if proto_user is not None:
+            return user_pb2.GetUserResponse(user=proto_user)
+        return await self.call('GetUser', request, context)
+
+    async def GetUserByEmail(self, request, context):
+        """Get user by email, answering cache hits on the event loop."""
+        proto_user = user_cache.get_by_email(request.email)
+        if proto_user is not None:
+            return user_pb2.GetUserByEmailResponse(user=proto_user)
+        return await self.call('GetUserByEmail', request, context)
+
+    async def HealthCheck(self, request, context):
+        """Return the cached health report on the event loop, even when the pool is saturated."""
+        return health_check_response(health_monitor.report(wait=0))
+
+    async def stream(self, name: str, request, context):
+        """
+        Run the server-streaming sync RPC ``name`` on one pool thread.
+
+        The generator stays on a single thread (Django connections and
+        server-side cursors are per thread) and hands messages to the event
+        loop through a small bounded queue, so a slow client applies
+        backpressure instead of buffering the whole stream.
+        """
+        offloaded = OffloadedContext(context)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+        cancelled = offloaded.cancelled
+        stats = current_query_stats.get()
+        done = object()
+
+        def put(item) -> bool:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=1)
+                    return True
+                except futures.TimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            try:
+                with self.connection_pool.lease(), record_queries(stats):
+                    for item in getattr(self.servicer, name)(request, offloaded):
+                        if not put(item):
+                            return
+            finally:
+                if not cancelled.is_set():
+                    put(done)
+
+        producer = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            await producer
+            offloaded.apply()
+        finally:
+            cancelled.set()
+
+    def shutdown(self):
+        """Release the worker threads and their database connections."""
+        self.executor.shutdown(wait=True)
+        self.connection_pool.shutdown()
+
+
+def _streamed(name: str):
+    async def method(self, request, context):
+        async for response in self.stream(name, request, context):
+            yield response
+
+    method.__name__ = name
+    method.__doc__ = f'Stream UserServiceServicer.{name} from the thread pool.'
+    return method
+
+
+def _offloaded(name: str):
+    async def method(self, request, context):
+        return await self.call(name, request, context)
+
+    method.__name__ = name
+    method.__doc__ = f'Run UserServiceServicer.{name} on the thread pool.'
+    return method
+
+
+for _method in user_pb2.DESCRIPTOR.services_by_name['UserService'].methods:
+    if _method.name in AsyncUserServiceServicer.__dict__:
+        continue
+    if _method.server_streaming:
+        setattr(AsyncUserServiceServicer, _method.name, _streamed(_method.name))
+    else:
+        setattr(AsyncUserServiceServicer, _method.name, _offloaded(_method.name))
@@ -247,6 +247,70 @@ class GetUserByEmailResponse(_message.Message):
     user: User
     def __init__(self, user: _Optional[_Union[User, _Mapping]] = ...) -> None: ...
 
+class BatchGetUsersRequest(_message.Message):
+    __slots__ = ("user_ids",)
+    USER_IDS_FIELD_NUMBER: _ClassVar[int]
+    user_ids: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, user_ids: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class BatchGetUsersResponse(_message.Message):
+    __slots__ = ("results",)
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[UserLookupResult]
+    def __init__(self, results: _Optional[_Iterable[_Union[UserLookupResult, _Mapping]]] = ...) -> None: ...
+
+class BatchGetUsersByEmailRequest(_message.Message):
+    __slots__ = ("emails",)
+    EMAILS_FIELD_NUMBER: _ClassVar[int]
+    emails: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, emails: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class BatchGetUsersByEmailResponse(_message.Message):
+    __slots__ = ("results",)
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[UserLookupResult]
+    def __init__(self, results: _Optional[_Iterable[_Union[UserLookupResult, _Mapping]]] = ...) -> None: ...
+
+class UserLookupResult(_message.Message):
+    __slots__ = ("key", "found", "user")
+    KEY_FIELD_NUMBER: _ClassVar[int]
+    FOUND_FIELD_NUMBER: _ClassVar[int]
+    USER_FIELD_NUMBER: _ClassVar[int]
+    key: str
+    found: bool
+    user: User
+    def __init__(self, key: _Optional[str] = ..., found: bool = ..., user: _Optional[_Union[User, _Mapping]] = ...) -> None: ...
+
+class ValidateTokenRequest(_message.Message):
+    __slots__ = ("token",)
+    TOKEN_FIELD_NUMBER: _ClassVar[int]
+    token: str
+    def __init__(self, token: _Optional[str] = ...) -> None: ...
+
+class ValidateTokenResponse(_message.Message):
+    __slots__ = ("valid", "message", "user_id", "expires_at")
+    VALID_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    USER_ID_FIELD_NUMBER: _ClassVar[int]
+    EXPIRES_AT_FIELD_NUMBER: _ClassVar[int]
+    valid: bool
+    message: str
+    user_id: str
+    expires_at: _timestamp_pb2.Timestamp
+    def __init__(self, valid: bool = ..., message: _Optional[str] = ..., user_id: _Optional[str] = ..., expires_at: _Optional[_Union[datetime.datetime, _timestamp_pb2.Timestamp, _Mapping]] = ...) -> None: ...
+
+class ValidateTokensRequest(_message.Message):
+    __slots__ = ("tokens",)
+    TOKENS_FIELD_NUMBER: _ClassVar[int]
+    tokens: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, tokens: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class ValidateTokensResponse(_message.Message):
+    __slots__ = ("results",)
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[ValidateTokenResponse]
+    def __init__(self, results: _Optional[_Iterable[_Union[ValidateTokenResponse, _Mapping]]] = ...) -> None: ...
+
 class UpdateUserRequest(_message.Message):
     __slots__ = ("user_id", "user", "update_mask")
     USER_ID_FIELD_NUMBER: _ClassVar[int]
@@ -339,6 +403,26 @@ class SearchUsersResponse(_message.Message):
     pagination: _common_pb2.PaginationResponse
     def __init__(self, users: _Optional[_Iterable[_Union[User, _Mapping]]] = ..., pagination: _Optional[_Union[_common_pb2.PaginationResponse, _Mapping]] = ...) -> None: ...
 
+class ExportUsersRequest(_message.Message):
+    __slots__ = ("statuses", "roles", "batch_size", "resume_token")
+    STATUSES_FIELD_NUMBER: _ClassVar[int]
+    ROLES_FIELD_NUMBER: _ClassVar[int]
+    BATCH_SIZE_FIELD_NUMBER: _ClassVar[int]
+    RESUME_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    statuses: _containers.RepeatedScalarFieldContainer[UserStatus]
+    roles: _containers.RepeatedScalarFieldContainer[UserRole]
+    batch_size: int
+    resume_token: str
+    def __init__(self, statuses: _Optional[_Iterable[_Union[UserStatus, str]]] = ..., roles: _Optional[_Iterable[_Union[UserRole, str]]] = ..., batch_size: _Optional[int] = ..., resume_token: _Optional[str] = ...) -> None: ...
+
+class ExportUsersResponse(_message.Message):
+    __slots__ = ("users", "resume_token")
+    USERS_FIELD_NUMBER: _ClassVar[int]
+    RESUME_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    users: _containers.RepeatedCompositeFieldContainer[User]
+    resume_token: str
+    def __init__(self, users: _Optional[_Iterable[_Union[User, _Mapping]]] = ..., resume_token: _Optional[str] = ...) -> None: ...
+
 class UpdateUserProfileRequest(_message.Message):
     __slots__ = ("user_id", "profile", "update_mask")
     USER_ID_FIELD_NUMBER: _ClassVar[int]
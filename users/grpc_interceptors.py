@@ -0,0 +1,233 @@
+"""
+Server interceptors for the gRPC server.
+
+``MetricsInterceptor`` (threaded server) and ``AsyncMetricsInterceptor``
+(grpc.aio server) record, per method, the latency histogram, in-flight gauge,
+status code counter and database query count/time defined in
+``users.metrics``.
+
+``ConnectionInterceptor`` (threaded server) runs every RPC inside a
+``users.db_pool.ConnectionPool`` lease; the grpc.aio server takes its leases
+on the worker threads instead (see ``users.grpc_aio_servicer``).
+"""
+import time
+
+import grpc
+
+from users.metrics import (
+    GRPC_DB_QUERIES,
+    GRPC_DB_SECONDS,
+    GRPC_HANDLED,
+    GRPC_HANDLING_SECONDS,
+    GRPC_IN_FLIGHT,
+    QueryStats,
+    current_query_stats,
+    record_queries,
+)
+
+
+def _method_labels(full_method: str) -> tuple:
+    """Split '/package.Service/Method' into (service, method) label values."""
+    service, _, method = full_method.lstrip('/').rpartition('/')
+    return service, method
+
+
+def _code_name(code, default: str = 'OK') -> str:
+    if code is None:
+        return default
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    for status_code in grpc.StatusCode:
+        if status_code.value[0] == code:
+            return status_code.name
+    return str(code)
+
+
+def _reset(token):
+    try:
+        current_query_stats.reset(token)
+    except ValueError:
+        # A generator finalized outside the context that started it
+        pass
+
+
+def _observe(labels: tuple, started: float, code: str, stats: QueryStats):
+    GRPC_HANDLING_SECONDS.labels(*labels).observe(time.perf_counter() - started)
+    GRPC_HANDLED.labels(*labels, code).inc()
+    if stats.count:
+        GRPC_DB_QUERIES.labels(*labels).inc(stats.count)
+        GRPC_DB_SECONDS.labels(*labels).inc(stats.seconds)
+
+
+class _HandlerCache:
+    """Wrap each method's handler once instead of on every call."""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def wrap(self, handler, full_method: str):
+        if handler is None:
+            return None
+        wrapped = self._handlers.get(full_method)
+        if wrapped is None or wrapped[0] is not handler:
+            wrapped = (handler, self._wrap(handler, _method_labels(full_method)))
+            self._handlers[full_method] = wrapped
+        return wrapped[1]
+
+    def _wrap(self, handler, labels: tuple):
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.unary(handler.unary_unary, labels))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self.stream(handler.unary_stream, labels))
+        return handler
+
+
+class MetricsInterceptor(grpc.ServerInterceptor, _HandlerCache):
+    """Record per-RPC metrics on the threaded server."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        return self.wrap(continuation(handler_call_details), handler_call_details.method)
+
+    @staticmethod
+    def unary(behavior, labels: tuple):
+        def handle(request, context):
+            GRPC_IN_FLIGHT.labels(*labels).inc()
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+            started = time.perf_counter()
+            code = None
+            try:
+                with record_queries(stats):
+                    return behavior(request, context)
+            except Exception:
+                code = _code_name(context.code(), 'UNKNOWN')
+                raise
+            finally:
+                _reset(token)
+                GRPC_IN_FLIGHT.labels(*labels).dec()
+                _observe(labels, started, code or _code_name(context.code()), stats)
+
+        return handle
+
+    @staticmethod
+    def stream(behavior, labels: tuple):
+        def handle(request, context):
+            GRPC_IN_FLIGHT.labels(*labels).inc()
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+            started = time.perf_counter()
+            code = None
+            try:
+                with record_queries(stats):
+                    yield from behavior(request, context)
+            except Exception:
+                code = _code_name(context.code(), 'UNKNOWN')
+                raise
+            except GeneratorExit:
+                code = 'CANCELLED'
+                raise
+            finally:
+                _reset(token)
+                GRPC_IN_FLIGHT.labels(*labels).dec()
+                _observe(labels, started, code or _code_name(context.code()), stats)
+
+        return handle
+
+
+class ConnectionInterceptor(grpc.ServerInterceptor, _HandlerCache):
+    """Give each RPC of the threaded server a recycled database connection."""
+
+    def __init__(self, pool):
+        """
+        Initialize the interceptor.
+
+        Args:
+            pool: ConnectionPool of the server's worker threads
+        """
+        super().__init__()
+        self.pool = pool
+
+    def intercept_service(self, continuation, handler_call_details):
+        return self.wrap(continuation(handler_call_details), handler_call_details.method)
+
+    def unary(self, behavior, labels: tuple):
+        pool = self.pool
+
+        def handle(request, context):
+            slot = pool.checkout()
+            try:
+                return behavior(request, context)
+            finally:
+                pool.checkin(slot)
+
+        return handle
+
+    def stream(self, behavior, labels: tuple):
+        pool = self.pool
+
+        def handle(request, context):
+            # Responses are produced on one worker thread, which keeps the lease
+            slot = pool.checkout()
+            try:
+                yield from behavior(request, context)
+            finally:
+                pool.checkin(slot)
+
+        return handle
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor, _HandlerCache):
+    """
+    Record per-RPC metrics on the grpc.aio server.
+
+    The QueryStats of each RPC is published in ``current_query_stats``, from
+    where ``AsyncUserServiceServicer`` hands it to the worker thread running
+    the RPC so queries made there are counted.
+    """
+
+    async def intercept_service(self, continuation, handler_call_details):
+        return self.wrap(await continuation(handler_call_details), handler_call_details.method)
+
+    @staticmethod
+    def unary(behavior, labels: tuple):
+        async def handle(request, context):
+            GRPC_IN_FLIGHT.labels(*labels).inc()
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+            started = time.perf_counter()
+            code = None
+            try:
+                return await behavior(request, context)
+            except Exception:
+                code = _code_name(context.code(), 'UNKNOWN')
+                raise
+            finally:
+                _reset(token)
+                GRPC_IN_FLIGHT.labels(*labels).dec()
+                _observe(labels, started, code or _code_name(context.code()), stats)
+
+        return handle
+
+    @staticmethod
+    def stream(behavior, labels: tuple):
+        async def handle(request, context):
+            GRPC_IN_FLIGHT.labels(*labels).inc()
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+            started = time.perf_counter()
+            code = None
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            except Exception:
+                code = _code_name(context.code(), 'UNKNOWN')
+                raise
+            except BaseException:
+                code = 'CANCELLED'
+                raise
+            finally:
+                _reset(token)
+                GRPC_IN_FLIGHT.labels(*labels).dec()
+                _observe(labels, started, code or _code_name(context.code()), stats)
+
+        return handle
@@ -0,0 +1,166 @@
+"""
+Pre-fork supervisor for running several gRPC server processes on one port.
+
+The supervisor forks ``processes`` workers that each run a ``GrpcServer`` (or
+``AsyncGrpcServer``) bound with SO_REUSEPORT, so the kernel spreads incoming
+connections across them and protobuf building / password hashing is no longer
+limited to one core by the GIL. Workers that exit unexpectedly are restarted.
+SIGTERM/SIGINT are forwarded to the workers, which drain in-flight RPCs for
+``grace_period`` seconds before exiting; stragglers are killed afterwards.
+
+The supervisor itself never starts gRPC or touches the database, and closes
+any inherited Django connections before each fork so workers never share a
+database socket. It serves the metrics of all workers on ``METRICS_PORT``,
+which requires ``PROMETHEUS_MULTIPROC_DIR`` (see ``users.metrics``).
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from users.metrics import mark_process_dead, multiprocess_dir, reset_multiprocess_dir, start_http_server
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkSupervisor:
+    """Fork, supervise and gracefully stop gRPC worker processes."""
+
+    def __init__(self, port: int, processes: int, max_workers: int = 10, use_async: bool = False,
+                 max_concurrent_rpcs: int = None, grace_period: int = 5, restart_delay: float = 1.0):
+        """
+        Initialize the supervisor.
+
+        Args:
+            port: Port every worker binds with SO_REUSEPORT
+            processes: Number of worker processes
+            max_workers: Threads per worker process
+            use_async: Run grpc.aio servers in the workers
+            max_concurrent_rpcs: Per-worker cap on in-flight RPCs (async only)
+            grace_period: Seconds workers get to drain RPCs on shutdown
+            restart_delay: Minimum seconds between restarts of a crashed worker
+        """
+        self.port = port
+        self.processes = processes
+        self.max_workers = max_workers
+        self.use_async = use_async
+        self.max_concurrent_rpcs = max_concurrent_rpcs
+        self.grace_period = grace_period
+        self.restart_delay = restart_delay
+        self.workers = {}  # pid -> slot
+        self.stopping = False
+        self.metrics_server = None
+
+    def run(self):
+        """Start the workers and supervise them until they have all exited."""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGALRM, self._handle_kill)
+        self._start_metrics_server()
+
+        for slot in range(self.processes):
+            self._spawn(slot)
+        logger.info(f'Supervising {self.processes} gRPC workers on port {self.port}')
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            mark_process_dead(pid)
+            slot = self.workers.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+
+            logger.warning(f'gRPC worker {slot} (PID {pid}) exited with status {status}, restarting')
+            time.sleep(self.restart_delay)
+            if not self.stopping:
+                self._spawn(slot)
+
+        signal.alarm(0)
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        logger.info('All gRPC workers stopped')
+
+    def _start_metrics_server(self):
+        port = getattr(settings, 'METRICS_PORT', 0)
+        if not port:
+            return
+        if multiprocess_dir() is None:
+            logger.warning('Metrics endpoint disabled: set PROMETHEUS_MULTIPROC_DIR to serve the metrics '
+                           'of all gRPC workers')
+            return
+        reset_multiprocess_dir()
+        try:
+            self.metrics_server = start_http_server(port, getattr(settings, 'METRICS_ADDR', '127.0.0.1'))
+        except OSError as e:
+            logger.warning(f'Metrics endpoint disabled, cannot bind port {port}: {e}')
+
+    def _spawn(self, slot: int):
+        connections.close_all()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._run_worker(slot)
+            except Exception:
+                logger.exception(f'gRPC worker {slot} crashed')
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self.workers[pid] = slot
+        logger.info(f'Started gRPC worker {slot} (PID {pid})')
+
+    def _run_worker(self, slot: int):
+        from users.grpc_server_new import GrpcServer, serve_async
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+            signal.signal(signum, signal.SIG_DFL)
+        self.workers = {}
+        # The supervisor serves the metrics of every worker
+        if self.metrics_server:
+            self.metrics_server.server_close()
+
+        if self.use_async:
+            asyncio.run(serve_async(self.port, self.max_workers, self.max_concurrent_rpcs,
+                                    reuse_port=True, metrics_port=0,
+                                    grace_period=self.grace_period))
+            return
+
+        server = GrpcServer(port=self.port, max_workers=self.max_workers, reuse_port=True,
+                            metrics_port=0)
+
+        def stop(signum, frame):
+            server.stop(self.grace_period)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        server.start()
+        server.wait_for_termination()
+
+    def _handle_stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f'Received signal {signum}, stopping {len(self.workers)} gRPC workers...')
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        signal.alarm(self.grace_period + 5)
+
+    def _handle_kill(self, signum, frame):
+        for pid in list(self.workers):
+            logger.warning(f'gRPC worker PID {pid} did not drain in time, killing')
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
@@ -97,7 +97,7 @@ class UserServiceServicer:
     def GetUser(self, request, context):
         """Get user by ID."""
         try:
-            user = User.objects.get(id=request.user_id)
+            user = User.objects.for_user(request.user_id).get(id=request.user_id)
             return {
                 'success': True,
                 'message': 'User found.',
@@ -122,7 +122,7 @@ class UserServiceServicer:
     def GetUserByEmail(self, request, context):
         """Get user by email."""
         try:
-            user = User.objects.get(email=request.email.lower())
+            user = User.objects.for_user(request.email).get(email=request.email.lower())
             return {
                 'success': True,
                 'message': 'User found.',
@@ -151,7 +151,7 @@ class UserServiceServicer:
             user_id = token.get('user_id')
 
             try:
-                user = User.objects.get(id=user_id)
+                user = User.objects.for_user(user_id).get(id=user_id)
                 if not user.is_active:
                     return {
                         'valid': False,
@@ -6,10 +6,12 @@ It runs on port 50051 (configurable via GRPC_PORT env var) alongside Django REST
 """
 import os
 import sys
+import asyncio
 import logging
 import signal
 from concurrent import futures
 import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 
 # Add parent directory to path for Django settings
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,50 +24,124 @@ django.setup()
 
 from django.conf import settings
 from users.grpc_servicer import UserServiceServicer
-from users.grpc_generated.proto.user.v1 import user_pb2_grpc
+from users.grpc_aio_servicer import AsyncUserServiceServicer
+from users.db_pool import ConnectionPool
+from users.grpc_interceptors import AsyncMetricsInterceptor, ConnectionInterceptor, MetricsInterceptor
+from users.health import STARTING, UNHEALTHY, health_monitor
+from users.last_login import last_login_buffer
+from users.metrics import reset_multiprocess_dir, start_http_server
+from users.grpc_generated.proto.user.v1 import user_pb2, user_pb2_grpc
 
 logger = logging.getLogger(__name__)
 
+SERVER_OPTIONS = [
+    ('grpc.max_send_message_length', 50 * 1024 * 1024),  # 50MB
+    ('grpc.max_receive_message_length', 50 * 1024 * 1024),  # 50MB
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', True),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+
+# grpc.health.v1 services reported: the whole server and UserService
+HEALTH_SERVICES = (
+    health.OVERALL_HEALTH,
+    user_pb2.DESCRIPTOR.services_by_name['UserService'].full_name,
+)
+
+
+def serving_status(report: dict):
+    """Map a ``users.health`` report to a grpc.health.v1 serving status."""
+    if report['status'] in (UNHEALTHY, STARTING):
+        return health_pb2.HealthCheckResponse.NOT_SERVING
+    return health_pb2.HealthCheckResponse.SERVING
+
+
+def server_options(reuse_port: bool = False) -> list:
+    """Return the channel options for a server, optionally with SO_REUSEPORT."""
+    if reuse_port:
+        return SERVER_OPTIONS + [('grpc.so_reuseport', 1)]
+    return SERVER_OPTIONS
+
+
+def start_metrics_server(metrics_port: int = None):
+    """
+    Start the Prometheus scrape endpoint, if enabled.
+
+    Args:
+        metrics_port: Port to serve ``/metrics`` on (default: METRICS_PORT;
+            0 disables it)
+
+    Returns:
+        The HTTP server, or None if disabled or the port is unavailable.
+    """
+    if metrics_port is None:
+        metrics_port = getattr(settings, 'METRICS_PORT', 0)
+    if not metrics_port:
+        return None
+    reset_multiprocess_dir()
+    try:
+        return start_http_server(metrics_port, getattr(settings, 'METRICS_ADDR', '127.0.0.1'))
+    except OSError as e:
+        logger.warning(f'Metrics endpoint disabled, cannot bind port {metrics_port}: {e}')
+        return None
+
 
 class GrpcServer:
     """Production gRPC server for user service."""
 
-    def __init__(self, port: int = 50051, max_workers: int = 10):
+    def __init__(self, port: int = 50051, max_workers: int = 10, reuse_port: bool = False,
+                 metrics_port: int = None):
         """
         Initialize gRPC server.
 
         Args:
             port: Port to listen on (default: 50051)
             max_workers: Maximum number of worker threads
+            reuse_port: Bind with SO_REUSEPORT so several processes share the port
+            metrics_port: Port for the Prometheus endpoint (default: METRICS_PORT)
         """
         self.port = port
         self.max_workers = max_workers
+        self.reuse_port = reuse_port
+        self.metrics_port = metrics_port
         self.server = None
+        self.health_servicer = None
+        self.connection_pool = None
+        self.metrics_server = None
 
     def start(self):
         """Start the gRPC server."""
-        # Create thread pool
+        # Create thread pool, with one database connection per worker thread at most
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        self.connection_pool = ConnectionPool(idle_timeout=getattr(settings, 'GRPC_DB_IDLE_TIMEOUT', 60))
+        self.connection_pool.start(executor)
         self.server = grpc.server(
-            futures.ThreadPoolExecutor(max_workers=self.max_workers),
-            options=[
-                ('grpc.max_send_message_length', 50 * 1024 * 1024),  # 50MB
-                ('grpc.max_receive_message_length', 50 * 1024 * 1024),  # 50MB
-                ('grpc.keepalive_time_ms', 10000),
-                ('grpc.keepalive_timeout_ms', 5000),
-                ('grpc.keepalive_permit_without_calls', True),
-                ('grpc.http2.max_pings_without_data', 0),
-            ]
+            executor,
+            interceptors=[MetricsInterceptor(), ConnectionInterceptor(self.connection_pool)],
+            options=server_options(self.reuse_port),
         )
 
         # Add servicer to server
         servicer = UserServiceServicer()
         user_pb2_grpc.add_UserServiceServicer_to_server(servicer, self.server)
 
+        # grpc.health.v1, fed from the background health checks
+        self.health_servicer = health.HealthServicer()
+        for service in HEALTH_SERVICES:
+            self.health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
+        health_pb2_grpc.add_HealthServicer_to_server(self.health_servicer, self.server)
+        health_monitor.watch_pool('grpc_thread_pool', executor)
+        health_monitor.add_listener(self._publish_health)
+        health_monitor.start()
+
         # Bind to port
         self.server.add_insecure_port(f'[::]:{self.port}')
 
         # Start server
         self.server.start()
+        self.metrics_server = start_metrics_server(self.metrics_port)
 
         logger.info(f'✓ gRPC server started on port {self.port}')
         logger.info(f'  Workers: {self.max_workers}')
@@ -81,7 +157,14 @@ class GrpcServer:
         """
         if self.server:
             logger.info(f'Stopping gRPC server (grace period: {grace_period}s)...')
+            # Report NOT_SERVING while draining
+            self.health_servicer.enter_graceful_shutdown()
             self.server.stop(grace_period)
+            self.connection_pool.shutdown()
+            health_monitor.stop()
+            last_login_buffer.stop()
+            if self.metrics_server:
+                self.metrics_server.shutdown()
             logger.info('gRPC server stopped')
 
     def wait_for_termination(self):
@@ -89,6 +172,131 @@ class GrpcServer:
         if self.server:
             self.server.wait_for_termination()
 
+    def _publish_health(self, report: dict):
+        status = serving_status(report)
+        for service in HEALTH_SERVICES:
+            self.health_servicer.set(service, status)
+
+
+class AsyncGrpcServer:
+    """asyncio (grpc.aio) gRPC server for user service."""
+
+    def __init__(self, port: int = 50051, max_workers: int = 10, max_concurrent_rpcs: int = None,
+                 reuse_port: bool = False, metrics_port: int = None):
+        """
+        Initialize asyncio gRPC server.
+
+        Args:
+            port: Port to listen on (default: 50051)
+            max_workers: Threads available for blocking database calls
+            max_concurrent_rpcs: RPCs accepted at once before RESOURCE_EXHAUSTED
+                (default: unbounded)
+            reuse_port: Bind with SO_REUSEPORT so several processes share the port
+            metrics_port: Port for the Prometheus endpoint (default: METRICS_PORT)
+        """
+        self.port = port
+        self.max_workers = max_workers
+        self.max_concurrent_rpcs = max_concurrent_rpcs
+        self.reuse_port = reuse_port
+        self.metrics_port = metrics_port
+        self.server = None
+        self.servicer = None
+        self.health_servicer = None
+        self.metrics_server = None
+
+    async def start(self):
+        """Start the gRPC server on the running event loop."""
+        self.server = grpc.aio.server(
+            interceptors=[AsyncMetricsInterceptor()],
+            options=server_options(self.reuse_port),
+            maximum_concurrent_rpcs=self.max_concurrent_rpcs,
+        )
+
+        self.servicer = AsyncUserServiceServicer(max_workers=self.max_workers)
+        user_pb2_grpc.add_UserServiceServicer_to_server(self.servicer, self.server)
+
+        # grpc.health.v1, fed from the background health checks
+        self.health_servicer = health.aio.HealthServicer()
+        for service in HEALTH_SERVICES:
+            await self.health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
+        health_pb2_grpc.add_HealthServicer_to_server(self.health_servicer, self.server)
+        loop = asyncio.get_running_loop()
+
+        def publish_health(report):
+            status = serving_status(report)
+            for service in HEALTH_SERVICES:
+                asyncio.run_coroutine_threadsafe(self.health_servicer.set(service, status), loop)
+
+        health_monitor.watch_pool('grpc_thread_pool', self.servicer.executor)
+        health_monitor.add_listener(publish_health)
+        health_monitor.start()
+        # Off the event loop: the first round of checks queries the database
+        await loop.run_in_executor(None, health_monitor.report)
+
+        self.server.add_insecure_port(f'[::]:{self.port}')
+        await self.server.start()
+        self.metrics_server = start_metrics_server(self.metrics_port)
+
+        logger.info(f'✓ gRPC server (asyncio) started on port {self.port}')
+        logger.info(f'  DB worker threads: {self.max_workers}')
+        logger.info(f'  Max concurrent RPCs: {self.max_concurrent_rpcs or "unbounded"}')
+        print(f'gRPC UserService (asyncio) listening on port {self.port}')
+
+    async def stop(self, grace_period: int = 5):
+        """
+        Stop the gRPC server gracefully.
+
+        Args:
+            grace_period: Seconds to wait for pending RPCs to complete
+        """
+        if self.server:
+            logger.info(f'Stopping gRPC server (grace period: {grace_period}s)...')
+            # Report NOT_SERVING while draining
+            await self.health_servicer.enter_graceful_shutdown()
+            await self.server.stop(grace_period)
+            # Off the event loop: these join threads and write pending logins
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.servicer.shutdown)
+            await loop.run_in_executor(None, health_monitor.stop)
+            await loop.run_in_executor(None, last_login_buffer.stop)
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+            logger.info('gRPC server stopped')
+
+    async def wait_for_termination(self):
+        """Block until the server terminates."""
+        if self.server:
+            await self.server.wait_for_termination()
+
+
+async def serve_async(port: int, max_workers: int, max_concurrent_rpcs: int = None,
+                      reuse_port: bool = False, metrics_port: int = None, grace_period: int = 5):
+    """
+    Run the asyncio gRPC server until SIGINT or SIGTERM.
+
+    Args:
+        port: Port to listen on
+        max_workers: Threads available for blocking database calls
+        max_concurrent_rpcs: Optional cap on in-flight RPCs
+        reuse_port: Bind with SO_REUSEPORT so several processes share the port
+        metrics_port: Port for the Prometheus endpoint (default: METRICS_PORT)
+        grace_period: Seconds in-flight RPCs get to complete after a signal
+    """
+    server = AsyncGrpcServer(
+        port=port,
+        max_workers=max_workers,
+        max_concurrent_rpcs=max_concurrent_rpcs,
+        reuse_port=reuse_port,
+        metrics_port=metrics_port,
+    )
+    await server.start()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: asyncio.ensure_future(server.stop(grace_period)))
+
+    await server.wait_for_termination()
+
 
 def serve():
     """
@@ -101,6 +309,11 @@ def serve():
     port = getattr(settings, 'GRPC_PORT', 50051)
     max_workers = int(os.getenv('GRPC_MAX_WORKERS', '10'))
 
+    if os.getenv('GRPC_ASYNC', 'false').lower() in ('true', '1', 'yes'):
+        logger.info('Starting gRPC UserService server (asyncio)...')
+        asyncio.run(serve_async(port, max_workers))
+        return
+
     # Create and start server
     server = GrpcServer(port=port, max_workers=max_workers)
 
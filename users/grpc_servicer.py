@@ -4,77 +4,140 @@ gRPC servicer implementation for UserService.
 This module implements all RPC methods defined in user.proto using Django models.
 """
 import logging
-from datetime import datetime
+import uuid
+from datetime import timezone
 from typing import Optional
 
 import grpc
-from google.protobuf.timestamp_pb2 import Timestamp
 from google.protobuf.empty_pb2 import Empty
 from django.contrib.auth.hashers import check_password, make_password
-from django.db import transaction
+from django.db import IntegrityError
 from django.db import models
 from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 
+from users.cache import user_cache
+from users.converters import USER_FIELDS, row_to_proto, user_to_proto
+from users.hashing import PasswordHashingBusy
+from users.health import DEGRADED, HEALTHY, STARTING, UNHEALTHY, health_monitor
 from users.models import User
+from users.pagination import PaginationError, ordered, page_scope, paginate, seek, token_after
+from users.search import get_search_backend
+from users.token_validation import InactiveUserError, validate_access_token
 from users.grpc_generated.proto.user.v1 import user_pb2, user_pb2_grpc
 from users.grpc_generated.proto.common.v1 import common_pb2
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of keys accepted by the batch lookup RPCs
+MAX_BATCH_SIZE = 500
+
+HEALTH_STATUSES = {
+    HEALTHY: common_pb2.HEALTH_STATUS_HEALTHY,
+    DEGRADED: common_pb2.HEALTH_STATUS_DEGRADED,
+    UNHEALTHY: common_pb2.HEALTH_STATUS_UNHEALTHY,
+    STARTING: common_pb2.HEALTH_STATUS_UNSPECIFIED,
+}
+
+
+def _normalize_user_id(value: str) -> Optional[str]:
+    """Return the canonical string form of a UUID, or None if it is not one."""
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
+
+def health_check_response(report: dict) -> common_pb2.HealthCheckResponse:
+    """Convert a ``users.health`` report to a HealthCheckResponse."""
+    response = common_pb2.HealthCheckResponse(
+        status=HEALTH_STATUSES[report['status']],
+        version='1.0.0'
+    )
+    for name, status in report['components'].items():
+        response.components[name] = HEALTH_STATUSES[status]
+    if report['checked_at'] is not None:
+        response.checked_at.FromDatetime(report['checked_at'])
+    return response
+
 
 class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     """Implementation of UserService gRPC service."""
 
     def _user_to_proto(self, user: User) -> user_pb2.User:
         """Convert Django User model to protobuf User message."""
-        proto_user = user_pb2.User(
-            id=str(user.id),
-            email=user.email,
-            display_name=user.username or user.get_full_name(),
-            first_name=user.first_name,
-            last_name=user.last_name,
-            email_verified=user.is_verified,
-            phone_verified=False,  # Add phone verification field to model if needed
+        return user_to_proto(user)
+
+    def _status_filter(self, statuses) -> Optional[models.Q]:
+        """Return a Q matching any of the requested UserStatus values, or None."""
+        status_filters = []
+        for status in statuses:
+            if status == user_pb2.USER_STATUS_ACTIVE:
+                status_filters.append(models.Q(is_active=True, is_verified=True))
+            elif status == user_pb2.USER_STATUS_PENDING_VERIFICATION:
+                status_filters.append(models.Q(is_verified=False))
+            elif status == user_pb2.USER_STATUS_DEACTIVATED:
+                status_filters.append(models.Q(is_active=False))
+
+        if not status_filters:
+            return None
+        combined_filter = status_filters[0]
+        for f in status_filters[1:]:
+            combined_filter |= f
+        return combined_filter
+
+    def _role_filter(self, roles) -> Optional[models.Q]:
+        """Return a Q matching any of the requested UserRole values, or None."""
+        if not roles:
+            return None
+        role_filters = []
+        if user_pb2.USER_ROLE_ADMIN in roles:
+            role_filters.append(models.Q(is_superuser=True))
+        if user_pb2.USER_ROLE_CUSTOMER in roles:
+            role_filters.append(models.Q(is_superuser=False))
+        if not role_filters:
+            # Only roles this service never assigns were requested
+            return models.Q(pk__in=[])
+        combined_filter = role_filters[0]
+        for f in role_filters[1:]:
+            combined_filter |= f
+        return combined_filter
+
+    def _created_at_filter(self, time_range) -> Optional[models.Q]:
+        """Return a Q restricting date_joined to a TimeRange, or None."""
+        created_filter = models.Q()
+        if time_range.HasField('start_time'):
+            created_filter &= models.Q(date_joined__gte=time_range.start_time.ToDatetime(tzinfo=timezone.utc))
+        if time_range.HasField('end_time'):
+            created_filter &= models.Q(date_joined__lt=time_range.end_time.ToDatetime(tzinfo=timezone.utc))
+        return created_filter or None
+
+    def _paginate(self, queryset, pagination_request, sort_field: str = 'date_joined',
+                  descending: bool = True, scope: str = ''):
+        """
+        Return (rows, PaginationResponse) for one keyset page of ``queryset``.
+
+        Rows are ``USER_FIELDS`` value rows, ready for ``row_to_proto``.
+        ``scope`` binds the page tokens to the request's filters (``page_scope``).
+        """
+        page_size = min(pagination_request.page_size or 20, 100)
+        rows, next_page_token, _, total_count = paginate(
+            queryset,
+            page_size,
+            page_token=pagination_request.page_token,
+            sort_field=sort_field,
+            descending=descending,
+            fields=USER_FIELDS,
+            scope=scope,
         )
-
-        # Set phone number
-        if user.phone_number:
-            # For now, just set e164 format
-            proto_user.phone.e164 = user.phone_number
-
-        # Set status
-        if not user.is_active:
-            proto_user.status = user_pb2.USER_STATUS_DEACTIVATED
-        elif not user.is_verified:
-            proto_user.status = user_pb2.USER_STATUS_PENDING_VERIFICATION
-        else:
-            proto_user.status = user_pb2.USER_STATUS_ACTIVE
-
-        # Set roles
-        if user.is_superuser:
-            proto_user.roles.append(user_pb2.USER_ROLE_ADMIN)
-        else:
-            proto_user.roles.append(user_pb2.USER_ROLE_CUSTOMER)
-
-        # Set audit info
-        if user.date_joined:
-            created_ts = Timestamp()
-            created_ts.FromDatetime(user.date_joined)
-            proto_user.audit.created_at.CopyFrom(created_ts)
-
-        if user.updated_at:
-            updated_ts = Timestamp()
-            updated_ts.FromDatetime(user.updated_at)
-            proto_user.audit.updated_at.CopyFrom(updated_ts)
-
-        if user.last_login:
-            last_login_ts = Timestamp()
-            last_login_ts.FromDatetime(user.last_login)
-            proto_user.last_login_at.CopyFrom(last_login_ts)
-
-        return proto_user
+        pagination = common_pb2.PaginationResponse(
+            next_page_token=next_page_token,
+            total_count=total_count,
+            has_more=bool(next_page_token),
+        )
+        return rows, pagination
 
     def CreateUser(self, request: user_pb2.CreateUserRequest, context) -> user_pb2.CreateUserResponse:
         """Create a new user account."""
@@ -85,31 +148,29 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
                 context.set_details('Email is required')
                 return user_pb2.CreateUserResponse()
 
-            # Check if user already exists
-            if User.objects.filter(email=request.email.lower()).exists():
-                context.set_code(grpc.StatusCode.ALREADY_EXISTS)
-                context.set_details(f'User with email {request.email} already exists')
-                return user_pb2.CreateUserResponse()
-
-            # Create user
-            with transaction.atomic():
-                user = User.objects.create_user(
-                    email=request.email.lower(),
-                    password=request.password,
-                    first_name=request.first_name,
-                    last_name=request.last_name,
-                    username=request.display_name or request.email.split('@')[0],
-                )
-
-                if request.phone and request.phone.e164:
-                    user.phone_number = request.phone.e164
-
-                user.save()
+            # One INSERT; the unique email constraint rejects duplicates
+            user = User.objects.create_user(
+                email=request.email.lower(),
+                password=request.password,
+                first_name=request.first_name,
+                last_name=request.last_name,
+                username=request.display_name or request.email.split('@')[0],
+                phone_number=request.phone.e164,
+            )
 
-                logger.info(f'Created user: {user.email} (ID: {user.id})')
+            logger.info(f'Created user: {user.email} (ID: {user.id})')
 
             return user_pb2.CreateUserResponse(user=self._user_to_proto(user))
 
+        except IntegrityError:
+            # email is the only unique column besides the generated primary key
+            context.set_code(grpc.StatusCode.ALREADY_EXISTS)
+            context.set_details(f'User with email {request.email} already exists')
+            return user_pb2.CreateUserResponse()
+        except PasswordHashingBusy as e:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(str(e))
+            return user_pb2.CreateUserResponse()
         except Exception as e:
             logger.error(f'Error creating user: {e}', exc_info=True)
             context.set_code(grpc.StatusCode.INTERNAL)
@@ -119,8 +180,13 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def GetUser(self, request: user_pb2.GetUserRequest, context) -> user_pb2.GetUserResponse:
         """Get user by ID."""
         try:
-            user = User.objects.get(id=request.user_id)
-            return user_pb2.GetUserResponse(user=self._user_to_proto(user))
+            proto_user = user_cache.get_by_id(request.user_id)
+            if proto_user is None:
+                generation = user_cache.generation()
+                user = User.objects.for_user(request.user_id).get(id=request.user_id)
+                proto_user = self._user_to_proto(user)
+                user_cache.set(proto_user, generation)
+            return user_pb2.GetUserResponse(user=proto_user)
         except User.DoesNotExist:
             context.set_code(grpc.StatusCode.NOT_FOUND)
             context.set_details(f'User not found: {request.user_id}')
@@ -134,8 +200,13 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def GetUserByEmail(self, request: user_pb2.GetUserByEmailRequest, context) -> user_pb2.GetUserByEmailResponse:
         """Get user by email address."""
         try:
-            user = User.objects.get(email=request.email.lower())
-            return user_pb2.GetUserByEmailResponse(user=self._user_to_proto(user))
+            proto_user = user_cache.get_by_email(request.email)
+            if proto_user is None:
+                generation = user_cache.generation()
+                user = User.objects.for_user(request.email).get(email=request.email.lower())
+                proto_user = self._user_to_proto(user)
+                user_cache.set(proto_user, generation)
+            return user_pb2.GetUserByEmailResponse(user=proto_user)
         except User.DoesNotExist:
             context.set_code(grpc.StatusCode.NOT_FOUND)
             context.set_details(f'User not found: {request.email}')
@@ -146,10 +217,128 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
             context.set_details(str(e))
             return user_pb2.GetUserByEmailResponse()
 
+    def _batch_lookup(self, keys, normalize, cache_get, field: str) -> list:
+        """
+        Resolve keys to UserLookupResult messages in request order.
+
+        Keys found in the user cache are served from it; the rest are loaded
+        with a single ``<field>__in`` query.
+        """
+        resolved = {}
+        missing = set()
+        for key in keys:
+            normalized = normalize(key)
+            if normalized is None or normalized in resolved or normalized in missing:
+                continue
+            proto_user = cache_get(normalized)
+            if proto_user is None:
+                missing.add(normalized)
+            else:
+                resolved[normalized] = proto_user
+
+        if missing:
+            generation = user_cache.generation()
+            key_index = USER_FIELDS.index(field)
+            for row in User.objects.for_user(*missing).filter(**{f'{field}__in': missing}).values_list(*USER_FIELDS):
+                proto_user = row_to_proto(row)
+                user_cache.set(proto_user, generation)
+                resolved[normalize(str(row[key_index]))] = proto_user
+
+        results = []
+        for key in keys:
+            proto_user = resolved.get(normalize(key))
+            if proto_user is None:
+                results.append(user_pb2.UserLookupResult(key=key, found=False))
+            else:
+                results.append(user_pb2.UserLookupResult(key=key, found=True, user=proto_user))
+        return results
+
+    def BatchGetUsers(self, request: user_pb2.BatchGetUsersRequest, context) -> user_pb2.BatchGetUsersResponse:
+        """Get many users by ID in one round trip."""
+        try:
+            if len(request.user_ids) > MAX_BATCH_SIZE:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(f'At most {MAX_BATCH_SIZE} user IDs may be requested at once')
+                return user_pb2.BatchGetUsersResponse()
+
+            results = self._batch_lookup(
+                request.user_ids, _normalize_user_id, user_cache.get_by_id, 'id'
+            )
+            return user_pb2.BatchGetUsersResponse(results=results)
+        except Exception as e:
+            logger.error(f'Error batch getting users: {e}', exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return user_pb2.BatchGetUsersResponse()
+
+    def BatchGetUsersByEmail(
+        self, request: user_pb2.BatchGetUsersByEmailRequest, context
+    ) -> user_pb2.BatchGetUsersByEmailResponse:
+        """Get many users by email address in one round trip."""
+        try:
+            if len(request.emails) > MAX_BATCH_SIZE:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(f'At most {MAX_BATCH_SIZE} emails may be requested at once')
+                return user_pb2.BatchGetUsersByEmailResponse()
+
+            results = self._batch_lookup(
+                request.emails, str.lower, user_cache.get_by_email, 'email'
+            )
+            return user_pb2.BatchGetUsersByEmailResponse(results=results)
+        except Exception as e:
+            logger.error(f'Error batch getting users by email: {e}', exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return user_pb2.BatchGetUsersByEmailResponse()
+
+    def _validate_token(self, raw_token: str) -> user_pb2.ValidateTokenResponse:
+        """Validate one access token without touching the database."""
+        try:
+            token = validate_access_token(raw_token)
+        except TokenError as e:
+            return user_pb2.ValidateTokenResponse(valid=False, message=f'Invalid token: {e}')
+        except InactiveUserError as e:
+            return user_pb2.ValidateTokenResponse(valid=False, message=str(e))
+
+        response = user_pb2.ValidateTokenResponse(
+            valid=True,
+            message='Token is valid.',
+            user_id=str(token[api_settings.USER_ID_CLAIM]),
+        )
+        response.expires_at.seconds = int(token['exp'])
+        return response
+
+    def ValidateToken(self, request: user_pb2.ValidateTokenRequest, context) -> user_pb2.ValidateTokenResponse:
+        """Validate a JWT access token."""
+        try:
+            return self._validate_token(request.token)
+        except Exception as e:
+            logger.error(f'Error validating token: {e}', exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return user_pb2.ValidateTokenResponse()
+
+    def ValidateTokens(self, request: user_pb2.ValidateTokensRequest, context) -> user_pb2.ValidateTokensResponse:
+        """Validate many JWT access tokens in one round trip."""
+        try:
+            if len(request.tokens) > MAX_BATCH_SIZE:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(f'At most {MAX_BATCH_SIZE} tokens may be validated at once')
+                return user_pb2.ValidateTokensResponse()
+
+            return user_pb2.ValidateTokensResponse(
+                results=[self._validate_token(token) for token in request.tokens]
+            )
+        except Exception as e:
+            logger.error(f'Error validating tokens: {e}', exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return user_pb2.ValidateTokensResponse()
+
     def UpdateUser(self, request: user_pb2.UpdateUserRequest, context) -> user_pb2.UpdateUserResponse:
         """Update user information."""
         try:
-            user = User.objects.get(id=request.user_id)
+            user = User.objects.primary().get(id=request.user_id)
 
             # Update fields based on field mask
             if request.update_mask and request.update_mask.paths:
@@ -188,7 +377,7 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def DeleteUser(self, request: user_pb2.DeleteUserRequest, context) -> Empty:
         """Permanently delete a user account."""
         try:
-            user = User.objects.get(id=request.user_id)
+            user = User.objects.primary().get(id=request.user_id)
             email = user.email
             user.delete()
             logger.warning(f'Deleted user: {email} (ID: {request.user_id}), reason: {request.reason}')
@@ -206,7 +395,7 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def DeactivateUser(self, request: user_pb2.DeactivateUserRequest, context) -> user_pb2.DeactivateUserResponse:
         """Deactivate a user account (soft delete)."""
         try:
-            user = User.objects.get(id=request.user_id)
+            user = User.objects.primary().get(id=request.user_id)
             user.is_active = False
             user.save()
             logger.info(f'Deactivated user: {user.email} (ID: {user.id}), reason: {request.reason}')
@@ -224,7 +413,7 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def ReactivateUser(self, request: user_pb2.ReactivateUserRequest, context) -> user_pb2.ReactivateUserResponse:
         """Reactivate a previously deactivated account."""
         try:
-            user = User.objects.get(id=request.user_id)
+            user = User.objects.primary().get(id=request.user_id)
             user.is_active = True
             user.save()
             logger.info(f'Reactivated user: {user.email} (ID: {user.id})')
@@ -242,58 +431,37 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def ListUsers(self, request: user_pb2.ListUsersRequest, context) -> user_pb2.ListUsersResponse:
         """List users with pagination and filtering."""
         try:
-            # Get pagination parameters
-            page_size = min(request.pagination.page_size or 20, 100)
-
             # Start with base queryset
             queryset = User.objects.all()
 
             # Apply status filters
-            if request.statuses:
-                status_filters = []
-                for status in request.statuses:
-                    if status == user_pb2.USER_STATUS_ACTIVE:
-                        status_filters.append(models.Q(is_active=True, is_verified=True))
-                    elif status == user_pb2.USER_STATUS_PENDING_VERIFICATION:
-                        status_filters.append(models.Q(is_verified=False))
-                    elif status == user_pb2.USER_STATUS_DEACTIVATED:
-                        status_filters.append(models.Q(is_active=False))
-
-                if status_filters:
-                    from django.db.models import Q
-                    combined_filter = status_filters[0]
-                    for f in status_filters[1:]:
-                        combined_filter |= f
-                    queryset = queryset.filter(combined_filter)
-
-            # Apply sorting
+            status_filter = self._status_filter(request.statuses)
+            if status_filter is not None:
+                queryset = queryset.filter(status_filter)
+
+            # Apply sorting and keyset pagination
             if request.sort and request.sort.field:
-                field = request.sort.field
-                if request.sort.order == common_pb2.SORT_ORDER_DESC:
-                    field = f'-{field}'
-                queryset = queryset.order_by(field)
+                sort_field = request.sort.field
+                descending = request.sort.order == common_pb2.SORT_ORDER_DESC
             else:
-                queryset = queryset.order_by('-date_joined')
-
-            # Get total count
-            total_count = queryset.count()
+                sort_field = 'date_joined'
+                descending = True
 
-            # Apply pagination
-            users = list(queryset[:page_size])
+            scope = page_scope('ListUsers', sorted(request.statuses))
+            rows, pagination = self._paginate(queryset, request.pagination, sort_field, descending, scope)
 
             # Build response
-            proto_users = [self._user_to_proto(user) for user in users]
-
-            pagination = common_pb2.PaginationResponse(
-                total_count=total_count,
-                has_more=len(users) == page_size and total_count > page_size
-            )
+            proto_users = [row_to_proto(row) for row in rows]
 
             return user_pb2.ListUsersResponse(
                 users=proto_users,
                 pagination=pagination
             )
 
+        except PaginationError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return user_pb2.ListUsersResponse()
         except Exception as e:
             logger.error(f'Error listing users: {e}', exc_info=True)
             context.set_code(grpc.StatusCode.INTERNAL)
@@ -303,81 +471,107 @@ class UserServiceServicer(user_pb2_grpc.UserServiceServicer):
     def SearchUsers(self, request: user_pb2.SearchUsersRequest, context) -> user_pb2.SearchUsersResponse:
         """Search for users by criteria."""
         try:
-            from django.db.models import Q
-
-            # Get pagination parameters
-            page_size = min(request.pagination.page_size or 20, 100)
-
-            # Build search query
             queryset = User.objects.all()
 
-            if request.query:
-                queryset = queryset.filter(
-                    Q(email__icontains=request.query) |
-                    Q(first_name__icontains=request.query) |
-                    Q(last_name__icontains=request.query) |
-                    Q(username__icontains=request.query)
-                )
-
-            # Apply status filters (same as ListUsers)
-            if request.statuses:
-                # Similar filtering logic as ListUsers
-                pass
-
-            # Get total count
-            total_count = queryset.count()
+            status_filter = self._status_filter(request.statuses)
+            if status_filter is not None:
+                queryset = queryset.filter(status_filter)
+            role_filter = self._role_filter(request.roles)
+            if role_filter is not None:
+                queryset = queryset.filter(role_filter)
+            if request.HasField('created_at'):
+                created_filter = self._created_at_filter(request.created_at)
+                if created_filter is not None:
+                    queryset = queryset.filter(created_filter)
+
+            # Rank matches by relevance; without a query, newest first
+            if request.query.strip():
+                queryset = get_search_backend().search(queryset, request.query)
+                sort_field = 'relevance'
+            else:
+                sort_field = 'date_joined'
 
-            # Apply pagination
-            users = list(queryset[:page_size])
+            scope = page_scope(
+                'SearchUsers', sorted(request.statuses), sorted(request.roles),
+                request.created_at.SerializeToString(deterministic=True).hex() if request.HasField('created_at') else '',
+                request.query.strip(),
+            )
+            rows, pagination = self._paginate(queryset, request.pagination, sort_field, scope=scope)
 
             # Build response
-            proto_users = [self._user_to_proto(user) for user in users]
-
-            pagination = common_pb2.PaginationResponse(
-                total_count=total_count,
-                has_more=len(users) == page_size and total_count > page_size
-            )
+            proto_users = [row_to_proto(row) for row in rows]
 
             return user_pb2.SearchUsersResponse(
                 users=proto_users,
                 pagination=pagination
             )
 
+        except PaginationError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return user_pb2.SearchUsersResponse()
         except Exception as e:
             logger.error(f'Error searching users: {e}', exc_info=True)
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(str(e))
             return user_pb2.SearchUsersResponse()
 
-    def HealthCheck(self, request: Empty, context) -> common_pb2.HealthCheckResponse:
-        """Return service health status."""
-        try:
-            # Check database connectivity
-            User.objects.count()
-
-            response = common_pb2.HealthCheckResponse(
-                status=common_pb2.HEALTH_STATUS_HEALTHY,
-                version='1.0.0'
-            )
+    def ExportUsers(self, request: user_pb2.ExportUsersRequest, context):
+        """
+        Stream every user matching the filters in (created_at, id) order.
 
-            # Add component health
-            response.components['database'] = common_pb2.HEALTH_STATUS_HEALTHY
-
-            # Set checked_at timestamp
-            now = Timestamp()
-            now.FromDatetime(datetime.utcnow())
-            response.checked_at.CopyFrom(now)
+        Rows are read with a chunked iterator and sent in batches, each with
+        a resume token, so memory stays flat regardless of table size.
+        """
+        try:
+            batch_size = min(request.batch_size or 500, 1000)
 
-            return response
+            queryset = User.objects.all()
+            status_filter = self._status_filter(request.statuses)
+            if status_filter is not None:
+                queryset = queryset.filter(status_filter)
+            role_filter = self._role_filter(request.roles)
+            if role_filter is not None:
+                queryset = queryset.filter(role_filter)
+            scope = page_scope('ExportUsers', sorted(request.statuses), sorted(request.roles))
+            if request.resume_token:
+                queryset, _ = seek(queryset, request.resume_token, 'date_joined', descending=False, scope=scope)
+
+            batch = []
+            exported = 0
+            rows = ordered(queryset, 'date_joined', descending=False).values_list(*USER_FIELDS, named=True)
+            for user in rows.iterator(chunk_size=batch_size):
+                batch.append(row_to_proto(user))
+                if len(batch) == batch_size:
+                    exported += len(batch)
+                    yield user_pb2.ExportUsersResponse(
+                        users=batch,
+                        resume_token=token_after(user, 'date_joined', descending=False, scope=scope),
+                    )
+                    batch = []
+                    if not context.is_active():
+                        logger.info(f'ExportUsers cancelled by client after {exported} users')
+                        return
+
+            if batch:
+                exported += len(batch)
+                yield user_pb2.ExportUsersResponse(
+                    users=batch,
+                    resume_token=token_after(user, 'date_joined', descending=False, scope=scope),
+                )
+            logger.info(f'Exported {exported} users')
 
+        except PaginationError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
         except Exception as e:
-            logger.error(f'Health check failed: {e}', exc_info=True)
-            response = common_pb2.HealthCheckResponse(
-                status=common_pb2.HEALTH_STATUS_UNHEALTHY,
-                version='1.0.0'
-            )
-            response.components['database'] = common_pb2.HEALTH_STATUS_UNHEALTHY
-            return response
+            logger.error(f'Error exporting users: {e}', exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+
+    def HealthCheck(self, request: Empty, context) -> common_pb2.HealthCheckResponse:
+        """Return service health status from the cached health report."""
+        return health_check_response(health_monitor.report())
 
     # Stub implementations for other methods (to be fully implemented later)
     def UpdateUserProfile(self, request, context):
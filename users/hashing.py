@@ -0,0 +1,161 @@
+"""
+Password hashing off the request threads.
+
+PBKDF2 costs hundreds of milliseconds of CPU per call. ``User.set_password``
+and ``User.check_password`` (and therefore ``authenticate``, registration,
+password changes and the gRPC ``CreateUser``) hand that work to a dedicated
+process pool of ``PASSWORD_HASHING_WORKERS`` processes, so a login burst uses
+at most that many cores instead of every request thread.
+
+Every server process (each gunicorn worker and each gRPC process) has its own
+pool, so the default is a single hashing process; size it so that processes
+times ``PASSWORD_HASHING_WORKERS`` stays within the available cores.
+
+At most ``PASSWORD_HASHING_MAX_PENDING`` operations may be running or queued
+per process; beyond that ``PasswordHashingBusy`` is raised right away, which
+the REST API returns as 429 (``users.views.exception_handler``) and the gRPC
+servicer as RESOURCE_EXHAUSTED.
+
+With ``PASSWORD_HASHING_WORKERS=0`` hashing runs inline on the calling
+thread, still subject to the pending limit.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASHING_REJECTED = Counter(
+    'password_hashing_rejected_total', 'Password operations rejected because the pool was saturated.')
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password operations are already pending."""
+
+    # Seconds after which clients should retry
+    retry_after = 1
+
+    def __init__(self, message: str = 'Too many password operations in progress.'):
+        super().__init__(message)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _check_password(password, encoded):
+    must_update = []
+    is_correct = hashers.check_password(password, encoded, setter=lambda raw: must_update.append(True))
+    return is_correct, bool(must_update)
+
+
+class PasswordHasherPool:
+    """Bounded pool that runs password hashers in worker processes."""
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 64):
+        """
+        Initialize the pool; worker processes start on first use.
+
+        Args:
+            max_workers: Worker processes (0 hashes inline)
+            max_pending: Operations allowed to run or wait at once
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def make_password(self, password) -> str:
+        """Hash ``password`` with the default hasher (see Django's make_password)."""
+        if password is None:
+            # Unusable password: no hashing involved
+            return hashers.make_password(None)
+        return self._run(_make_password, password)
+
+    def make_passwords(self, passwords: list) -> list:
+        """
+        Hash many passwords, spread over all workers, for bulk jobs.
+
+        Not subject to the pending limit: meant for management commands that
+        own the process, not for request handlers.
+        """
+        if self.max_workers <= 0:
+            return [_make_password(password) for password in passwords]
+        chunksize = max(len(passwords) // (self.max_workers * 4), 1)
+        return list(self._get_executor().map(_make_password, passwords, chunksize=chunksize))
+
+    def check_password(self, password, encoded, setter=None) -> bool:
+        """
+        Verify ``password`` against ``encoded`` (see Django's check_password).
+
+        ``setter(password)`` is called in this process when the password is
+        correct but its hash needs upgrading.
+        """
+        if password is None or not hashers.is_password_usable(encoded):
+            return False
+        is_correct, must_update = self._run(_check_password, password, encoded)
+        if setter and is_correct and must_update:
+            setter(password)
+        return is_correct
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASHING_REJECTED.inc()
+            raise PasswordHashingBusy()
+        try:
+            if self.max_workers <= 0:
+                return fn(*args)
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                logger.warning('Password hashing pool broke, restarting it')
+                self._reset_executor()
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that runs gRPC threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                    )
+                executor = self._executor
+        return executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher_pool = PasswordHasherPool(
+    max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 1),
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 64),
+)
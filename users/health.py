@@ -0,0 +1,235 @@
+"""
+Background health checks shared by the REST and gRPC health endpoints.
+
+A daemon thread runs the component checks every ``HEALTH_CHECK_INTERVAL``
+seconds and caches the result; probes (REST ``/api/health/``, gRPC
+``HealthCheck`` and ``grpc.health.v1.Health``) only read the cached report,
+so probing costs no database work however often an orchestrator asks.
+
+Components:
+    database: ``SELECT 1`` on the primary database (critical)
+    database_replicas: replicas usable for reads, as last measured by
+        ``users.routers.replica_monitor`` (degraded while any lags or is down;
+        only registered when ``READ_REPLICAS`` are configured)
+    token_blacklist: one indexed ``LIMIT 1`` read of each token blacklist table
+    <pool>: backlog of each watched thread pool (degraded while work queues)
+
+The overall status is ``unhealthy`` if a critical component is, ``degraded``
+if any other component is not healthy, and ``unhealthy`` when the report is
+older than three intervals (e.g. the checker is stuck on a hung connection);
+a watchdog thread pushes that state to listeners too. Until the first round
+completes the status is ``starting``.
+
+Servers start the monitor when they start (``rungrpc`` and the gunicorn
+``post_worker_init`` hook), so the first probe finds a report ready.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .metrics import Gauge
+from .models import User
+from .routers import replica_monitor
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+UNHEALTHY = 'unhealthy'
+STARTING = 'starting'
+
+HEALTH_STATUS = Gauge(
+    'health_status', 'Component health from the last check (1 healthy, 0.5 degraded, 0 unhealthy).',
+    ('component',), multiprocess_mode='livemin')
+HEALTH_CHECK_SECONDS = Gauge(
+    'health_check_duration_seconds', 'Time taken by the last round of health checks.',
+    multiprocess_mode='livemax')
+
+_STATUS_VALUES = {HEALTHY: 1, DEGRADED: 0.5, UNHEALTHY: 0}
+
+
+def check_database() -> str:
+    """Run ``SELECT 1`` on the database users are written to."""
+    with connections[router.db_for_write(User)].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return HEALTHY
+
+
+def check_replicas() -> str:
+    """Report whether every read replica is reachable and within the allowed lag."""
+    # Measure now if the monitor has not completed a round yet
+    available = replica_monitor.available() if replica_monitor.lags() else replica_monitor.check()
+    return HEALTHY if len(available) == len(replica_monitor.aliases) else DEGRADED
+
+
+def check_token_blacklist() -> str:
+    """Read one row from each token blacklist table (an index-only LIMIT 1)."""
+    OutstandingToken.objects.exists()
+    BlacklistedToken.objects.exists()
+    return HEALTHY
+
+
+class HealthMonitor:
+    """Run health checks on an interval and serve the cached report."""
+
+    def __init__(self, interval: float = 5.0):
+        """
+        Initialize the monitor; the check thread starts on first use.
+
+        Args:
+            interval: Seconds between rounds of checks
+        """
+        self.interval = interval
+        self._checks = {}  # name -> (check, critical)
+        self._listeners = []
+        self._report = None
+        self._ready = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+
+    def register(self, name: str, check, critical: bool = False):
+        """
+        Add a component check.
+
+        Args:
+            name: Component name in reports
+            check: Callable returning HEALTHY, DEGRADED or UNHEALTHY; raising
+                counts as UNHEALTHY
+            critical: Whether this component being unhealthy makes the
+                service unhealthy (otherwise it is degraded)
+        """
+        self._checks[name] = (check, critical)
+
+    def watch_pool(self, name: str, executor):
+        """Report a ThreadPoolExecutor as degraded while tasks wait for a thread."""
+        def check():
+            # Work items not yet picked up by a thread (CPython internal queue,
+            # so report healthy on an executor without one)
+            queue = getattr(executor, '_work_queue', None)
+            return DEGRADED if queue is not None and queue.qsize() else HEALTHY
+
+        self.register(name, check)
+
+    def add_listener(self, callback):
+        """Call ``callback(report)`` after every round of checks."""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Start the check thread, if not running."""
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                self._stopped = False
+                self._wakeup.clear()
+                self._threads = [
+                    threading.Thread(target=self._run, name='health-checks', daemon=True),
+                    threading.Thread(target=self._watch, name='health-watchdog', daemon=True),
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def stop(self):
+        """Stop the check threads."""
+        self._stopped = True
+        self._wakeup.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=self.interval * 2)
+
+    def report(self, wait: float = 1.0) -> dict:
+        """
+        Return the cached report, starting the check thread if needed.
+
+        Args:
+            wait: Seconds to wait for the first round of checks (0 never
+                blocks, for callers on an event loop)
+
+        Returns:
+            ``{'status', 'components', 'checked_at'}``. Until the first round
+            completes the status is STARTING and ``checked_at`` is None.
+        """
+        report = self._report
+        if report is None:
+            self.start()
+            if wait > 0:
+                self._ready.wait(wait)
+            report = self._report
+            if report is None:
+                return {'status': STARTING, 'components': {}, 'checked_at': None}
+        if self._is_stale(report):
+            return {**report, 'status': UNHEALTHY}
+        return report
+
+    def refresh(self) -> dict:
+        """Run every check now and cache the result."""
+        started = time.monotonic()
+        components = {}
+        status = HEALTHY
+        for name, (check, critical) in self._checks.items():
+            try:
+                result = check()
+            except Exception as e:
+                logger.warning(f'Health check {name} failed: {e}')
+                result = UNHEALTHY
+            components[name] = result
+            HEALTH_STATUS.labels(name).set(_STATUS_VALUES[result])
+            if result == UNHEALTHY and critical:
+                status = UNHEALTHY
+            elif result != HEALTHY and status == HEALTHY:
+                status = DEGRADED
+        HEALTH_CHECK_SECONDS.set(time.monotonic() - started)
+
+        self._report = {
+            'status': status,
+            'components': components,
+            'checked_at': timezone.now(),
+            'checked_monotonic': time.monotonic(),
+        }
+        self._ready.set()
+        self._notify(self._report)
+        return self._report
+
+    def _is_stale(self, report: dict) -> bool:
+        return time.monotonic() - report['checked_monotonic'] > self.interval * 3
+
+    def _notify(self, report: dict):
+        for listener in self._listeners:
+            try:
+                listener(report)
+            except Exception:
+                logger.exception('Health listener failed')
+
+    def _run(self):
+        while not self._stopped:
+            close_old_connections()
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Health checks failed')
+            self._wakeup.wait(self.interval)
+        connections.close_all()
+
+    def _watch(self):
+        while not self._wakeup.wait(self.interval):
+            report = self._report
+            if report is not None and self._is_stale(report):
+                logger.warning('Health checks are stuck, reporting unhealthy')
+                self._notify({**report, 'status': UNHEALTHY})
+
+
+health_monitor = HealthMonitor(interval=getattr(settings, 'HEALTH_CHECK_INTERVAL', 5))
+health_monitor.register('database', check_database, critical=True)
+health_monitor.register('token_blacklist', check_token_blacklist)
+if replica_monitor.aliases:
+    health_monitor.register('database_replicas', check_replicas)
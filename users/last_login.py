@@ -0,0 +1,188 @@
+"""
+Write-behind buffer for ``User.last_login``.
+
+Instead of one ``UPDATE`` per login, logins are recorded in memory (the latest
+timestamp per user wins) and written by a background thread in one bulk
+statement every ``LAST_LOGIN_FLUSH_INTERVAL`` seconds, or as soon as
+``LAST_LOGIN_FLUSH_SIZE`` users are pending. On PostgreSQL that statement is
+``UPDATE ... FROM (VALUES ...)``; other databases get an equivalent
+``CASE WHEN`` update. A row is only moved forward, so a slower process never
+overwrites a newer login.
+
+The buffer is flushed when the gRPC server stops and at interpreter exit
+(WSGI workers). Until a flush, ``last_login`` in the database and in the user
+caches lags by up to the flush interval; a process killed without shutting
+down loses its pending entries. The bulk update sends no ``post_save``, so
+each flush drops the cached copies of the users it wrote itself.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .authentication import auth_user_cache
+from .cache import user_cache
+from .metrics import Counter
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Rows per UPDATE statement
+CHUNK_SIZE = 500
+
+LAST_LOGIN_FLUSHED = Counter(
+    'last_login_flushed_total', 'last_login values written by the write-behind buffer.')
+LAST_LOGIN_COALESCED = Counter(
+    'last_login_coalesced_total', 'Logins merged into a pending last_login update for the same user.')
+
+
+class LastLoginBuffer:
+    """Coalesce last_login updates and write them in bulk from a thread."""
+
+    def __init__(self, flush_interval: float = 5.0, flush_size: int = 1000):
+        """
+        Initialize the buffer; the flush thread starts on the first record.
+
+        Args:
+            flush_interval: Seconds between flushes (0 writes synchronously)
+            flush_size: Pending users that trigger an early flush
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending = {}  # user id -> last login
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    def record(self, user, when=None):
+        """
+        Record a login of ``user`` and set ``user.last_login`` on the instance.
+
+        Args:
+            user: User instance (only ``pk`` and ``last_login`` are used)
+            when: Login time (default: now)
+        """
+        when = when or timezone.now()
+        user.last_login = when
+        if self.flush_interval <= 0 or self._stopped:
+            self._write({user.pk: when})
+            return
+        with self._lock:
+            previous = self._pending.get(user.pk)
+            if previous is not None:
+                LAST_LOGIN_COALESCED.inc()
+            if previous is None or previous < when:
+                self._pending[user.pk] = when
+            pending = len(self._pending)
+        self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write every pending last_login now; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                self._write(pending)
+            except Exception:
+                # Put the entries back unless newer logins replaced them
+                with self._lock:
+                    for user_id, when in pending.items():
+                        current = self._pending.get(user_id)
+                        if current is None or current < when:
+                            self._pending[user_id] = when
+                raise
+            return len(pending)
+
+    def stop(self):
+        """Stop the flush thread and write what is pending."""
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=max(self.flush_interval, 1) * 2)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush pending last_login updates')
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='last-login-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush pending last_login updates')
+        connections.close_all()
+
+    def _write(self, pending: dict):
+        items = list(pending.items())
+        for start in range(0, len(items), CHUNK_SIZE):
+            chunk = items[start:start + CHUNK_SIZE]
+            if connections[router.db_for_write(User)].vendor == 'postgresql':
+                _update_from_values(chunk)
+            else:
+                _update_with_case(chunk)
+        for user_id, _ in items:
+            user_cache.invalidate(str(user_id))
+            auth_user_cache.invalidate(str(user_id))
+        LAST_LOGIN_FLUSHED.inc(len(items))
+        logger.debug(f'Flushed last_login for {len(items)} users')
+
+
+def _update_from_values(chunk: list):
+    """``UPDATE users SET last_login = v.last_login FROM (VALUES ...) v`` (PostgreSQL)."""
+    connection = connections[router.db_for_write(User)]
+    qn = connection.ops.quote_name
+    table = qn(User._meta.db_table)
+    pk = qn(User._meta.pk.column)
+    last_login = qn(User._meta.get_field('last_login').column)
+    values = ', '.join(['(%s::uuid, %s::timestamptz)'] * len(chunk))
+    params = [param for user_id, when in chunk for param in (str(user_id), when)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} AS u SET {last_login} = v.last_login '
+            f'FROM (VALUES {values}) AS v(id, last_login) '
+            f'WHERE u.{pk} = v.id AND (u.{last_login} IS NULL OR u.{last_login} < v.last_login)',
+            params,
+        )
+
+
+def _update_with_case(chunk: list):
+    """Single ``UPDATE ... SET last_login = CASE ...`` for other databases."""
+    newer = [
+        When(Q(pk=user_id) & (Q(last_login__isnull=True) | Q(last_login__lt=when)), then=Value(when))
+        for user_id, when in chunk
+    ]
+    users = User.objects.db_manager(router.db_for_write(User))
+    users.filter(pk__in=[user_id for user_id, _ in chunk]).update(
+        last_login=Case(*newer, default=F('last_login')),
+    )
+
+
+last_login_buffer = LastLoginBuffer(
+    flush_interval=getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 5),
+    flush_size=getattr(settings, 'LAST_LOGIN_FLUSH_SIZE', 1000),
+)
@@ -0,0 +1,78 @@
+"""
+Django management command to benchmark the configured password hashers.
+
+Reports password verifications per second on one core for every hasher in
+PASSWORD_HASHERS, and optionally the throughput of the password hashing pool.
+
+Usage:
+    python manage.py benchhashers
+    python manage.py benchhashers --iterations 50
+    python manage.py benchhashers --pool
+"""
+import os
+import time
+from concurrent import futures
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+from users.hashing import password_hasher_pool
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = 'Measure password verifications/sec per core for the configured hashers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Verifications timed per hasher (default: 20)',
+        )
+        parser.add_argument(
+            '--pool',
+            action='store_true',
+            help='Also measure the password hashing pool with concurrent verifications',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        self.stdout.write(f"{'hasher':<28}{'verify ms':>12}{'verifies/sec/core':>20}")
+        for hasher in get_hashers():
+            name = type(hasher).__name__
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except (ImportError, ValueError) as e:
+                self.stdout.write(f'{name:<28}{"unavailable":>12}  ({e})')
+                continue
+
+            hasher.verify(PASSWORD, encoded)
+            started = time.process_time()
+            for _ in range(iterations):
+                hasher.verify(PASSWORD, encoded)
+            per_call = (time.process_time() - started) / iterations
+            self.stdout.write(f'{name:<28}{per_call * 1000:>12.1f}{1 / per_call:>20.1f}')
+
+        if options['pool']:
+            self._bench_pool(iterations)
+
+    def _bench_pool(self, iterations: int):
+        pool = password_hasher_pool
+        workers = max(pool.max_workers, 1)
+        encoded = pool.make_password(PASSWORD)
+        calls = iterations * workers
+
+        started = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=min(workers * 2, pool.max_pending)) as threads:
+            results = list(threads.map(lambda _: pool.check_password(PASSWORD, encoded), range(calls)))
+        elapsed = time.perf_counter() - started
+
+        assert all(results)
+        self.stdout.write('')
+        self.stdout.write(
+            f'Pool ({pool.max_workers} workers, {os.cpu_count()} CPUs): '
+            f'{calls / elapsed:.1f} verifies/sec with the default hasher'
+        )
@@ -0,0 +1,273 @@
+"""
+Django management command to bulk import users from CSV or JSON Lines.
+
+The input is streamed and processed in batches. Each batch is validated,
+deduplicated against the file and (with one query) the database, has its
+plain-text passwords hashed in parallel on a process pool, and is written
+with one ``bulk_create`` INSERT. Rejected rows are written, without
+passwords, to a JSON Lines reject file with the reason.
+
+Columns (CSV header) or keys (JSON Lines):
+    email (required), username, first_name, last_name, phone_number,
+    is_verified, and either password (plain text) or password_hash (already
+    encoded for one of PASSWORD_HASHERS). Rows with neither get an unusable
+    password.
+
+Imported users bypass post_save: running servers pick them up in search
+after their next index rebuild.
+
+Usage:
+    python manage.py importusers customers.csv
+    python manage.py importusers customers.jsonl --batch-size 5000 --workers 8
+    cat customers.jsonl | python manage.py importusers - --format jsonl --rejects rejects.jsonl
+"""
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, router, transaction
+
+from users.hashing import PasswordHasherPool
+from users.models import User
+
+OPTIONAL_FIELDS = ('username', 'first_name', 'last_name', 'phone_number')
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+SECRET_FIELDS = ('password', 'password_hash')
+
+
+class Reject(Exception):
+    """A row that cannot be imported; the message is the reason."""
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file ("-" reads stdin)')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated, hashed and inserted together (default: 1000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Password hashing processes (default: CPU count; 0 hashes inline)',
+        )
+        parser.add_argument(
+            '--rejects',
+            help='JSON Lines file for rejected rows (default: <path>.rejects.jsonl)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format']
+        if input_format is None:
+            if path == '-':
+                raise CommandError('--format is required when reading stdin')
+            input_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        workers = options['workers']
+        if workers is None:
+            # The command owns the process: hash on every core, not the per-server share
+            workers = os.cpu_count() or 1
+        self.pool = PasswordHasherPool(max_workers=workers)
+        reject_path = options['rejects'] or f'{"importusers" if path == "-" else path}.rejects.jsonl'
+        self.rejects = _RejectFile(reject_path)
+        self.seen = set()
+        self.read = self.imported = 0
+
+        started = time.perf_counter()
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            rows = _read_jsonl(source) if input_format == 'jsonl' else _read_csv(source)
+            for batch in _batches(rows, batch_size):
+                self.read += len(batch)
+                self.imported += self._import_batch(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{self.read} read, {self.imported} imported, {self.rejects.count} rejected '
+                    f'({self.read / elapsed:.0f} rows/sec)'
+                )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            self.rejects.close()
+            self.pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} of {self.read} users in {elapsed:.1f}s '
+            f'({self.imported / elapsed if elapsed else 0:.0f} users/sec)'
+        ))
+        if self.rejects.count:
+            self.stdout.write(self.style.WARNING(f'{self.rejects.count} rows rejected, see {self.rejects.path}'))
+
+    def _import_batch(self, batch: list) -> int:
+        pending = []  # (line, row, user, plain-text password or None)
+        for line, row in batch:
+            if isinstance(row, Reject):
+                self.rejects.write(line, {}, str(row))
+                continue
+            try:
+                user, password = _build_user(row)
+            except Reject as e:
+                self.rejects.write(line, row, str(e))
+                continue
+            if user.email in self.seen:
+                self.rejects.write(line, row, 'duplicate email in input')
+                continue
+            self.seen.add(user.email)
+            pending.append((line, row, user, password))
+
+        # Before hashing, which is by far the most expensive step
+        pending = self._drop_existing(pending)
+
+        to_hash = [entry for entry in pending if entry[3] is not None]
+        hashed = self.pool.make_passwords([entry[3] for entry in to_hash])
+        for (_, _, user, _), encoded in zip(to_hash, hashed):
+            user.password = encoded
+        for _, _, user, password in pending:
+            if password is None and not user.password:
+                user.password = make_password(None)
+
+        return self._insert(pending)
+
+    def _drop_existing(self, pending: list) -> list:
+        if not pending:
+            return pending
+        emails = [entry[2].email for entry in pending]
+        users = User.objects.db_manager(router.db_for_write(User))
+        existing = set(users.filter(email__in=emails).values_list('email', flat=True))
+        kept = []
+        for entry in pending:
+            if entry[2].email in existing:
+                self.rejects.write(entry[0], entry[1], 'email already exists')
+            else:
+                kept.append(entry)
+        return kept
+
+    def _insert(self, pending: list) -> int:
+        while pending:
+            users = [entry[2] for entry in pending]
+            try:
+                with transaction.atomic(using=router.db_for_write(User)):
+                    User.objects.bulk_create(users, batch_size=len(users))
+                return len(users)
+            except IntegrityError:
+                # Another writer created some of these emails since the check
+                remaining = self._drop_existing(pending)
+                if len(remaining) == len(pending):
+                    raise
+                pending = remaining
+        return 0
+
+
+class _RejectFile:
+    """Lazily created JSON Lines file of rejected rows."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, line: int, row: dict, reason: str):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        row = {key: value for key, value in row.items() if key not in SECRET_FIELDS}
+        self._file.write(json.dumps({'line': line, 'reason': reason, 'row': row}, default=str) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _read_csv(source):
+    reader = csv.DictReader(source)
+    if not reader.fieldnames or 'email' not in reader.fieldnames:
+        raise CommandError('CSV input needs a header row with an "email" column')
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_jsonl(source):
+    for line, text in enumerate(source, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, Reject(f'invalid JSON: {e}')
+            continue
+        yield line, row if isinstance(row, dict) else Reject('not a JSON object')
+
+
+def _batches(rows, size: int):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(row: dict, name: str) -> str:
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def _build_user(row: dict):
+    """Validate a row and return (unsaved User, plain-text password or None)."""
+    email = _text(row, 'email').lower()
+    if not email:
+        raise Reject('email is required')
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise Reject('invalid email')
+
+    values = {'email': email, **{name: _text(row, name) for name in OPTIONAL_FIELDS}}
+    for name, value in values.items():
+        max_length = User._meta.get_field(name).max_length
+        if len(value) > max_length:
+            raise Reject(f'{name} longer than {max_length} characters')
+
+    password = None
+    password_hash = _text(row, 'password_hash')
+    if password_hash:
+        try:
+            identify_hasher(password_hash)
+        except ValueError:
+            raise Reject('password_hash is not in a format of PASSWORD_HASHERS')
+    elif row.get('password') not in (None, ''):
+        password = str(row['password'])
+
+    user = User(
+        id=uuid.uuid4(),
+        password=password_hash,
+        is_verified=_text(row, 'is_verified').lower() in TRUE_VALUES,
+        **values,
+    )
+    user.search_text = user.build_search_text()
+    return user, password
+
@@ -5,9 +5,15 @@ Usage:
     python manage.py rungrpc
     python manage.py rungrpc --port 50052
     python manage.py rungrpc --workers 20
+    python manage.py rungrpc --async --workers 20 --max-concurrent-rpcs 5000
+    python manage.py rungrpc --processes 4
 """
-from django.core.management.base import BaseCommand
-from users.grpc_server_new import serve, GrpcServer
+import asyncio
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from users.grpc_server_new import serve, serve_async, GrpcServer
+from users.grpc_prefork import PreforkSupervisor
 
 
 class Command(BaseCommand):
@@ -26,11 +32,62 @@ class Command(BaseCommand):
             default=10,
             help='Maximum number of worker threads (default: 10)',
         )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Run a grpc.aio server; --workers then bounds the threads used for DB calls',
+        )
+        parser.add_argument(
+            '--max-concurrent-rpcs',
+            type=int,
+            default=None,
+            help='With --async, reject RPCs beyond this many in flight (default: unbounded)',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Worker processes sharing the port via SO_REUSEPORT (default: 1)',
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=5,
+            help='Seconds workers get to drain in-flight RPCs on shutdown (default: 5)',
+        )
 
     def handle(self, *args, **options):
         port = options['port']
         workers = options['workers']
 
+        if options['processes'] > 1:
+            if not hasattr(os, 'fork'):
+                raise CommandError('--processes requires a platform with os.fork()')
+            self.stdout.write(self.style.SUCCESS(
+                f'Starting {options["processes"]} gRPC worker processes on port {port} '
+                f'with {workers} threads each...'
+            ))
+            PreforkSupervisor(
+                port=port,
+                processes=options['processes'],
+                max_workers=workers,
+                use_async=options['use_async'],
+                max_concurrent_rpcs=options['max_concurrent_rpcs'],
+                grace_period=options['grace_period'],
+            ).run()
+            self.stdout.write(self.style.SUCCESS('Server stopped'))
+            return
+
+        if options['use_async']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Starting asyncio gRPC server on port {port} with {workers} DB threads...'
+            ))
+            asyncio.run(serve_async(port, workers, options['max_concurrent_rpcs'],
+                                    grace_period=options['grace_period']))
+            self.stdout.write(self.style.SUCCESS('Server stopped'))
+            return
+
         self.stdout.write(self.style.SUCCESS(
             f'Starting gRPC server on port {port} with {workers} workers...'
         ))
@@ -0,0 +1,154 @@
+"""
+Prometheus metrics for the gRPC server and the REST API.
+
+Metrics are ``prometheus_client`` counters, gauges and histograms, recorded
+by ``users.grpc_interceptors.MetricsInterceptor`` (gRPC) and
+``users.middleware.MetricsMiddleware`` (REST), among others.
+
+A server with several worker processes (gunicorn, ``rungrpc --processes``)
+runs prometheus_client in multiprocess mode: ``PROMETHEUS_MULTIPROC_DIR``
+names an empty directory, one per server, set before the server starts.
+The workers write their samples there, and the parent process serves the
+sum from a single port (``METRICS_PORT`` for gRPC, ``REST_METRICS_PORT`` for
+gunicorn) bound to ``METRICS_ADDR``. Without it a process serves its own
+metrics.
+"""
+import contextvars
+import glob
+import logging
+import os
+import time
+from typing import Optional
+
+from django.db import connections
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client import start_http_server as _start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def multiprocess_dir() -> Optional[str]:
+    """Return the prometheus_client multiprocess directory, or None outside multiprocess mode."""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None
+
+
+def reset_multiprocess_dir():
+    """Drop the samples of a previous run; call in the serving process before starting workers."""
+    path = multiprocess_dir()
+    if path is None:
+        return
+    os.makedirs(path, exist_ok=True)
+    own = f'_{os.getpid()}.db'
+    for stale in glob.glob(os.path.join(path, '*.db')):
+        # Files are named <type>_<pid>.db; this process may already have its own
+        if not stale.endswith(own):
+            os.remove(stale)
+
+
+def mark_process_dead(pid: int):
+    """Drop the live gauges of an exited worker; call in the parent."""
+    if multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(pid)
+
+
+def start_http_server(port: int, addr: str = '127.0.0.1'):
+    """
+    Serve ``GET /metrics`` from a daemon thread.
+
+    In multiprocess mode the endpoint serves the sum of every process
+    writing to ``PROMETHEUS_MULTIPROC_DIR``.
+
+    Returns:
+        The HTTP server (call ``shutdown()`` to stop it)
+    """
+    registry = REGISTRY
+    if multiprocess_dir() is not None:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    server, _ = _start_http_server(port, addr, registry)
+    logger.info(f'Serving metrics on {addr}:{port}')
+    return server
+
+
+# gRPC server
+GRPC_LABELS = ('grpc_service', 'grpc_method')
+GRPC_HANDLING_SECONDS = Histogram(
+    'grpc_server_handling_seconds', 'RPC latency until the handler returned.', GRPC_LABELS,
+    buckets=DEFAULT_BUCKETS)
+GRPC_IN_FLIGHT = Gauge(
+    'grpc_server_in_flight', 'RPCs currently being handled.', GRPC_LABELS, multiprocess_mode='livesum')
+GRPC_HANDLED = Counter(
+    'grpc_server_handled_total', 'RPCs completed, by status code.', (*GRPC_LABELS, 'grpc_code'))
+GRPC_DB_QUERIES = Counter(
+    'grpc_server_db_queries_total', 'Database queries issued while handling RPCs.', GRPC_LABELS)
+GRPC_DB_SECONDS = Counter(
+    'grpc_server_db_query_seconds_total', 'Time spent in database queries while handling RPCs.',
+    GRPC_LABELS)
+
+# REST API
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency.', ('view', 'method'), buckets=DEFAULT_BUCKETS)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled.', multiprocess_mode='livesum')
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests completed, by status code.', ('view', 'method', 'status'))
+HTTP_DB_QUERIES = Counter(
+    'http_db_queries_total', 'Database queries issued while handling HTTP requests.', ('view',))
+HTTP_DB_SECONDS = Counter(
+    'http_db_query_seconds_total', 'Time spent in database queries while handling HTTP requests.',
+    ('view',))
+
+
+class QueryStats:
+    """``execute_wrapper`` that counts and times database queries."""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# QueryStats of the RPC or request being handled by this thread or task
+current_query_stats = contextvars.ContextVar('current_query_stats', default=None)
+
+
+class record_queries:
+    """
+    Context manager counting this thread's queries, on every database, into
+    ``stats``.
+
+    ``stats`` defaults to ``current_query_stats``; with neither set it does
+    nothing. The wrapper is pushed onto ``execute_wrappers`` directly rather
+    than through ``connection.execute_wrapper()`` to keep per-call overhead low.
+    """
+
+    __slots__ = ('stats', '_connections')
+
+    def __init__(self, stats: Optional[QueryStats] = None):
+        self.stats = stats
+        self._connections = ()
+
+    def __enter__(self) -> Optional[QueryStats]:
+        stats = self.stats if self.stats is not None else current_query_stats.get()
+        if stats is not None:
+            self._connections = [connections[alias] for alias in connections]
+            for connection in self._connections:
+                connection.execute_wrappers.append(stats)
+        return stats
+
+    def __exit__(self, *exc_info):
+        for connection in self._connections:
+            connection.execute_wrappers.pop()
+        self._connections = ()
@@ -0,0 +1,47 @@
+"""
+Middleware for the users REST API.
+"""
+import time
+
+from .metrics import (
+    HTTP_DB_QUERIES,
+    HTTP_DB_SECONDS,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS,
+    QueryStats,
+    record_queries,
+)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, in-flight requests, status codes and database queries
+    per view, served for all workers from one port (see ``gunicorn.conf.py``).
+
+    Requests are labelled by URL name (e.g. ``users:user_detail``), not path,
+    so label cardinality stays bounded; unmatched URLs share one label.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        HTTP_IN_FLIGHT.inc()
+        stats = QueryStats()
+        started = time.perf_counter()
+        status = 500
+        try:
+            with record_queries(stats):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            match = request.resolver_match
+            view = (match.view_name or match.route) if match else '<unmatched>'
+            HTTP_REQUEST_SECONDS.labels(view, request.method).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(view, request.method, str(status)).inc()
+            if stats.count:
+                HTTP_DB_QUERIES.labels(view).inc(stats.count)
+                HTTP_DB_SECONDS.labels(view).inc(stats.seconds)
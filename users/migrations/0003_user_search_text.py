@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+TRIGRAM_INDEX = 'users_search_text_trgm'
+SEARCH_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def backfill_search_text(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    batch = []
+    for user in User.objects.using(schema_editor.connection.alias).iterator(chunk_size=2000):
+        values = (getattr(user, field) for field in SEARCH_FIELDS)
+        user.search_text = ' '.join(' '.join(value.lower().split()) for value in values if value)
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.using(schema_editor.connection.alias).bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        User.objects.using(schema_editor.connection.alias).bulk_update(batch, ['search_text'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON users USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_managers_alter_user_groups_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
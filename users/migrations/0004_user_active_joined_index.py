@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_search_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'date_joined', 'id'], name='users_active_joined_idx'),
+        ),
+    ]
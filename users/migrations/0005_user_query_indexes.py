@@ -0,0 +1,56 @@
+"""
+Indexes for the ListUsers / ExportUsers / admin listing query shapes and the
+username lookup.
+
+On PostgreSQL they are built with CREATE INDEX CONCURRENTLY, so the users
+table stays writable while they build (hence ``atomic = False``).
+"""
+from django.db import migrations, models
+
+INDEXES = [
+    models.Index(fields=['date_joined', 'id'], name='users_joined_idx'),
+    models.Index(fields=['updated_at', 'id'], name='users_updated_idx'),
+    models.Index(fields=['username', 'id'], name='users_username_idx'),
+    models.Index(fields=['first_name', 'id'], name='users_first_name_idx'),
+    models.Index(fields=['last_name', 'id'], name='users_last_name_idx'),
+    models.Index(
+        fields=['date_joined', 'id'], condition=models.Q(is_active=True, is_verified=True),
+        name='users_verified_joined_idx'),
+    models.Index(
+        fields=['date_joined', 'id'], condition=models.Q(is_verified=False),
+        name='users_pending_joined_idx'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(index.create_sql(User, schema_editor, concurrently=True))
+        else:
+            schema_editor.add_index(User, index)
+
+
+def drop_indexes(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(index.remove_sql(User, schema_editor, concurrently=True))
+        else:
+            schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_user_active_joined_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='user', index=index) for index in INDEXES],
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+        ),
+    ]
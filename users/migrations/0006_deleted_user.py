@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedUser',
+            fields=[
+                ('user_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('deleted_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'deleted user',
+                'verbose_name_plural': 'deleted users',
+                'db_table': 'deleted_users',
+            },
+        ),
+    ]
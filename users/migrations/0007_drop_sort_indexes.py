@@ -0,0 +1,51 @@
+"""
+Drop the (updated_at, id), (first_name, id) and (last_name, id) indexes.
+
+updated_at changes on every save, so its index kept every UPDATE of a user
+from being a heap-only tuple (HOT) update. The name indexes only served
+occasional admin listings, which now sort the matching rows instead.
+
+On PostgreSQL they are dropped with DROP INDEX CONCURRENTLY (hence
+``atomic = False``).
+"""
+from django.db import migrations, models
+
+INDEXES = [
+    models.Index(fields=['updated_at', 'id'], name='users_updated_idx'),
+    models.Index(fields=['first_name', 'id'], name='users_first_name_idx'),
+    models.Index(fields=['last_name', 'id'], name='users_last_name_idx'),
+]
+
+
+def drop_indexes(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(index.remove_sql(User, schema_editor, concurrently=True))
+        else:
+            schema_editor.remove_index(User, index)
+
+
+def create_indexes(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(index.create_sql(User, schema_editor, concurrently=True))
+        else:
+            schema_editor.add_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0006_deleted_user'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.RemoveIndex(model_name='user', name=index.name) for index in INDEXES],
+            database_operations=[migrations.RunPython(drop_indexes, create_indexes)],
+        ),
+    ]
@@ -3,7 +3,9 @@ User models for the user service.
 """
 import uuid
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, router
+
+from .hashing import password_hasher_pool
 
 
 class UserManager(BaseUserManager):
@@ -32,6 +34,25 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def for_user(self, *keys):
+        """
+        Return a manager whose reads see recent writes.
+
+        Reads normally go to a read replica; they use the primary while any
+        of ``keys`` (user ids or emails) was saved or deleted within
+        ``REPLICA_STICKY_SECONDS`` by this process, or by any process sharing
+        ``REPLICA_STICKY_CACHE`` (see ``users.routers``).
+        """
+        return self.db_manager(hints={'user_keys': keys})
+
+    def primary(self):
+        """Return a manager reading from the primary, for read-modify-write paths."""
+        return self.db_manager(router.db_for_write(self.model))
+
+    def get_by_natural_key(self, username):
+        """Look up a user by email, reading a just registered user from the primary."""
+        return self.for_user(username).get(**{self.model.USERNAME_FIELD: username})
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom User model using email as the unique identifier."""
@@ -51,6 +72,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     updated_at = models.DateTimeField(auto_now=True)
     last_login = models.DateTimeField(null=True, blank=True)
 
+    # Lowercased email/username/names, matched by users.search backends
+    search_text = models.TextField(blank=True, default='', editable=False)
+
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
@@ -61,10 +85,67 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = 'user'
         verbose_name_plural = 'users'
         ordering = ['-date_joined']
+        indexes = [
+            # Keyset pagination of active users on (date_joined, id): the admin
+            # listing and the USER_STATUS_DEACTIVATED filter
+            models.Index(fields=['is_active', 'date_joined', 'id'], name='users_active_joined_idx'),
+            # Unfiltered ListUsers / ExportUsers pages in the default order
+            models.Index(fields=['date_joined', 'id'], name='users_joined_idx'),
+            # validate_username and the display_name sort
+            models.Index(fields=['username', 'id'], name='users_username_idx'),
+            # The USER_STATUS_ACTIVE and USER_STATUS_PENDING_VERIFICATION filters.
+            # Only changes of is_active / is_verified, which are rare, update them.
+            models.Index(
+                fields=['date_joined', 'id'], condition=models.Q(is_active=True, is_verified=True),
+                name='users_verified_joined_idx'),
+            models.Index(
+                fields=['date_joined', 'id'], condition=models.Q(is_verified=False),
+                name='users_pending_joined_idx'),
+            # updated_at, first_name and last_name are deliberately not indexed
+            # (see users.pagination.UNINDEXED_SORT_FIELDS)
+        ]
+
+    SEARCH_FIELDS = ('email', 'username', 'first_name', 'last_name')
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Load a user, remembering the email it was stored under."""
+        user = super().from_db(db, field_names, values)
+        user.stored_email = user.__dict__.get('email')
+        return user
+
+    def save(self, *args, **kwargs):
+        """Save the user, keeping search_text in sync with the searched fields."""
+        self.search_text = self.build_search_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SEARCH_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+        self.stored_email = self.email
+
+    def set_password(self, raw_password):
+        """Hash the password on the password hashing pool."""
+        self.password = password_hasher_pool.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """Verify the password on the password hashing pool, upgrading its hash if needed."""
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return password_hasher_pool.check_password(raw_password, self.password, setter)
+
+    def build_search_text(self):
+        """Return the normalized text the search backends match against."""
+        values = (getattr(self, field) for field in self.SEARCH_FIELDS)
+        return ' '.join(' '.join(value.lower().split()) for value in values if value)
+
     def get_full_name(self):
         """Return the first_name plus the last_name, with a space in between."""
         full_name = f'{self.first_name} {self.last_name}'.strip()
@@ -87,3 +168,26 @@ class User(AbstractBaseUser, PermissionsMixin):
             'is_verified': self.is_verified,
             'date_joined': self.date_joined.isoformat() if self.date_joined else None,
         }
+
+
+class DeletedUser(models.Model):
+    """
+    Tombstone of a hard-deleted user.
+
+    Written in the deleting transaction (see ``users.signals``) so that every
+    process rejects the user's tokens on its next reload of
+    ``users.token_validation.inactive_users``. Kept for the access token
+    lifetime.
+    """
+
+    user_id = models.UUIDField(primary_key=True)
+    deleted_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'deleted_users'
+        verbose_name = 'deleted user'
+        verbose_name_plural = 'deleted users'
+
+    def __str__(self):
+        return str(self.user_id)
+
@@ -0,0 +1,324 @@
+"""
+Keyset (cursor) pagination for the gRPC list RPCs and the REST user listing.
+
+Pages are addressed by an opaque, signed ``page_token`` that records the sort
+key and id of the last row returned. The next page is fetched with a seek
+predicate (``(sort_key, id) < (last_sort_key, last_id)`` for descending order)
+instead of an OFFSET, so every page costs the same regardless of depth.
+Previous-page tokens record the first row of a page instead and seek the
+other way. Tokens also carry a digest of the filters and query they were
+issued for (``page_scope``), and are rejected by a request with others.
+
+The total count is computed once, on the first page, and carried forward in
+the token. It is exact up to ``MAX_EXACT_COUNT`` rows and a planner estimate
+beyond that.
+
+``UserCursorPagination`` exposes the same scheme as a DRF pagination class
+(``?cursor=<token>``).
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+TOKEN_SALT = 'users.pagination'
+
+# Sort fields accepted from clients, mapped to model fields. Every field here
+# must be non-nullable so that (field, id) gives a total order, and unique or
+# backed by a (field, id) index in User.Meta.indexes so pages never sort the
+# table (checked by users.tests.QueryPlanTests), unless listed in
+# UNINDEXED_SORT_FIELDS.
+SORTABLE_FIELDS = {
+    'created_at': 'date_joined',
+    'date_joined': 'date_joined',
+    'updated_at': 'updated_at',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'display_name': 'username',
+    'username': 'username',
+}
+
+# Sort fields whose pages sort the matching rows instead of reading an index.
+# An updated_at index would rule out HOT updates of every save, and the names
+# are only sorted by occasional admin listings.
+UNINDEXED_SORT_FIELDS = frozenset({'updated_at', 'first_name', 'last_name'})
+
+# Sort keys computed per query, such as search relevance. They are only valid
+# on querysets that carry the matching annotation.
+ANNOTATED_SORT_FIELDS = {
+    'relevance': 'search_rank',
+}
+
+DATETIME_FIELDS = {'date_joined', 'updated_at'}
+
+# Counts above this many rows are estimated instead of counted exactly
+MAX_EXACT_COUNT = 10000
+
+
+class PaginationError(ValueError):
+    """Raised for an unknown sort field or a malformed/tampered page token."""
+
+
+def paginate(queryset, page_size: int, page_token: str = '', sort_field: str = 'date_joined',
+             descending: bool = True, fields=None, scope: str = ''):
+    """
+    Return one page of ``queryset`` ordered by ``(sort_field, id)``.
+
+    Args:
+        queryset: Filtered, unordered queryset to page through
+        page_size: Number of rows to return
+        page_token: Token from a previous page, or empty for the first page
+        sort_field: Sort field (a key of SORTABLE_FIELDS or ANNOTATED_SORT_FIELDS)
+        descending: Sort direction
+        fields: Columns to select as named ``values_list`` rows instead of
+            loading model instances (the sort field is added if missing)
+        scope: ``page_scope`` of the filters applied to ``queryset``
+
+    Returns:
+        Tuple of (rows, next_page_token, previous_page_token, total_count).
+        ``next_page_token`` is empty on the last page, ``previous_page_token``
+        on the first.
+
+    Raises:
+        PaginationError: If the sort field or page token is invalid, or the
+            token was issued for other filters.
+    """
+    backwards = False
+    if page_token:
+        queryset, cursor = seek(queryset, page_token, sort_field, descending, scope)
+        total_count = cursor['n']
+        backwards = cursor.get('r', False)
+    else:
+        total_count = count_rows(queryset)
+
+    # A previous page is read in the opposite order, then flipped back
+    page = ordered(queryset, sort_field, descending != backwards)
+    if fields is not None:
+        field = _model_field(sort_field, queryset)
+        page = page.values_list(*fields, *([] if field in fields else [field]), named=True)
+    rows = list(page[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        # Reached from a later page, so one follows unless its rows were deleted
+        has_next, has_previous = bool(rows), more
+    else:
+        has_next, has_previous = more, bool(page_token) and bool(rows)
+
+    next_page_token = previous_page_token = ''
+    if has_next:
+        next_page_token = token_after(rows[-1], sort_field, descending, total_count, scope)
+    if has_previous:
+        previous_page_token = token_before(rows[0], sort_field, descending, total_count, scope)
+
+    return rows, next_page_token, previous_page_token, total_count
+
+
+def ordered(queryset, sort_field: str = 'date_joined', descending: bool = True):
+    """Order ``queryset`` by ``(sort_field, id)``."""
+    prefix = '-' if descending else ''
+    field = _model_field(sort_field, queryset)
+    return queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+
+def seek(queryset, page_token: str, sort_field: str = 'date_joined', descending: bool = True,
+         scope: str = ''):
+    """
+    Restrict ``queryset`` to the rows after the position encoded in ``page_token``.
+
+    Tokens from ``token_before`` select the rows before that position instead.
+
+    Returns:
+        Tuple of (filtered queryset, decoded cursor).
+    """
+    field = _model_field(sort_field, queryset)
+    cursor = decode_page_token(page_token)
+    if cursor['f'] != field or cursor['d'] != ('desc' if descending else 'asc'):
+        raise PaginationError('page_token does not match the requested sort order')
+    if cursor.get('q', '') != scope:
+        raise PaginationError('page_token does not match the requested filters')
+    value = _load_value(field, cursor['v'])
+    backwards = bool(cursor.get('r'))
+    return queryset.filter(_seek(field, descending != backwards, value, cursor['id'])), cursor
+
+
+def token_after(row, sort_field: str = 'date_joined', descending: bool = True,
+                total_count: int = 0, scope: str = '') -> str:
+    """Return a page token that resumes right after ``row``."""
+    return encode_page_token(_cursor(row, sort_field, descending, total_count, scope))
+
+
+def token_before(row, sort_field: str = 'date_joined', descending: bool = True,
+                 total_count: int = 0, scope: str = '') -> str:
+    """Return a page token for the page that ends right before ``row``."""
+    return encode_page_token({**_cursor(row, sort_field, descending, total_count, scope), 'r': True})
+
+
+def page_scope(*parts) -> str:
+    """Return a short digest of the filters and query a page token is valid for."""
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def encode_page_token(cursor: dict) -> str:
+    """Sign and encode a cursor as an opaque page token."""
+    return signing.dumps(cursor, salt=TOKEN_SALT, compress=True)
+
+
+def decode_page_token(page_token: str) -> dict:
+    """Verify and decode a page token produced by ``encode_page_token``."""
+    try:
+        cursor = signing.loads(page_token, salt=TOKEN_SALT)
+    except (signing.BadSignature, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise PaginationError('Invalid page_token') from e
+    if not isinstance(cursor, dict) or not {'f', 'd', 'v', 'id', 'n'} <= cursor.keys():
+        raise PaginationError('Invalid page_token')
+    return cursor
+
+
+def count_rows(queryset) -> int:
+    """
+    Count rows exactly up to MAX_EXACT_COUNT, then fall back to an estimate.
+
+    The bounded count runs as ``SELECT COUNT(*) FROM (... LIMIT n)``. On
+    PostgreSQL larger results use the planner's row estimate; other backends
+    report MAX_EXACT_COUNT.
+    """
+    queryset = queryset.order_by()
+    count = queryset[:MAX_EXACT_COUNT + 1].count()
+    if count <= MAX_EXACT_COUNT:
+        return count
+
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return max(int(plan[0]['Plan']['Plan Rows']), count)
+    return MAX_EXACT_COUNT
+
+
+def _model_field(sort_field: str, queryset=None) -> str:
+    field = SORTABLE_FIELDS.get(sort_field)
+    if field is not None:
+        return field
+    field = ANNOTATED_SORT_FIELDS.get(sort_field)
+    if field is None or (queryset is not None and field not in queryset.query.annotations):
+        raise PaginationError(f'Unsupported sort field: {sort_field}')
+    return field
+
+
+def _cursor(row, sort_field: str, descending: bool, total_count: int, scope: str = '') -> dict:
+    field = _model_field(sort_field)
+    cursor = {
+        'f': field,
+        'd': 'desc' if descending else 'asc',
+        'v': _dump_value(field, getattr(row, field)),
+        'id': str(row.id),
+        'n': total_count,
+    }
+    if scope:
+        cursor['q'] = scope
+    return cursor
+
+
+def _seek(field: str, descending: bool, value, last_id: str) -> Q:
+    op = 'lt' if descending else 'gt'
+    # The redundant range bound lets an index on (..., field, id) start the
+    # scan at the cursor; the OR alone would be applied as a filter
+    return Q(**{f'{field}__{op}e': value}) & (
+        Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': last_id})
+    )
+
+
+def _dump_value(field: str, value):
+    if field in DATETIME_FIELDS:
+        return value.isoformat()
+    return value
+
+
+def _load_value(field: str, value):
+    if field in DATETIME_FIELDS:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError) as e:
+            raise PaginationError('Invalid page_token') from e
+    return value
+
+
+class UserCursorPagination(BasePagination):
+    """
+    DRF pagination over ``(date_joined, id)``, newest first, using page tokens.
+
+    Views may set ``pagination_fields`` to fetch named ``values_list`` rows
+    with those columns instead of model instances.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    sort_field = 'date_joined'
+    descending = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_token, self.previous_token, self.count = paginate(
+                queryset,
+                self.get_page_size(request),
+                request.query_params.get(self.cursor_query_param, ''),
+                self.sort_field,
+                self.descending,
+                fields=getattr(view, 'pagination_fields', None),
+            )
+        except PaginationError:
+            raise NotFound(self.invalid_cursor_message)
+        return rows
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.next_token:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_token)
+
+    def get_previous_link(self):
+        if not self.previous_token:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.previous_token)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,36 @@
+"""
+JSON renderer backed by orjson.
+
+``ORJSONRenderer`` is a drop-in for DRF's ``JSONRenderer`` (the
+``REST_FRAMEWORK`` default): same media type, compact UTF-8 output and the
+same encoding of the types DRF's encoder knows (datetimes, decimals, lazy
+strings, ...). It falls back to ``JSONRenderer`` when orjson is not installed
+or indented output is requested (e.g. ``Accept: application/json; indent=2``).
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# datetimes go through DRF's encoder, which writes UTC as "Z" like JSONRenderer
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Render JSON with orjson, with the same output as ``JSONRenderer``."""
+
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self._encoder.default, option=OPTIONS)
+        # Like JSONRenderer: keep the output safe to embed in JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,255 @@
+"""
+Database routing between the primary and optional read replicas.
+
+``PrimaryReplicaRouter`` sends every write to ``default`` and reads of the
+users app's models to one of the ``READ_REPLICAS`` (see
+``DATABASE_REPLICAS`` in settings), falling back to the primary when:
+
+* the read happens inside a transaction on the primary,
+* the queryset was built with ``User.objects.for_user(...)`` for a user
+  saved or deleted within ``REPLICA_STICKY_SECONDS``, under its id, its
+  email or the email it had before (read-your-writes: ``UpdateUser`` then
+  ``GetUser`` never sees the old row),
+* no replica is usable: ``ReplicaMonitor`` measures every replica's lag each
+  ``REPLICA_LAG_CHECK_INTERVAL`` seconds and skips replicas that lag by more
+  than ``REPLICA_MAX_LAG`` seconds or cannot be reached.
+
+Other apps (token blacklist, sessions, ...) always use the primary: a
+blacklisted token must be rejected everywhere at once.
+
+Writes are remembered in this process. With ``REPLICA_STICKY_CACHE`` set
+(a Django cache shared by every process, such as Redis) they are recorded
+there too, and reads that miss the local set look them up in that cache, so
+the primary does no work for reads that end up on a replica. While the cache
+is unreachable those reads use the primary. Without it, a write made by
+another process is visible once the replica catches up, which takes at most
+``REPLICA_MAX_LAG`` seconds.
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connections
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+REPLICA_APPS = {'users'}
+
+DB_READS_ROUTED = Counter(
+    'db_reads_routed_total', 'Reads of users models by target (replica, or why they used the primary).',
+    ('target',))
+REPLICA_LAG = Gauge(
+    'db_replica_lag_seconds', 'Replication lag measured on each read replica (-1 if unreachable).',
+    ('database',), multiprocess_mode='livemax')
+
+# Seconds a replica trails the primary by, 0 when it has replayed everything received
+_POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+def measure_lag(alias: str) -> float:
+    """Return the replication lag of database ``alias`` in seconds."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(_POSTGRES_LAG_SQL)
+            lag = cursor.fetchone()[0]
+            return float(lag or 0)
+        # No replication status to ask for (e.g. SQLite files): reachable is enough
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        return 0.0
+
+
+def _cache_key(key: str) -> str:
+    return f'replica-sticky:{key}'
+
+
+def _user_key(key) -> str:
+    """Canonical form of a user id or email."""
+    try:
+        return str(uuid.UUID(str(key)))
+    except ValueError:
+        return str(key).lower()
+
+
+class RecentWrites:
+    """User ids and emails written in the last few seconds."""
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 100000, cache_alias: str = None):
+        """
+        Initialize the set.
+
+        Args:
+            ttl: Seconds a written user stays pinned to the primary
+            max_entries: Bound on keys remembered locally (oldest are dropped first)
+            cache_alias: Django cache shared by every process (e.g. Redis)
+                that writes are also recorded in, or None to only pin the
+                writes of this process
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_alias = cache_alias
+        self._expires = {}  # key -> monotonic expiry, in insertion order
+        self._lock = threading.Lock()
+
+    def record(self, *keys):
+        """Pin the users identified by ``keys`` (ids or emails) to the primary."""
+        keys = {_user_key(key) for key in keys if key}
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                self._expires.pop(key, None)
+                self._expires[key] = expires
+            while len(self._expires) > self.max_entries:
+                del self._expires[next(iter(self._expires))]
+        if self.cache_alias and keys:
+            try:
+                caches[self.cache_alias].set_many(
+                    {_cache_key(key): 1 for key in keys}, timeout=math.ceil(self.ttl))
+            except Exception as e:
+                logger.warning(f'Failed to share recent write: {e}')
+
+    def contains(self, keys) -> bool:
+        """Return True if any of ``keys`` was written within the TTL."""
+        keys = [_user_key(key) for key in keys if key]
+        if not keys:
+            return False
+        if self._expires:
+            now = time.monotonic()
+            if any(self._expires.get(key, 0) > now for key in keys):
+                return True
+        if not self.cache_alias:
+            return False
+        try:
+            return bool(caches[self.cache_alias].get_many([_cache_key(key) for key in keys]))
+        except Exception as e:
+            logger.warning(f'Failed to look up recent writes, reading from the primary: {e}')
+            return True
+
+    def clear(self):
+        """Forget every write recorded in this process."""
+        with self._lock:
+            self._expires.clear()
+
+
+class ReplicaMonitor:
+    """Track which replicas are reachable and close enough to the primary."""
+
+    def __init__(self, aliases, max_lag: float = 5.0, interval: float = 1.0):
+        """
+        Initialize the monitor; the check thread starts on first use.
+
+        Args:
+            aliases: Replica database aliases
+            max_lag: Seconds of lag beyond which a replica is not read from
+            interval: Seconds between lag checks
+        """
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.interval = interval
+        self._available = None  # None until the first check: read from the primary
+        self._lags = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def available(self) -> list:
+        """Return the replicas reads may use right now."""
+        if self._thread is None and self.aliases:
+            self._start()
+        return self._available or []
+
+    def lags(self) -> dict:
+        """Return the last measured lag per replica (None if unreachable)."""
+        return dict(self._lags)
+
+    def check(self) -> list:
+        """Measure every replica now; returns the usable ones."""
+        lags = {}
+        for alias in self.aliases:
+            try:
+                lags[alias] = measure_lag(alias)
+            except Exception as e:
+                logger.warning(f'Replica {alias} is unreachable: {e}')
+                lags[alias] = None
+            REPLICA_LAG.labels(alias).set(-1 if lags[alias] is None else lags[alias])
+        available = [alias for alias, lag in lags.items() if lag is not None and lag <= self.max_lag]
+        if self._available is not None and set(available) != set(self._available):
+            logger.warning(f'Readable replicas changed to {available or "none (using the primary)"}')
+        self._lags = lags
+        self._available = available
+        return available
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='replica-lag', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Replica lag checks failed')
+            time.sleep(self.interval)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and users reads to an up-to-date replica."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in REPLICA_APPS or not replica_monitor.aliases:
+            return PRIMARY
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[PRIMARY].in_atomic_block:
+            DB_READS_ROUTED.labels('primary_transaction').inc()
+            return PRIMARY
+        if recent_writes.contains(hints.get('user_keys', ())):
+            DB_READS_ROUTED.labels('primary_sticky').inc()
+            return PRIMARY
+        replicas = replica_monitor.available()
+        if not replicas:
+            DB_READS_ROUTED.labels('primary_fallback').inc()
+            return PRIMARY
+        DB_READS_ROUTED.labels('replica').inc()
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+recent_writes = RecentWrites(
+    # Never unpinned before every replica allowed to serve reads has the write
+    ttl=max(
+        getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+        getattr(settings, 'REPLICA_MAX_LAG', 5) + getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 1),
+    ),
+    cache_alias=getattr(settings, 'REPLICA_STICKY_CACHE', None) if getattr(settings, 'READ_REPLICAS', []) else None,
+)
+replica_monitor = ReplicaMonitor(
+    getattr(settings, 'READ_REPLICAS', []),
+    max_lag=getattr(settings, 'REPLICA_MAX_LAG', 5),
+    interval=getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 1),
+)
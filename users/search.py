@@ -0,0 +1,249 @@
+"""
+Search backends for ``SearchUsers``.
+
+Every user row carries a ``search_text`` column (lowercased email, username,
+first and last name, maintained by ``User.save``) so a search is a single
+substring match on one column instead of four ``UPPER(...) LIKE`` predicates.
+A backend turns a query string into a filter on that column plus a relevance
+score, annotated as ``search_rank``:
+
+- ``PostgresTrigramBackend`` matches with ``LIKE`` against a pg_trgm GIN
+  index on ``search_text`` and ranks with ``similarity()``;
+- ``NgramIndexBackend`` keeps an in-process trigram index of ``search_text``
+  and resolves the query to a set of candidate ids, for SQLite and tests.
+  Queries matching too many users fall back to a ``LIKE`` on the column.
+
+The backend only narrows and ranks the queryset; status, role and date
+filters are applied by the caller to the same queryset, so everything runs
+as one indexed query.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, ExpressionWrapper, FloatField, Value, When
+from django.db.models.functions import Length
+from django.utils.module_loading import import_string
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Annotation holding the relevance score of every matched row
+RANK_FIELD = 'search_rank'
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query the same way ``User.build_search_text`` normalizes rows."""
+    return ' '.join(query.lower().split())
+
+
+def trigrams(text: str) -> set:
+    """Return the set of 3-character substrings of ``text``."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(query_grams: set, text_grams: set) -> float:
+    """Trigram similarity in [0, 1], as computed by pg_trgm's ``similarity()``."""
+    if not query_grams or not text_grams:
+        return 0.0
+    shared = len(query_grams & text_grams)
+    return shared / (len(query_grams) + len(text_grams) - shared)
+
+
+class SearchBackend:
+    """Base class for user search backends."""
+
+    def search(self, queryset, query: str):
+        """
+        Restrict ``queryset`` to users matching ``query``.
+
+        Args:
+            queryset: User queryset, possibly already filtered
+            query: Raw query string from the client
+
+        Returns:
+            The filtered queryset, annotated with a float ``search_rank``
+            (higher is more relevant).
+        """
+        raise NotImplementedError
+
+
+class PostgresTrigramBackend(SearchBackend):
+    """Substring search served by a pg_trgm GIN index on ``search_text``."""
+
+    def search(self, queryset, query: str):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        term = normalize_query(query)
+        return queryset.filter(search_text__contains=term).annotate(
+            **{RANK_FIELD: TrigramSimilarity('search_text', term)}
+        )
+
+
+class NgramIndexBackend(SearchBackend):
+    """
+    In-process trigram index over ``search_text``.
+
+    The index is built from the database with one query on first use, rebuilt
+    every ``rebuild_interval`` seconds to pick up writes from other processes,
+    and updated immediately by ``users.signals`` for writes in this process.
+    Rebuilds run on the request thread that finds the index due; concurrent
+    requests keep using the old index meanwhile.
+
+    Up to ``max_candidates`` matches are handed to the database as ids. A
+    query matching more users is run as a substring filter on ``search_text``
+    instead, ranked by the share of the text the query covers, so no match
+    is left out of the results or the total count.
+    """
+
+    def __init__(self, rebuild_interval: float = 300.0, max_candidates: int = 1000):
+        """
+        Initialize the index.
+
+        Args:
+            rebuild_interval: Seconds between full rebuilds from the database
+            max_candidates: Maximum number of matches handed to the database
+                as ids
+        """
+        self.rebuild_interval = rebuild_interval
+        self.max_candidates = max_candidates
+        self._documents = {}  # user id -> search_text
+        self._postings = defaultdict(set)  # trigram -> user ids
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def search(self, queryset, query: str):
+        term = normalize_query(query)
+        scores = self.match(term)
+        if len(scores) > self.max_candidates:
+            return queryset.filter(search_text__contains=term).annotate(
+                **{RANK_FIELD: ExpressionWrapper(
+                    Value(float(len(term))) / Length('search_text'), output_field=FloatField())}
+            )
+        whens = [When(id=user_id, then=Value(score)) for user_id, score in scores.items()]
+        if not whens:
+            return queryset.none()
+        return queryset.filter(id__in=list(scores)).annotate(
+            **{RANK_FIELD: Case(*whens, default=Value(0.0), output_field=FloatField())}
+        )
+
+    def match(self, term: str) -> dict:
+        """Return {user id: similarity} for documents containing ``term``."""
+        self._maybe_rebuild()
+        query_grams = trigrams(term)
+        with self._lock:
+            if query_grams:
+                postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                # Shorter than a trigram: scan the documents instead
+                candidates = self._documents.keys()
+            matches = {
+                user_id: self._score(term, query_grams, self._documents[user_id])
+                for user_id in candidates if term in self._documents[user_id]
+            }
+        return matches
+
+    def update(self, user_id: str, search_text: str):
+        """Index (or re-index) one user."""
+        with self._lock:
+            self._remove(user_id)
+            self._documents[user_id] = search_text
+            for gram in trigrams(search_text):
+                self._postings[gram].add(user_id)
+
+    def remove(self, user_id: str):
+        """Drop one user from the index."""
+        with self._lock:
+            self._remove(user_id)
+
+    def rebuild(self):
+        """Rebuild the whole index from the database."""
+        started = time.monotonic()
+        documents = {
+            str(user_id): search_text
+            for user_id, search_text in User.objects.values_list('id', 'search_text').iterator()
+        }
+        postings = defaultdict(set)
+        for user_id, search_text in documents.items():
+            for gram in trigrams(search_text):
+                postings[gram].add(user_id)
+        with self._lock:
+            self._documents = documents
+            self._postings = postings
+            self._built_at = started
+        logger.debug(f'Built search index for {len(documents)} users')
+
+    @staticmethod
+    def _score(term: str, query_grams: set, search_text: str) -> float:
+        if query_grams:
+            return similarity(query_grams, trigrams(search_text))
+        # No trigrams to compare: prefer shorter documents
+        return len(term) / len(search_text)
+
+    def _maybe_rebuild(self):
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at < self.rebuild_interval:
+            return
+        # Only the first build blocks; later rebuilds are skipped while one is running
+        if not self._rebuild_lock.acquire(blocking=built_at is None):
+            return
+        try:
+            if self._built_at == built_at:
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def _remove(self, user_id: str):
+        search_text = self._documents.pop(user_id, None)
+        if search_text is None:
+            return
+        for gram in trigrams(search_text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(user_id)
+                if not posting:
+                    del self._postings[gram]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Return the configured search backend.
+
+    ``USER_SEARCH_BACKEND`` may name a backend class by dotted path; by default
+    PostgreSQL uses ``PostgresTrigramBackend`` and other databases use
+    ``NgramIndexBackend``.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'USER_SEARCH_BACKEND', '')
+                if not path:
+                    if connections['default'].vendor == 'postgresql':
+                        path = 'users.search.PostgresTrigramBackend'
+                    else:
+                        path = 'users.search.NgramIndexBackend'
+                _backend = import_string(path)()
+    return _backend
+
+
+def index_user(user):
+    """Apply a user save to the in-process index, if that backend is active."""
+    if isinstance(_backend, NgramIndexBackend):
+        _backend.update(str(user.id), user.search_text)
+
+
+def unindex_user(user_id: str):
+    """Apply a user delete to the in-process index, if that backend is active."""
+    if isinstance(_backend, NgramIndexBackend):
+        _backend.remove(user_id)
@@ -1,11 +1,15 @@
 """
 Serializers for the user service.
 """
-from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError
+from django.utils import timezone
 from .models import User
+from .token_blacklist import RefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,6 +24,64 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'is_active', 'is_verified', 'date_joined', 'updated_at']
 
 
+class UserReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer producing exactly ``UserSerializer``'s output.
+
+    ``UserSerializer``'s fields are inspected once and turned into a list of
+    (name, converter) pairs, so rendering a user is a loop over attributes
+    instead of DRF's per-call field binding. Accepts model instances and any
+    object with the same attributes (e.g. named ``values_list`` rows).
+    """
+
+    _converters = None
+
+    def to_representation(self, instance):
+        converters = self._converters or self._compile()
+        data = {}
+        for name, source, convert in converters:
+            value = getattr(instance, source)
+            data[name] = None if value is None else convert(value)
+        return data
+
+    @classmethod
+    def _compile(cls) -> list:
+        converters = []
+        for name, field in UserSerializer().fields.items():
+            if field.write_only:
+                continue
+            converters.append((name, field.source, _fast_converter(field)))
+        UserReadSerializer._converters = converters
+        return converters
+
+
+def _fast_converter(field):
+    """Return a converter equivalent to ``field.to_representation``."""
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if isinstance(output_format, str) and output_format.lower() == ISO_8601:
+            return _iso_datetime(field.to_representation)
+    return field.to_representation
+
+
+def _iso_datetime(fallback):
+    def convert(value):
+        if not timezone.is_aware(value):
+            return fallback(value)
+        value = timezone.localtime(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return convert
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for user registration."""
 
@@ -41,6 +103,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'email', 'password', 'password_confirm',
             'username', 'first_name', 'last_name', 'phone_number'
         ]
+        extra_kwargs = {
+            # Uniqueness is enforced by the INSERT in create(), not a SELECT first
+            'email': {'validators': []},
+        }
 
     def validate(self, attrs):
         """Validate that passwords match."""
@@ -51,16 +117,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return attrs
 
     def validate_email(self, value):
-        """Validate email is unique."""
-        if User.objects.filter(email=value.lower()).exists():
-            raise serializers.ValidationError('A user with this email already exists.')
+        """Normalize the email; the database checks that it is unique."""
         return value.lower()
 
     def create(self, validated_data):
-        """Create and return a new user."""
+        """Create and return a new user with a single INSERT."""
         validated_data.pop('password_confirm')
-        user = User.objects.create_user(**validated_data)
-        return user
+        try:
+            return User.objects.create_user(**validated_data)
+        except IntegrityError:
+            # email is the only unique column besides the generated primary key
+            raise serializers.ValidationError({'email': ['A user with this email already exists.']})
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -94,6 +161,12 @@ class TokenResponseSerializer(serializers.Serializer):
     user = UserSerializer()
 
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Token refresh serializer checking the blacklist through the Bloom filter."""
+
+    token_class = RefreshToken
+
+
 class LogoutSerializer(serializers.Serializer):
     """Serializer for logout (token blacklist)."""
 
@@ -154,3 +227,10 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             if User.objects.filter(username=value).exclude(id=user.id).exists():
                 raise serializers.ValidationError('This username is already taken.')
         return value
+
+    def update(self, instance, validated_data):
+        """Write only the submitted fields, so a stale cached user cannot overwrite others."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
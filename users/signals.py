@@ -0,0 +1,79 @@
+"""
+Signal handlers for the users app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import auth_user_cache
+from .cache import user_cache
+from .models import User
+from .routers import recent_writes
+from .search import index_user, unindex_user
+from .token_blacklist import blacklist_filter
+from .token_validation import inactive_users
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, using, **kwargs):
+    """
+    Drop cached copies of a user whenever the row changes.
+
+    Invalidated again once the write commits: until then concurrent readers
+    still see the old row, and may cache it under the new generation.
+    """
+    user_id, email = str(instance.id), instance.email
+
+    def invalidate():
+        user_cache.invalidate(user_id, email)
+        auth_user_cache.invalidate(user_id)
+
+    invalidate()
+    transaction.on_commit(invalidate, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def record_user_write(sender, instance, **kwargs):
+    """Read the user from the primary until replicas have caught up with the write."""
+    # Pin the previous email too: a lookup by it must not find the old row on a replica
+    recent_writes.record(str(instance.id), instance.email, getattr(instance, 'stored_email', None))
+
+
+@receiver(post_save, sender=User)
+def record_user_status(sender, instance, using, **kwargs):
+    """Keep the token validation inactive-user set in step with saves."""
+    user_id, is_active = str(instance.id), instance.is_active
+    inactive_users.record(user_id, is_active)
+    # Again on commit: a reload racing the transaction would drop the change
+    transaction.on_commit(lambda: inactive_users.record(user_id, is_active), using=using)
+
+
+@receiver(post_delete, sender=User)
+def record_user_deleted(sender, instance, using, **kwargs):
+    """Reject tokens of deleted users, here at once and elsewhere from the tombstone."""
+    user_id = str(instance.id)
+    inactive_users.write_tombstone(user_id, using)
+    inactive_users.record_deleted(user_id)
+    transaction.on_commit(lambda: inactive_users.record_deleted(user_id), using=using)
+
+
+@receiver(post_save, sender=User)
+def update_search_index(sender, instance, **kwargs):
+    """Re-index a saved user in the in-process search index."""
+    index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop a deleted user from the in-process search index."""
+    unindex_user(str(instance.id))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    """Reject a token blacklisted by this process without waiting for a sync."""
+    if created:
+        blacklist_filter.add(instance.token.jti)
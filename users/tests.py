@@ -0,0 +1,1509 @@
+"""
+Tests for the users app.
+
+Run with ``python manage.py test users``.
+"""
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import auth_user_cache
+from .cache import UserCache, user_cache
+from .db_pool import ConnectionPool
+from .hashing import PasswordHashingBusy, password_hasher_pool
+from .health import (
+    DEGRADED,
+    HEALTHY,
+    STARTING,
+    UNHEALTHY,
+    HealthMonitor,
+    check_database,
+    check_token_blacklist,
+)
+from .last_login import LastLoginBuffer
+from .models import DeletedUser, User
+from .pagination import SORTABLE_FIELDS, UNINDEXED_SORT_FIELDS
+from .routers import PrimaryReplicaRouter, RecentWrites, ReplicaMonitor, recent_writes
+from .search import RANK_FIELD, NgramIndexBackend
+from .token_blacklist import BlacklistFilter, RefreshToken
+from .token_validation import InactiveUserRegistry
+
+try:
+    from .grpc_generated.proto.user.v1 import user_pb2
+except ImportError:  # stubs not generated, see docs/GRPC_SETUP.md
+    user_pb2 = None
+
+
+class _Context:
+    """Minimal stand-in for grpc.ServicerContext."""
+
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def is_active(self):
+        return True
+
+
+class UserCacheTests(TestCase):
+    """Cached users never outlive a committed change to their row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='cached@example.com', password='Correct-Horse-42')
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+    def cached(self, user):
+        """Stand-in for the proto user the servicer caches."""
+        return SimpleNamespace(id=str(user.id), email=user.email)
+
+    def test_set_after_invalidation_is_dropped(self):
+        cache = UserCache(max_entries=10, ttl=30)
+        generation = cache.generation()
+        cache.invalidate(str(self.user.id))
+        cache.set(self.cached(self.user), generation)
+        self.assertIsNone(cache.get_by_id(str(self.user.id)))
+
+        cache.set(self.cached(self.user), cache.generation())
+        self.assertIsNotNone(cache.get_by_id(str(self.user.id)))
+        self.assertIsNotNone(cache.get_by_email('CACHED@example.com'))
+
+    def test_save_invalidates_id_and_email(self):
+        user_cache.set(self.cached(self.user), user_cache.generation())
+
+        self.user.first_name = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertIsNone(user_cache.get_by_id(str(self.user.id)))
+        self.assertIsNone(user_cache.get_by_email(self.user.email))
+
+    def test_row_cached_before_commit_is_invalidated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.first_name = 'Changed'
+                self.user.save()
+                # A concurrent reader still sees the committed (old) row and
+                # caches it under the generation bumped by post_save
+                user_cache.set(self.cached(self.user), user_cache.generation())
+                self.assertIsNotNone(user_cache.get_by_id(str(self.user.id)))
+
+        self.assertIsNone(user_cache.get_by_id(str(self.user.id)))
+
+
+class RegistrationQueryTests(TestCase):
+    """Registration must cost one INSERT per row, in a single transaction."""
+
+    payload = {
+        'email': 'New.User@Example.com',
+        'username': 'newuser',
+        'password': 'Correct-Horse-42',
+        'password_confirm': 'Correct-Horse-42',
+        'phone_number': '+15555550100',
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_register_query_count(self):
+        # SAVEPOINT, INSERT user, INSERT outstanding token, RELEASE SAVEPOINT
+        # (BEGIN/COMMIT outside of TestCase's wrapping transaction)
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('users:register'), self.payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(email='new.user@example.com')
+        self.assertEqual(user.phone_number, '+15555550100')
+        self.assertTrue(OutstandingToken.objects.filter(user=user).exists())
+
+    def test_register_duplicate_email(self):
+        User.objects.create_user(email='new.user@example.com', password='Correct-Horse-42')
+
+        response = self.client.post(reverse('users:register'), self.payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_create_user_rpc_query_count(self):
+        from .grpc_servicer import UserServiceServicer
+
+        servicer = UserServiceServicer()
+        request = user_pb2.CreateUserRequest(
+            email='Rpc.User@Example.com', password='Correct-Horse-42', first_name='Rpc')
+        request.phone.e164 = '+15555550101'
+
+        with self.assertNumQueries(1):
+            response = servicer.CreateUser(request, _Context())
+
+        self.assertEqual(response.user.email, 'rpc.user@example.com')
+        self.assertEqual(response.user.phone.e164, '+15555550101')
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_create_user_rpc_duplicate_email(self):
+        import grpc
+        from .grpc_servicer import UserServiceServicer
+
+        User.objects.create_user(email='rpc.user@example.com', password='Correct-Horse-42')
+        context = _Context()
+
+        UserServiceServicer().CreateUser(
+            user_pb2.CreateUserRequest(email='RPC.user@example.com', password='Correct-Horse-42'), context)
+
+        self.assertEqual(context.code, grpc.StatusCode.ALREADY_EXISTS)
+
+
+class PasswordHashingBusyTests(TestCase):
+    """A saturated hashing pool is a 429 over REST and RESOURCE_EXHAUSTED over gRPC."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='busy@example.com', password='Correct-Horse-42')
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        patcher = mock.patch.object(password_hasher_pool, '_slots', slots)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_is_not_an_api_exception(self):
+        from rest_framework.exceptions import APIException
+
+        self.assertNotIsInstance(PasswordHashingBusy(), APIException)
+
+    def test_login_is_throttled(self):
+        response = APIClient().post(reverse('users:login'), {
+            'email': 'busy@example.com', 'password': 'Correct-Horse-42',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_create_user_rpc_is_resource_exhausted(self):
+        import grpc
+        from .grpc_servicer import UserServiceServicer
+
+        context = _Context()
+        UserServiceServicer().CreateUser(
+            user_pb2.CreateUserRequest(email='rpc.busy@example.com', password='Correct-Horse-42'), context)
+
+        self.assertEqual(context.code, grpc.StatusCode.RESOURCE_EXHAUSTED)
+        self.assertFalse(User.objects.filter(email='rpc.busy@example.com').exists())
+
+
+class ImportUsersTests(TestCase):
+    """importusers dedupes, rejects conflicts without leaking passwords, and survives races."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'users.jsonl')
+        self.rejects_path = os.path.join(directory.name, 'rejects.jsonl')
+        self.password_hash = make_password('Correct-Horse-42')
+
+    def import_rows(self, rows):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+        call_command(
+            'importusers', self.path, '--workers', '0', '--rejects', self.rejects_path, stdout=io.StringIO())
+
+    def rejects(self):
+        if not os.path.exists(self.rejects_path):
+            return []
+        with open(self.rejects_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_imports_and_hashes_passwords(self):
+        self.import_rows([
+            {'email': 'Plain@Example.com', 'password': 'Correct-Horse-42', 'is_verified': 'yes'},
+            {'email': 'hashed@example.com', 'password_hash': self.password_hash},
+            {'email': 'nopassword@example.com'},
+        ])
+
+        plain = User.objects.get(email='plain@example.com')
+        self.assertTrue(plain.check_password('Correct-Horse-42'))
+        self.assertTrue(plain.is_verified)
+        self.assertTrue(User.objects.get(email='hashed@example.com').check_password('Correct-Horse-42'))
+        self.assertFalse(User.objects.get(email='nopassword@example.com').has_usable_password())
+        self.assertEqual(self.rejects(), [])
+
+    def test_duplicate_in_file_is_rejected(self):
+        self.import_rows([
+            {'email': 'twice@example.com', 'first_name': 'First', 'password_hash': self.password_hash},
+            {'email': 'TWICE@example.com', 'first_name': 'Second', 'password_hash': self.password_hash},
+        ])
+
+        self.assertEqual(User.objects.get(email='twice@example.com').first_name, 'First')
+        [reject] = self.rejects()
+        self.assertEqual(reject['line'], 2)
+        self.assertEqual(reject['reason'], 'duplicate email in input')
+
+    def test_existing_email_is_rejected(self):
+        User.objects.create_user(email='taken@example.com', password='Correct-Horse-42', first_name='Original')
+
+        self.import_rows([
+            {'email': 'taken@example.com', 'first_name': 'Imported', 'password_hash': self.password_hash},
+            {'email': 'free@example.com', 'password_hash': self.password_hash},
+        ])
+
+        self.assertEqual(User.objects.get(email='taken@example.com').first_name, 'Original')
+        self.assertTrue(User.objects.filter(email='free@example.com').exists())
+        [reject] = self.rejects()
+        self.assertEqual(reject['reason'], 'email already exists')
+
+    def test_reject_file_omits_passwords(self):
+        self.import_rows([
+            {'email': 'not-an-email', 'password': 'Correct-Horse-42'},
+            {'email': 'badhash@example.com', 'password_hash': 'plaintext-secret'},
+        ])
+
+        rejects = self.rejects()
+        self.assertEqual([reject['reason'] for reject in rejects], [
+            'invalid email', 'password_hash is not in a format of PASSWORD_HASHERS',
+        ])
+        for reject in rejects:
+            self.assertNotIn('password', reject['row'])
+            self.assertNotIn('password_hash', reject['row'])
+        with open(self.rejects_path, encoding='utf-8') as f:
+            contents = f.read()
+        self.assertNotIn('Correct-Horse-42', contents)
+        self.assertNotIn('plaintext-secret', contents)
+
+    def test_email_created_concurrently_is_retried(self):
+        from .management.commands.importusers import Command
+
+        drop_existing = Command._drop_existing
+
+        def race(command, pending):
+            kept = drop_existing(command, pending)
+            # Another writer takes one of the emails between the check and the INSERT
+            if not User.objects.filter(email='raced@example.com').exists():
+                User.objects.create_user(email='raced@example.com', password='Correct-Horse-42')
+            return kept
+
+        patcher = mock.patch.object(Command, '_drop_existing', race)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.import_rows([
+            {'email': 'raced@example.com', 'password_hash': self.password_hash},
+            {'email': 'calm@example.com', 'password_hash': self.password_hash},
+        ])
+
+        self.assertTrue(User.objects.filter(email='calm@example.com').exists())
+        self.assertEqual(User.objects.filter(email='raced@example.com').count(), 1)
+        [reject] = self.rejects()
+        self.assertEqual(reject['reason'], 'email already exists')
+
+
+class InactiveUserRegistryTests(TestCase):
+    """Tokens of deactivated and deleted users are rejected by every process."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='token@example.com', password='Correct-Horse-42')
+        self.user_id = str(self.user.id)
+        # Another process: it sees only what its reloads read from the database
+        self.registry = InactiveUserRegistry(reconcile_interval=60, deleted_retention=300)
+        self.registry.reload()
+
+    def test_deactivation_is_picked_up_by_reload(self):
+        self.assertFalse(self.registry.is_inactive(self.user_id))
+        User.objects.filter(id=self.user.id).update(is_active=False)
+
+        self.registry.reload()
+        self.assertTrue(self.registry.is_inactive(self.user_id))
+
+    def test_hard_delete_is_picked_up_by_reload(self):
+        self.user.delete()
+
+        self.assertTrue(DeletedUser.objects.filter(user_id=self.user_id).exists())
+        self.assertFalse(self.registry.is_inactive(self.user_id))
+        self.registry.reload()
+        self.assertTrue(self.registry.is_inactive(self.user_id))
+
+    def test_tombstones_expire_with_tokens(self):
+        expired = uuid.uuid4()
+        DeletedUser.objects.create(user_id=expired, deleted_at=timezone.now() - timedelta(seconds=301))
+
+        self.registry.reload()
+        self.assertFalse(self.registry.is_inactive(str(expired)))
+
+        self.registry.write_tombstone(self.user_id)
+        self.assertFalse(DeletedUser.objects.filter(user_id=expired).exists())
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Authenticated requests skip the user query until the user changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='auth@example.com', password='Correct-Horse-42')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        # Another process's view of inactive users: only what its reloads read
+        self.registry = InactiveUserRegistry(reconcile_interval=3600, deleted_retention=300)
+        self.registry.reload()
+        patcher = mock.patch('users.authentication.inactive_users', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        auth_user_cache.clear()
+        self.addCleanup(auth_user_cache.clear)
+
+    def stale_cache(self):
+        """Cache the user as another process did before a change it never saw."""
+        auth_user_cache.set(str(self.user.id), self.user)
+
+    def test_cache_hit_makes_no_queries(self):
+        self.assertEqual(self.client.get(reverse('users:current_user')).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('users:current_user'))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_invalidates_cached_user(self):
+        self.client.get(reverse('users:current_user'))
+        self.user.first_name = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        response = self.client.get(reverse('users:current_user'))
+
+        self.assertEqual(response.data['first_name'], 'Changed')
+
+    def test_deactivated_user_is_rejected(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.stale_cache()
+        self.registry.reload()
+
+        response = self.client.get(reverse('users:current_user'))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIsNone(auth_user_cache.get(str(self.user.id)))
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        self.stale_cache()
+        self.registry.reload()
+
+        response = self.client.patch(reverse('users:current_user'), {'first_name': 'Ghost'}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+
+class LastLoginBufferTests(TestCase):
+    """Logins are written in bulk, only ever forward, and never left behind."""
+
+    def setUp(self):
+        self.buffer = LastLoginBuffer(flush_interval=3600, flush_size=1000)
+        self.addCleanup(self.buffer.stop)
+        self.users = [
+            User.objects.create_user(email=f'login{i}@example.com', password='Correct-Horse-42') for i in range(3)
+        ]
+
+    def test_flush_writes_every_user_in_one_update(self):
+        now = timezone.now()
+        for user in self.users:
+            self.buffer.record(user, now - timedelta(seconds=10))
+        self.buffer.record(self.users[0], now)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 3)
+
+        self.assertEqual(User.objects.get(id=self.users[0].id).last_login, now)
+        self.assertEqual(User.objects.filter(last_login=now - timedelta(seconds=10)).count(), 2)
+
+    def test_older_login_does_not_overwrite_newer(self):
+        newer = timezone.now()
+        User.objects.filter(id=self.users[0].id).update(last_login=newer)
+
+        self.buffer.record(self.users[0], newer - timedelta(minutes=1))
+        self.buffer.flush()
+
+        self.assertEqual(User.objects.get(id=self.users[0].id).last_login, newer)
+
+    def test_flush_drops_cached_users(self):
+        user_id = str(self.users[0].id)
+        self.addCleanup(user_cache.clear)
+        self.addCleanup(auth_user_cache.clear)
+        user_cache.set(SimpleNamespace(id=user_id, email=self.users[0].email), user_cache.generation())
+        auth_user_cache.set(user_id, self.users[0])
+
+        self.buffer.record(self.users[0])
+        self.buffer.flush()
+
+        self.assertIsNone(user_cache.get_by_id(user_id))
+        self.assertIsNone(auth_user_cache.get(user_id))
+
+    def test_stop_flushes_pending_logins(self):
+        self.buffer.record(self.users[1])
+
+        self.buffer.stop()
+
+        self.assertIsNotNone(User.objects.get(id=self.users[1].id).last_login)
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_async_server_stops_off_the_event_loop(self):
+        import asyncio
+        from .grpc_server_new import AsyncGrpcServer
+
+        threads = {}
+        server = AsyncGrpcServer()
+        server.server, server.health_servicer = mock.AsyncMock(), mock.AsyncMock()
+        server.servicer = mock.Mock(**{'shutdown.side_effect': lambda: threads.update(servicer=threading.get_ident())})
+        patchers = [
+            mock.patch('users.grpc_server_new.health_monitor.stop',
+                       side_effect=lambda: threads.update(health=threading.get_ident())),
+            mock.patch('users.grpc_server_new.last_login_buffer.stop',
+                       side_effect=lambda: threads.update(last_login=threading.get_ident())),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        asyncio.run(server.stop())
+
+        self.assertEqual(set(threads), {'servicer', 'health', 'last_login'})
+        self.assertNotIn(threading.get_ident(), threads.values())
+
+
+@skipIf(user_pb2 is None, 'gRPC stubs not generated')
+class ValidateTokenTests(TestCase):
+    """ValidateToken(s) reject every token that must no longer get in."""
+
+    def setUp(self):
+        from .grpc_servicer import UserServiceServicer
+
+        self.servicer = UserServiceServicer()
+        self.user = User.objects.create_user(email='validate@example.com', password='Correct-Horse-42')
+        self.token = AccessToken.for_user(self.user)
+
+    def validate(self, token) -> 'user_pb2.ValidateTokenResponse':
+        return self.servicer.ValidateToken(user_pb2.ValidateTokenRequest(token=str(token)), _Context())
+
+    def test_valid_token(self):
+        response = self.validate(self.token)
+
+        self.assertTrue(response.valid)
+        self.assertEqual(response.user_id, str(self.user.id))
+        self.assertEqual(response.expires_at.seconds, self.token['exp'])
+
+    def test_expired_token(self):
+        self.token.set_exp(lifetime=-timedelta(seconds=1))
+
+        self.assertFalse(self.validate(self.token).valid)
+
+    def test_blacklisted_jti(self):
+        outstanding = OutstandingToken.objects.create(
+            user=self.user, jti=self.token['jti'], token=str(self.token),
+            expires_at=timezone.now() + timedelta(minutes=5))
+        BlacklistedToken.objects.create(token=outstanding)
+
+        response = self.validate(self.token)
+
+        self.assertFalse(response.valid)
+        self.assertIn('blacklisted', response.message)
+
+    def test_deactivated_user(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.validate(self.token)
+
+        self.assertFalse(response.valid)
+        self.assertEqual(response.message, 'User account is disabled.')
+
+    def test_user_tombstoned_by_another_process(self):
+        registry = InactiveUserRegistry(reconcile_interval=3600, deleted_retention=300)
+        patcher = mock.patch('users.token_validation.inactive_users', registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        DeletedUser.objects.create(user_id=self.user.id, deleted_at=timezone.now())
+        registry.reload()
+
+        self.assertFalse(self.validate(self.token).valid)
+
+    def test_batch_preserves_order(self):
+        other = User.objects.create_user(email='validate2@example.com', password='Correct-Horse-42')
+        expired = AccessToken.for_user(other)
+        expired.set_exp(lifetime=-timedelta(seconds=1))
+        tokens = [str(self.token), str(expired), str(AccessToken.for_user(other)), 'not-a-token']
+
+        response = self.servicer.ValidateTokens(user_pb2.ValidateTokensRequest(tokens=tokens), _Context())
+
+        self.assertEqual([result.valid for result in response.results], [True, False, True, False])
+        self.assertEqual(
+            [result.user_id for result in response.results], [str(self.user.id), '', str(other.id), ''])
+
+
+@skipIf(user_pb2 is None, 'gRPC stubs not generated')
+class BatchLookupTests(TestCase):
+    """Batch lookups answer in request order from one query."""
+
+    def setUp(self):
+        from .grpc_servicer import UserServiceServicer
+
+        self.servicer = UserServiceServicer()
+        self.users = [
+            User.objects.create_user(email=f'batch{i}@example.com', password='Correct-Horse-42') for i in range(3)
+        ]
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+    def test_users_by_id_in_request_order(self):
+        missing = str(uuid.uuid4())
+        keys = [str(self.users[2].id), missing, 'not-a-uuid', str(self.users[0].id), str(self.users[2].id)]
+
+        with self.assertNumQueries(1):
+            response = self.servicer.BatchGetUsers(user_pb2.BatchGetUsersRequest(user_ids=keys), _Context())
+
+        self.assertEqual([result.key for result in response.results], keys)
+        self.assertEqual([result.found for result in response.results], [True, False, False, True, True])
+        self.assertEqual(
+            [result.user.id for result in response.results if result.found],
+            [str(self.users[2].id), str(self.users[0].id), str(self.users[2].id)])
+        self.assertFalse(response.results[1].HasField('user'))
+
+    def test_users_by_email_in_request_order(self):
+        keys = ['BATCH1@example.com', 'nobody@example.com', 'batch0@example.com']
+
+        with self.assertNumQueries(1):
+            response = self.servicer.BatchGetUsersByEmail(
+                user_pb2.BatchGetUsersByEmailRequest(emails=keys), _Context())
+
+        self.assertEqual([result.key for result in response.results], keys)
+        self.assertEqual([result.found for result in response.results], [True, False, True])
+        self.assertEqual(response.results[0].user.email, 'batch1@example.com')
+        self.assertEqual(response.results[2].user.email, 'batch0@example.com')
+
+    def test_cached_users_need_no_query(self):
+        keys = [str(user.id) for user in self.users]
+        self.servicer.BatchGetUsers(user_pb2.BatchGetUsersRequest(user_ids=keys), _Context())
+
+        with self.assertNumQueries(0):
+            response = self.servicer.BatchGetUsers(user_pb2.BatchGetUsersRequest(user_ids=keys), _Context())
+
+        self.assertTrue(all(result.found for result in response.results))
+
+    def test_batches_over_the_limit_are_rejected(self):
+        import grpc
+        from .grpc_servicer import MAX_BATCH_SIZE
+
+        for rpc, request in (
+            (self.servicer.BatchGetUsers,
+             user_pb2.BatchGetUsersRequest(user_ids=[str(uuid.uuid4()) for _ in range(MAX_BATCH_SIZE + 1)])),
+            (self.servicer.BatchGetUsersByEmail,
+             user_pb2.BatchGetUsersByEmailRequest(emails=[f'{i}@example.com' for i in range(MAX_BATCH_SIZE + 1)])),
+        ):
+            context = _Context()
+            with self.assertNumQueries(0):
+                response = rpc(request, context)
+            self.assertEqual(context.code, grpc.StatusCode.INVALID_ARGUMENT)
+            self.assertEqual(len(response.results), 0)
+
+        with self.assertNumQueries(1):
+            self.servicer.BatchGetUsers(
+                user_pb2.BatchGetUsersRequest(user_ids=[str(uuid.uuid4()) for _ in range(MAX_BATCH_SIZE)]),
+                _Context())
+
+
+class BlacklistFilterTests(TestCase):
+    """Refresh tokens are checked against the Bloom filter, then the table."""
+
+    def setUp(self):
+        user = User.objects.create_user(email='refresh@example.com', password='Correct-Horse-42')
+        self.token = RefreshToken.for_user(user)
+        self.jti = self.token['jti']
+        # A filter of our own: the post_save signal only feeds the process-wide
+        # one, so rows inserted here look like they came from another process
+        self.filter = BlacklistFilter(sync_interval=3600)
+        patcher = mock.patch('users.token_blacklist.blacklist_filter', self.filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _blacklist(self):
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=self.jti))
+
+    def test_blacklisted_token_is_rejected_after_rebuild(self):
+        self._blacklist()
+        self.filter.rebuild()
+
+        with self.assertRaises(TokenError):
+            self.token.check_blacklist()
+
+    def test_token_blacklisted_elsewhere_is_rejected_after_sync(self):
+        self.filter.rebuild()
+        self._blacklist()
+        self.assertFalse(self.filter.is_blacklisted(self.jti))
+
+        self.filter.sync()
+
+        with self.assertRaises(TokenError):
+            self.token.check_blacklist()
+
+    def test_false_positive_is_settled_by_the_table(self):
+        self.filter.rebuild()
+        self.filter.add(self.jti)
+
+        with self.assertNumQueries(1):
+            self.token.check_blacklist()
+
+    def test_negative_makes_no_query(self):
+        self.filter.rebuild()
+
+        with self.assertNumQueries(0):
+            self.token.check_blacklist()
+
+
+class NgramIndexBackendTests(TestCase):
+    """The in-process search index never drops matches or rebuilds twice at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User(email=f'annabel{i}@example.com', username=f'annabel{i}') for i in range(5)]
+        users.append(User(email='bob@example.com', username='bob'))
+        for user in users:
+            user.search_text = user.build_search_text()
+        User.objects.bulk_create(users)
+
+    def test_queries_over_the_candidate_cap_fall_back_to_the_database(self):
+        indexed = NgramIndexBackend(max_candidates=100).search(User.objects.all(), 'Annabel')
+        capped = NgramIndexBackend(max_candidates=2).search(User.objects.all(), 'Annabel')
+
+        self.assertEqual(capped.count(), 5)
+        self.assertEqual(set(capped.values_list('id', flat=True)), set(indexed.values_list('id', flat=True)))
+        ranks = capped.order_by(f'-{RANK_FIELD}').values_list(RANK_FIELD, flat=True)
+        self.assertTrue(all(0 < rank <= 1 for rank in ranks))
+
+    def test_concurrent_requests_rebuild_once(self):
+        backend = NgramIndexBackend(rebuild_interval=60)
+        backend.rebuild()
+        backend._built_at -= 61
+        started = threading.Event()
+
+        def rebuild():
+            started.set()
+            time.sleep(0.2)
+            backend._built_at = time.monotonic()
+
+        with mock.patch.object(backend, 'rebuild', side_effect=rebuild) as rebuilt:
+            threads = [threading.Thread(target=backend._maybe_rebuild) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+                started.wait(5)
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(rebuilt.call_count, 1)
+
+
+class UserListPaginationTests(TestCase):
+    """The admin listing pages with cursors at one query per page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='Correct-Horse-42')
+        User.objects.bulk_create([
+            User(email=f'user{i}@example.com', username=f'user{i}', is_active=i % 5 != 0)
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pages_cover_active_users_once(self):
+        url = reverse('users:user_list') + '?page_size=7'
+        first = self.client.get(url).data
+        ids = [user['id'] for user in first['results']]
+
+        url = first['next']
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url).data
+            ids += [user['id'] for user in page['results']]
+            url = page['next']
+
+        active = User.objects.filter(is_active=True).order_by('-date_joined', '-id')
+        self.assertEqual(first['count'], active.count())
+        self.assertEqual(ids, [str(user_id) for user_id in active.values_list('id', flat=True)])
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        url = reverse('users:user_list') + '?page_size=7'
+        pages = [self.client.get(url).data]
+        self.assertIsNone(pages[0]['previous'])
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+
+        for expected in reversed(pages[:-1]):
+            with self.assertNumQueries(1):
+                page = self.client.get(pages[-1]['previous']).data
+            self.assertEqual(page['results'], expected['results'])
+            self.assertEqual(page['count'], expected['count'])
+            pages[-1] = page
+        self.assertIsNone(page['previous'])
+        self.assertTrue(page['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('users:user_list') + '?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+@skipIf(user_pb2 is None, 'gRPC stubs not generated')
+class GrpcPaginationTests(TestCase):
+    """ListUsers and SearchUsers page tokens walk every match once, for one request only."""
+
+    def setUp(self):
+        from .grpc_servicer import UserServiceServicer
+
+        self.servicer = UserServiceServicer()
+        self.ids = {
+            str(User.objects.create_user(
+                email=f'page{i}@example.com', password='Correct-Horse-42', is_verified=True).id)
+            for i in range(5)
+        }
+        User.objects.create_user(email='page.pending@example.com', password='Correct-Horse-42')
+
+    def walk(self, rpc, request) -> list:
+        seen = []
+        while True:
+            context = _Context()
+            response = rpc(request, context)
+            self.assertIsNone(context.code)
+            seen.extend(user.id for user in response.users)
+            if not response.pagination.next_page_token:
+                return seen
+            request.pagination.page_token = response.pagination.next_page_token
+
+    def list_request(self, **kwargs):
+        request = user_pb2.ListUsersRequest(statuses=[user_pb2.USER_STATUS_ACTIVE], **kwargs)
+        request.pagination.page_size = 2
+        return request
+
+    def test_list_users_round_trip(self):
+        seen = self.walk(self.servicer.ListUsers, self.list_request())
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), self.ids)
+
+    def test_search_users_round_trip(self):
+        request = user_pb2.SearchUsersRequest(query='page', statuses=[user_pb2.USER_STATUS_ACTIVE])
+        request.pagination.page_size = 2
+
+        seen = self.walk(self.servicer.SearchUsers, request)
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), self.ids)
+
+    def assert_rejected(self, rpc, request):
+        import grpc
+
+        context = _Context()
+        response = rpc(request, context)
+        self.assertEqual(context.code, grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(len(response.users), 0)
+
+    def test_tampered_token_is_rejected(self):
+        token = self.servicer.ListUsers(self.list_request(), _Context()).pagination.next_page_token
+        request = self.list_request()
+        request.pagination.page_token = token[:-2] + ('A' if token[-2] != 'A' else 'B') + token[-1]
+
+        self.assert_rejected(self.servicer.ListUsers, request)
+
+    def test_token_of_other_filters_is_rejected(self):
+        token = self.servicer.ListUsers(self.list_request(), _Context()).pagination.next_page_token
+        request = user_pb2.ListUsersRequest()
+        request.pagination.page_token = token
+
+        self.assert_rejected(self.servicer.ListUsers, request)
+
+    def test_token_of_other_query_is_rejected(self):
+        request = user_pb2.SearchUsersRequest(query='page')
+        request.pagination.page_size = 2
+        token = self.servicer.SearchUsers(request, _Context()).pagination.next_page_token
+        request = user_pb2.SearchUsersRequest(query='page1')
+        request.pagination.page_token = token
+
+        self.assert_rejected(self.servicer.SearchUsers, request)
+
+
+@skipIf(user_pb2 is None, 'gRPC stubs not generated')
+class ExportResumeTests(TestCase):
+    """An interrupted ExportUsers resumes from its last resume_token without duplicates or gaps."""
+
+    def setUp(self):
+        from .grpc_servicer import UserServiceServicer
+
+        self.servicer = UserServiceServicer()
+        for i in range(11):
+            User.objects.create_user(email=f'export{i}@example.com', password='Correct-Horse-42', is_verified=True)
+        User.objects.create_user(email='export.pending@example.com', password='Correct-Horse-42')
+        User.objects.create_superuser(email='export.admin@example.com', password='Correct-Horse-42')
+        # Ties on date_joined, including across a batch boundary, are ordered by id
+        joined = timezone.now() - timedelta(days=1)
+        User.objects.filter(email__in=[f'export{i}@example.com' for i in range(2, 7)]).update(date_joined=joined)
+
+    def request(self, **kwargs):
+        return user_pb2.ExportUsersRequest(
+            statuses=[user_pb2.USER_STATUS_ACTIVE], roles=[user_pb2.USER_ROLE_CUSTOMER], batch_size=3, **kwargs)
+
+    def export(self, request, batches=None) -> tuple:
+        """Return the ids of the first ``batches`` batches (all if None) and the last resume_token."""
+        context = _Context()
+        stream = self.servicer.ExportUsers(request, context)
+        ids, token = [], ''
+        for response in itertools.islice(stream, batches):
+            ids.extend(user.id for user in response.users)
+            token = response.resume_token
+        stream.close()
+        self.assertIsNone(context.code)
+        return ids, token
+
+    def test_resume_has_no_duplicates_or_gaps(self):
+        expected, _ = self.export(self.request())
+        self.assertEqual(
+            set(expected),
+            {str(pk) for pk in User.objects.filter(email__regex=r'^export\d+@').values_list('id', flat=True)},
+        )
+
+        first, token = self.export(self.request(), batches=2)
+        rest, _ = self.export(self.request(resume_token=token))
+
+        self.assertEqual(len(first), 6)
+        self.assertEqual(first + rest, expected)
+
+    def test_resume_token_of_other_filters_is_rejected(self):
+        import grpc
+
+        _, token = self.export(self.request(), batches=1)
+        context = _Context()
+
+        responses = list(self.servicer.ExportUsers(
+            user_pb2.ExportUsersRequest(statuses=[user_pb2.USER_STATUS_ACTIVE], resume_token=token), context))
+
+        self.assertEqual(responses, [])
+        self.assertEqual(context.code, grpc.StatusCode.INVALID_ARGUMENT)
+
+
+class ReadSerializerEquivalenceTests(TestCase):
+    """UserReadSerializer + ORJSONRenderer render the same bytes as UserSerializer + JSONRenderer."""
+
+    def assertSameJSON(self, instance):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        from .serializers import UserReadSerializer, UserSerializer
+
+        expected = JSONRenderer().render(UserSerializer(instance).data)
+        self.assertEqual(ORJSONRenderer().render(UserReadSerializer(instance).data), expected)
+        return json.loads(expected)
+
+    def row(self, **values):
+        """A named ``values_list`` row, as rendered by the paginated user list."""
+        fields = {
+            'id': uuid.uuid4(), 'email': 'row@example.com', 'username': 'row', 'first_name': 'Row',
+            'last_name': 'User', 'phone_number': '', 'is_active': True, 'is_verified': False,
+            'date_joined': timezone.now(), 'updated_at': timezone.now(),
+        }
+        fields.update(values)
+        return SimpleNamespace(**fields)
+
+    def test_saved_user(self):
+        user = User.objects.create_user(email='equal@example.com', password='Correct-Horse-42')
+        user.refresh_from_db()
+
+        data = self.assertSameJSON(user)
+
+        self.assertEqual(data['id'], str(user.id))
+
+    def test_uuid(self):
+        user_id = uuid.UUID('00000000-0000-4000-8000-0000000000ff')
+
+        self.assertEqual(self.assertSameJSON(self.row(id=user_id))['id'], '00000000-0000-4000-8000-0000000000ff')
+
+    def test_aware_datetimes(self):
+        from datetime import timezone as dt_timezone
+        from zoneinfo import ZoneInfo
+
+        for value in (
+            datetime(2026, 10, 18, 12, 30, 45, 123456, tzinfo=dt_timezone.utc),
+            datetime(2026, 10, 18, 12, 30, 45, tzinfo=dt_timezone.utc),
+            datetime(2026, 3, 29, 1, 30, tzinfo=ZoneInfo('Asia/Kolkata')),
+        ):
+            for time_zone in ('UTC', 'America/New_York', 'Asia/Kolkata'):
+                with self.subTest(value=value, time_zone=time_zone), override_settings(TIME_ZONE=time_zone):
+                    self.assertSameJSON(self.row(date_joined=value, updated_at=value))
+
+    def test_nulls(self):
+        data = self.assertSameJSON(self.row(username=None, phone_number=None, updated_at=None))
+
+        self.assertIsNone(data['username'])
+        self.assertIsNone(data['updated_at'])
+
+    def test_unicode(self):
+        data = self.assertSameJSON(self.row(
+            email='zo\u00eb@example.com', first_name='Zo\u00eb \u674e', last_name='\U0001f600 "quoted" \\',
+            username='line\u2028separator\u2029', phone_number='\u0000\t\n',
+        ))
+
+        self.assertEqual(data['first_name'], 'Zo\u00eb \u674e')
+        self.assertEqual(data['username'], 'line\u2028separator\u2029')
+
+
+class ConditionalRequestTests(TestCase):
+    """ETags on user resources: 304 for unchanged copies, 412 for lost updates."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='etag@example.com', password='Correct-Horse-42')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('users:current_user')
+
+    def test_if_none_match_returns_304_from_one_query(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changed_user_returns_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'first_name': 'Changed'}, format='json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['first_name'], 'Changed')
+
+    def test_if_match_rejects_stale_update(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'first_name': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.patch(self.url, {'first_name': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 412)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'First')
+
+    def test_detail_if_none_match(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='Correct-Horse-42')
+        self.client.force_authenticate(admin)
+        url = reverse('users:user_detail', kwargs={'id': self.user.id})
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+
+class HealthCheckTests(TestCase):
+    """Probes are served from the cached report of the background checks."""
+
+    def setUp(self):
+        self.monitor = HealthMonitor(interval=60)
+        self.monitor.register('database', check_database, critical=True)
+        self.monitor.register('token_blacklist', check_token_blacklist)
+
+    def test_probe_makes_no_queries(self):
+        self.monitor.refresh()
+
+        with mock.patch('users.views.health_monitor', self.monitor), self.assertNumQueries(0):
+            response = APIClient().get(reverse('users:health'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], HEALTHY)
+        self.assertEqual(response.data['components'], {'database': HEALTHY, 'token_blacklist': HEALTHY})
+
+    def test_failing_components(self):
+        def broken():
+            raise RuntimeError('down')
+
+        self.monitor.register('token_blacklist', broken)
+        self.assertEqual(self.monitor.refresh()['status'], DEGRADED)
+
+        self.monitor.register('database', broken, critical=True)
+        self.monitor.refresh()
+        with mock.patch('users.views.health_monitor', self.monitor):
+            response = APIClient().get(reverse('users:health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['components']['database'], UNHEALTHY)
+
+    def test_stale_report_is_unhealthy(self):
+        self.monitor.refresh()
+        self.monitor._report['checked_monotonic'] -= self.monitor.interval * 4
+
+        self.assertEqual(self.monitor.report()['status'], UNHEALTHY)
+
+    def test_starting_before_first_round(self):
+        with mock.patch.object(self.monitor, 'start') as start:
+            self.assertEqual(self.monitor.report(wait=0)['status'], STARTING)
+            with mock.patch('users.views.health_monitor', self.monitor):
+                response = APIClient().get(reverse('users:health'))
+
+        start.assert_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['status'], STARTING)
+
+    def test_watched_pool_without_work_queue(self):
+        self.monitor.watch_pool('pool', object())
+
+        self.assertEqual(self.monitor.refresh()['components']['pool'], HEALTHY)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """gRPC worker threads recycle their own database connections around RPCs."""
+
+    def setUp(self):
+        self.wrapper = mock.Mock(connection=object())
+        patcher = mock.patch('users.db_pool.connections')
+        patcher.start().all.return_value = [self.wrapper]
+        self.addCleanup(patcher.stop)
+
+    def test_idle_connection_is_closed_by_its_thread(self):
+        pool = ConnectionPool(idle_timeout=60)
+        with pool.lease():
+            pass
+        with pool.lease():
+            pass
+        self.wrapper.close.assert_not_called()
+
+        pool._slots[threading.get_ident()].idle_since -= 61
+        with pool.lease():
+            self.wrapper.close.assert_called_once()
+        self.wrapper.inc_thread_sharing.assert_not_called()
+
+    def test_shutdown_closes_connections_of_stopped_threads(self):
+        pool = ConnectionPool(idle_timeout=60)
+        worker = threading.Thread(target=self._rpc, args=(pool,))
+        worker.start()
+        worker.join()
+        self.assertEqual(len(pool._slots), 1)
+
+        pool.shutdown()
+
+        self.assertEqual(pool._slots, {})
+        self.wrapper.close.assert_called_once()
+        self.wrapper.inc_thread_sharing.assert_called_once()
+
+    def test_sweep_closes_idle_connections_on_their_threads(self):
+        closed_on = []
+        self.wrapper.close.side_effect = lambda: closed_on.append(threading.get_ident())
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        pool = ConnectionPool(idle_timeout=60)
+        pool._executor = executor
+        owner = executor.submit(self._rpc, pool).result()
+        self.assertEqual(pool.sweep(), 0)
+
+        pool._slots[owner].idle_since -= 61
+        self.assertEqual(pool.sweep(), 1)
+        executor.shutdown(wait=True)
+
+        self.assertEqual(closed_on, [owner])
+        self.assertEqual(pool._slots, {})
+        self.wrapper.inc_thread_sharing.assert_not_called()
+
+    def test_gauges_count_live_connections(self):
+        pool = ConnectionPool(idle_timeout=60)
+        with pool.lease():
+            pass
+        self.assertEqual(REGISTRY.get_sample_value('grpc_db_connections', {'state': 'open'}), 1)
+        self.assertEqual(REGISTRY.get_sample_value('grpc_db_connections', {'state': 'idle'}), 1)
+
+        # Closed by Django (CONN_MAX_AGE) while the thread keeps its slot
+        self.wrapper.connection = None
+        with pool.lease():
+            self.assertEqual(REGISTRY.get_sample_value('grpc_db_connections', {'state': 'open'}), 0)
+            self.assertEqual(REGISTRY.get_sample_value('grpc_db_connections', {'state': 'checked_out'}), 0)
+
+    def _rpc(self, pool):
+        with pool.lease():
+            pass
+        return threading.get_ident()
+
+
+class MetricsTests(TestCase):
+    """RPCs and requests are recorded under bounded label sets."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='metrics@example.com', password='Correct-Horse-42', is_staff=True)
+
+    def sample(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def rpc(self, behavior, code=None):
+        import grpc
+        from .grpc_interceptors import MetricsInterceptor
+
+        handler = MetricsInterceptor().intercept_service(
+            lambda details: grpc.unary_unary_rpc_method_handler(behavior),
+            SimpleNamespace(method='/user.v1.UserService/GetUser'))
+        return handler.unary_unary(None, SimpleNamespace(code=lambda: code))
+
+    def test_interceptor_records_code_and_queries(self):
+        labels = {'grpc_service': 'user.v1.UserService', 'grpc_method': 'GetUser'}
+        handled = self.sample('grpc_server_handled_total', **labels, grpc_code='OK')
+        queries = self.sample('grpc_server_db_queries_total', **labels)
+        latency = self.sample('grpc_server_handling_seconds_count', **labels)
+
+        self.assertEqual(self.rpc(lambda request, context: User.objects.count()), 1)
+
+        self.assertEqual(self.sample('grpc_server_handled_total', **labels, grpc_code='OK'), handled + 1)
+        self.assertEqual(self.sample('grpc_server_db_queries_total', **labels), queries + 1)
+        self.assertEqual(self.sample('grpc_server_handling_seconds_count', **labels), latency + 1)
+        self.assertEqual(self.sample('grpc_server_in_flight', **labels), 0)
+
+    def test_interceptor_records_error_codes(self):
+        import grpc
+
+        labels = {'grpc_service': 'user.v1.UserService', 'grpc_method': 'GetUser'}
+        not_found = self.sample('grpc_server_handled_total', **labels, grpc_code='NOT_FOUND')
+        unknown = self.sample('grpc_server_handled_total', **labels, grpc_code='UNKNOWN')
+
+        self.rpc(lambda request, context: None, code=grpc.StatusCode.NOT_FOUND)
+        with self.assertRaises(RuntimeError):
+            self.rpc(mock.Mock(side_effect=RuntimeError('boom')))
+
+        self.assertEqual(self.sample('grpc_server_handled_total', **labels, grpc_code='NOT_FOUND'), not_found + 1)
+        self.assertEqual(self.sample('grpc_server_handled_total', **labels, grpc_code='UNKNOWN'), unknown + 1)
+
+    def test_middleware_records_view_status_and_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        view = {'view': 'users:user_detail'}
+        ok = self.sample('http_requests_total', **view, method='GET', status='200')
+        queries = self.sample('http_db_queries_total', **view)
+
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(reverse('users:user_detail', args=[self.user.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sample('http_requests_total', **view, method='GET', status='200'), ok + 1)
+        self.assertEqual(self.sample('http_db_queries_total', **view), queries + len(captured))
+        self.assertEqual(self.sample('http_requests_in_flight'), 0)
+
+    def test_middleware_labels_by_route_not_path(self):
+        unauthorized = self.sample('http_requests_total', view='users:current_user', method='GET', status='401')
+        unmatched = self.sample('http_requests_total', view='<unmatched>', method='GET', status='404')
+
+        APIClient().get(reverse('users:current_user'))
+        APIClient().get(f'/no-such-page/{uuid.uuid4()}/')
+
+        self.assertEqual(
+            self.sample('http_requests_total', view='users:current_user', method='GET', status='401'),
+            unauthorized + 1)
+        self.assertEqual(
+            self.sample('http_requests_total', view='<unmatched>', method='GET', status='404'), unmatched + 1)
+
+
+class _ReplicaRoutingMixin:
+    """Route through a replica monitor the test measures by hand."""
+
+    def setUp(self):
+        super().setUp()
+        self.monitor = ReplicaMonitor(['replica1'], max_lag=5)
+        self.monitor._thread = threading.current_thread()  # no background checks
+        patcher = mock.patch('users.routers.replica_monitor', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Fed by the post_save signal
+        self.writes = recent_writes
+        self.addCleanup(recent_writes.clear)
+
+    def expire_writes(self):
+        """Pretend the stickiness window of every recorded write has passed."""
+        return mock.patch('users.routers.time.monotonic', return_value=time.monotonic() + 61)
+
+
+class ReplicaRouterTests(_ReplicaRoutingMixin, SimpleTestCase):
+    """User reads go to a replica unless they must see a recent write."""
+
+    def setUp(self):
+        super().setUp()
+        self.router = PrimaryReplicaRouter()
+
+    def test_replicas_follow_measured_lag(self):
+        lags = {'replica1': 0.0}
+        with mock.patch('users.routers.measure_lag', side_effect=lambda alias: lags[alias]):
+            # Nothing measured yet
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.monitor.check()
+            self.assertEqual(self.router.db_for_read(User), 'replica1')
+            lags['replica1'] = 30.0
+            self.monitor.check()
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+        with mock.patch('users.routers.measure_lag', side_effect=OSError('down')):
+            self.monitor.check()
+        self.assertEqual(self.monitor.lags(), {'replica1': None})
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+
+    def test_recent_writes_read_from_primary(self):
+        self.monitor._available = ['replica1']
+        user_id = uuid.uuid4()
+        self.writes.record(str(user_id), 'Sticky@Example.com')
+
+        self.assertEqual(User.objects.for_user(user_id).filter(id=user_id).db, 'default')
+        self.assertEqual(User.objects.for_user(str(user_id).upper()).all().db, 'default')
+        self.assertEqual(User.objects.for_user('sticky@example.com').all().db, 'default')
+        self.assertEqual(User.objects.for_user(uuid.uuid4()).all().db, 'replica1')
+        self.assertEqual(User.objects.all().db, 'replica1')
+        self.assertEqual(User.objects.primary().all().db, 'default')
+        self.assertEqual(OutstandingToken.objects.all().db, 'default')
+        with self.expire_writes():
+            self.assertEqual(User.objects.for_user(user_id).all().db, 'replica1')
+
+    def test_failed_lag_check_keeps_the_monitor_running(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(self.monitor, 'check', side_effect=[RuntimeError('boom'), []]) as check, \
+                mock.patch('users.routers.time.sleep', side_effect=[None, Stop]), \
+                mock.patch('users.routers.close_old_connections'):
+            with self.assertRaises(Stop):
+                self.monitor._run()
+
+        self.assertEqual(check.call_count, 2)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'sticky': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sticky-tests'},
+})
+class RecentWritesTests(TestCase):
+    """Writes pin users to the primary, in every process sharing the cache."""
+
+    def setUp(self):
+        caches['sticky'].clear()
+
+    def test_writes_are_shared_through_the_cache(self):
+        writer, reader = RecentWrites(ttl=10, cache_alias='sticky'), RecentWrites(ttl=10, cache_alias='sticky')
+        user_id = str(uuid.uuid4())
+
+        with self.assertNumQueries(0):
+            writer.record(user_id, 'Shared@Example.com')
+            self.assertTrue(reader.contains([user_id.upper()]))
+            self.assertTrue(reader.contains(['shared@example.com']))
+            self.assertFalse(reader.contains([str(uuid.uuid4())]))
+
+    def test_unreachable_cache_reads_from_primary(self):
+        with mock.patch.object(caches['sticky'], 'get_many', side_effect=ConnectionError('down')):
+            self.assertTrue(RecentWrites(cache_alias='sticky').contains([str(uuid.uuid4())]))
+
+    def test_email_change_pins_the_previous_email(self):
+        User.objects.create_user(email='before@example.com', password='Correct-Horse-42')
+        self.addCleanup(recent_writes.clear)
+        user = User.objects.get(email='before@example.com')
+        recent_writes.clear()
+
+        user.email = 'after@example.com'
+        user.save()
+
+        self.assertTrue(recent_writes.contains(['before@example.com']))
+        self.assertTrue(recent_writes.contains(['after@example.com']))
+
+
+@skipIf('replica1' not in settings.DATABASES, 'DATABASE_REPLICAS not configured')
+class ReplicaReadYourWritesTests(_ReplicaRoutingMixin, TransactionTestCase):
+    """
+    Against a primary and a replica that never replicates (e.g. two SQLite
+    files: DATABASE_REPLICAS=replica.sqlite3), i.e. a replica lagging forever.
+    """
+
+    databases = {'default', 'replica1'} & set(settings.DATABASES)
+
+    def setUp(self):
+        super().setUp()
+        self.monitor.check()
+
+    def test_written_user_is_read_from_primary(self):
+        user = User.objects.create_user(email='lagging@example.com', password='Correct-Horse-42')
+
+        self.assertTrue(User.objects.for_user(user.id).filter(id=user.id).exists())
+        with self.expire_writes():
+            # The replica has not seen the user
+            self.assertFalse(User.objects.for_user(user.id).filter(id=user.id).exists())
+            with mock.patch('users.routers.measure_lag', return_value=60.0):
+                self.monitor.check()
+            # Too far behind: back to the primary
+            self.assertTrue(User.objects.for_user(user.id).filter(id=user.id).exists())
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'sticky': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sticky-tests'},
+    })
+    def test_get_user_sees_write_of_another_process(self):
+        from .grpc_servicer import UserServiceServicer
+
+        patcher = mock.patch.object(recent_writes, 'cache_alias', 'sticky')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(email='elsewhere@example.com', password='Correct-Horse-42')
+        # The replica still has the row as it was before the update below
+        User.objects.using('replica1').bulk_create([User(id=user.id, email=user.email, first_name='Old')])
+        user.first_name = 'New'
+        user.save()
+        # Only the shared record is left, as in a process that did not write
+        self.writes.clear()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+        response = UserServiceServicer().GetUser(user_pb2.GetUserRequest(user_id=str(user.id)), _Context())
+
+        self.assertEqual(response.user.first_name, 'New')
+        self.assertEqual(user_cache.get_by_id(str(user.id)).first_name, 'New')
+        with mock.patch.object(recent_writes, 'cache_alias', None):
+            self.assertEqual(User.objects.for_user(user.id).get(id=user.id).first_name, 'Old')
+
+    def test_register_then_read_profile(self):
+        client = APIClient()
+        response = client.post(reverse('users:register'), {
+            'email': 'fresh@example.com',
+            'password': 'Correct-Horse-42',
+            'password_confirm': 'Correct-Horse-42',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["tokens"]["access"]}')
+        response = client.get(reverse('users:current_user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'fresh@example.com')
+
+
+class QueryPlanTests(TestCase):
+    """Hot queries must read the users table through an index, never scan or sort it."""
+
+    # Enough for two pages of every status filter. Plans are not left to table
+    # size: PostgreSQL is told to avoid scans and sorts wherever an index can
+    # serve the query, so a plan showing one means no index could.
+    SEED_USERS = 500
+
+    # A full pass over the users table, or sorting rows (PostgreSQL, SQLite)
+    FULL_SCAN = re.compile(r'Seq Scan on users|SCAN (TABLE )?users(?! USING)|\bSort\b|USE TEMP B-TREE')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='Correct-Horse-42')
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{i}@example.com', username=f'user{i}', first_name=f'First{i % 500}',
+                    last_name=f'Last{i % 700}', is_active=i % 20 != 0, is_verified=i % 10 != 0,
+                )
+                for i in range(cls.SEED_USERS)
+            ),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users')
+
+    def assertIndexed(self, queries):
+        """EXPLAIN each captured SELECT (bounded COUNTs aside) and check its plan."""
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'COUNT(' not in query['sql']
+        ]
+        self.assertTrue(selects)
+        for sql in selects:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                    cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            self.assertIsNone(self.FULL_SCAN.search(plan), f'{sql}\n{plan}')
+
+    def test_sortable_fields_are_indexed(self):
+        indexed = {tuple(index.fields[:2]) for index in User._meta.indexes if index.condition is None}
+        for sort_field, field in SORTABLE_FIELDS.items():
+            if sort_field in UNINDEXED_SORT_FIELDS:
+                continue
+            with self.subTest(sort_field):
+                self.assertTrue(User._meta.get_field(field).unique or (field, 'id') in indexed)
+
+    def test_admin_user_list(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            page = client.get(reverse('users:user_list')).data
+            client.get(page['next'])
+        self.assertIndexed(queries)
+
+    def test_username_lookup(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(reverse('users:current_user'), {'username': 'user42'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIndexed(queries)
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_list_users_sorts(self):
+        from .grpc_generated.proto.common.v1 import common_pb2
+        from .grpc_servicer import UserServiceServicer
+
+        servicer = UserServiceServicer()
+        for sort_field in SORTABLE_FIELDS.keys() - UNINDEXED_SORT_FIELDS:
+            for order in (common_pb2.SORT_ORDER_ASC, common_pb2.SORT_ORDER_DESC):
+                with self.subTest(sort_field=sort_field, order=order):
+                    request = user_pb2.ListUsersRequest()
+                    request.sort.field = sort_field
+                    request.sort.order = order
+                    with CaptureQueriesContext(connection) as queries:
+                        response = servicer.ListUsers(request, _Context())
+                        request.pagination.page_token = response.pagination.next_page_token
+                        servicer.ListUsers(request, _Context())
+                    self.assertIndexed(queries)
+
+    @skipIf(user_pb2 is None, 'gRPC stubs not generated')
+    def test_list_export_and_search_by_status(self):
+        from .grpc_servicer import UserServiceServicer
+
+        servicer = UserServiceServicer()
+        for status in (user_pb2.USER_STATUS_ACTIVE, user_pb2.USER_STATUS_PENDING_VERIFICATION,
+                       user_pb2.USER_STATUS_DEACTIVATED):
+            with self.subTest(status=status), CaptureQueriesContext(connection) as queries:
+                response = servicer.ListUsers(user_pb2.ListUsersRequest(statuses=[status]), _Context())
+                self.assertEqual(len(response.users), 20)
+                servicer.SearchUsers(user_pb2.SearchUsersRequest(statuses=[status]), _Context())
+                export = servicer.ExportUsers(user_pb2.ExportUsersRequest(statuses=[status]), _Context())
+                next(export)
+                export.close()
+            self.assertIndexed(queries)
@@ -0,0 +1,249 @@
+"""
+Refresh token blacklist checks without a query per token.
+
+simplejwt looks every refresh token up in ``BlacklistedToken`` before using
+it (``TokenRefreshView``, logout). Almost all of those tokens are not
+blacklisted, so we keep a Bloom filter of the blacklisted JTIs and only query
+the table when the filter reports a possible match:
+
+- the filter is built from the unexpired blacklisted tokens with one query
+  on first use and rebuilt every ``TOKEN_BLACKLIST_REBUILD_INTERVAL`` seconds,
+  which drops expired tokens;
+- a ``post_save`` signal on ``BlacklistedToken`` (see ``users.signals``) adds
+  tokens blacklisted by this process immediately;
+- tokens blacklisted by other processes are fetched every
+  ``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds by a query on ``blacklisted_at``.
+
+A Bloom filter has no false negatives, so a token blacklisted by this process
+is always rejected; one blacklisted by another process may be accepted for up
+to ``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds (0 syncs before every check).
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Re-read this far behind the previous sync to catch rows committed late or
+# stamped by a host with a slightly slower clock
+SYNC_OVERLAP = timedelta(seconds=10)
+
+BLACKLIST_CHECKS = Counter(
+    'token_blacklist_checks_total',
+    'Refresh token blacklist checks, by result (negative, blacklisted, false_positive).',
+    ('result',))
+BLACKLIST_FALSE_POSITIVE_RATE = Gauge(
+    'token_blacklist_false_positive_rate',
+    'Observed share of non-blacklisted tokens that needed a database lookup.', multiprocess_mode='livemax')
+BLOOM_ENTRIES = Gauge(
+    'token_blacklist_bloom_entries', 'JTIs added to the blacklist Bloom filter.', multiprocess_mode='livemax')
+BLOOM_EXPECTED_FALSE_POSITIVE_RATE = Gauge(
+    'token_blacklist_bloom_expected_false_positive_rate',
+    'False positive rate predicted from the Bloom filter size and entries.', multiprocess_mode='livemax')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Size the filter for ``capacity`` entries at ``error_rate``.
+
+        Args:
+            capacity: Expected number of entries
+            error_rate: False positive rate at ``capacity`` entries
+        """
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: position i is h1 + i * h2
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        """Add ``item``; adding an item the filter already reports is a no-op."""
+        if item in self:
+            return
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def expected_error_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class BlacklistFilter:
+    """Bloom filter of blacklisted refresh token JTIs, backed by the table."""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001,
+                 sync_interval: float = 1.0, rebuild_interval: float = 3600.0):
+        """
+        Initialize the filter; it is loaded on first use.
+
+        The filter is sized for twice the blacklisted tokens found (at least
+        ``capacity``) and rebuilt larger once it holds that many.
+
+        Args:
+            capacity: Minimum number of JTIs the filter is sized for
+            error_rate: Target false positive rate at capacity
+            sync_interval: Seconds between fetches of newly blacklisted tokens
+            rebuild_interval: Seconds between full rebuilds
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter = None
+        self._pending = None  # JTIs added while a rebuild is running
+        self._built_at = None
+        self._synced_at = None
+        self._synced_since = None
+        self._negatives = 0
+        self._false_positives = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def is_blacklisted(self, jti: str) -> bool:
+        """Return True if the token with ``jti`` is blacklisted."""
+        self._maybe_load()
+        if jti not in self._filter:
+            self._record(negative=True)
+            BLACKLIST_CHECKS.labels('negative').inc()
+            return False
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            BLACKLIST_CHECKS.labels('blacklisted').inc()
+            return True
+        self._record(negative=False)
+        BLACKLIST_CHECKS.labels('false_positive').inc()
+        return False
+
+    def add(self, jti: str):
+        """Apply a token blacklisted in this process."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(jti)
+            if self._filter is None:
+                return
+            self._filter.add(jti)
+        self._publish_size()
+
+    def rebuild(self):
+        """Rebuild the filter from the unexpired blacklisted tokens."""
+        started = time.monotonic()
+        since = timezone.now()
+        with self._lock:
+            self._pending = []
+        try:
+            jtis = list(
+                BlacklistedToken.objects.filter(token__expires_at__gt=since)
+                .values_list('token__jti', flat=True)
+            )
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for jti in self._pending:
+                bloom.add(jti)
+            self._pending = None
+            self._filter = bloom
+            self._built_at = self._synced_at = started
+            self._synced_since = since
+        self._publish_size()
+        logger.debug(f'Rebuilt token blacklist filter with {len(jtis)} JTIs')
+
+    def sync(self):
+        """Add tokens blacklisted since the previous sync, by any process."""
+        started = time.monotonic()
+        since = timezone.now()
+        jtis = list(
+            BlacklistedToken.objects.filter(blacklisted_at__gte=self._synced_since - SYNC_OVERLAP)
+            .values_list('token__jti', flat=True)
+        )
+        with self._lock:
+            for jti in jtis:
+                self._filter.add(jti)
+            self._synced_at = started
+            self._synced_since = since
+        self._publish_size()
+
+    def _maybe_load(self):
+        built_at, synced_at = self._built_at, self._synced_at
+        rebuild = True
+        if built_at is not None:
+            now = time.monotonic()
+            rebuild = now - built_at >= self.rebuild_interval or self._filter.count >= self._filter.capacity
+            if not rebuild and now - synced_at < self.sync_interval:
+                return
+        # Only the first build blocks; later ones are skipped while one runs
+        if not self._load_lock.acquire(blocking=built_at is None or self.sync_interval <= 0):
+            return
+        try:
+            if self._built_at != built_at:
+                return
+            if rebuild:
+                self.rebuild()
+            elif self._synced_at == synced_at or self.sync_interval <= 0:
+                self.sync()
+        finally:
+            self._load_lock.release()
+
+    def _record(self, negative: bool):
+        with self._lock:
+            if negative:
+                self._negatives += 1
+            else:
+                self._false_positives += 1
+            rate = self._false_positives / (self._negatives + self._false_positives)
+        BLACKLIST_FALSE_POSITIVE_RATE.set(rate)
+
+    def _publish_size(self):
+        bloom = self._filter
+        BLOOM_ENTRIES.set(bloom.count)
+        BLOOM_EXPECTED_FALSE_POSITIVE_RATE.set(bloom.expected_error_rate)
+
+
+blacklist_filter = BlacklistFilter(
+    capacity=getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000),
+    sync_interval=getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 1),
+    rebuild_interval=getattr(settings, 'TOKEN_BLACKLIST_REBUILD_INTERVAL', 3600),
+)
+
+
+class RefreshToken(BaseRefreshToken):
+    """Refresh token whose blacklist check goes through ``blacklist_filter``."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_filter.is_blacklisted(jti):
+            raise TokenError(_('Token is blacklisted'))
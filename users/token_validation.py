@@ -0,0 +1,154 @@
+"""
+Database-free access token validation.
+
+``ValidateToken`` only needs to know whether the token's user is still
+allowed in, so instead of loading the user row per call we keep the set of
+inactive (deactivated or deleted) user ids in memory:
+
+- the set is loaded from the database with one query and reloaded every
+  ``TOKEN_VALIDATION_RECONCILE_INTERVAL`` seconds, which picks up changes
+  made by other processes;
+- ``post_save``/``post_delete`` signals (see ``users.signals``) apply changes
+  made in this process immediately.
+
+Hard deletes leave no row to reload, so the ``post_delete`` handler also
+writes a ``DeletedUser`` tombstone in the deleting transaction. The reload
+reads tombstones younger than ``ACCESS_TOKEN_LIFETIME``, after which every
+token the user held has expired.
+
+Tokens whose JTI was blacklisted are rejected too, through the Bloom filter
+of ``users.token_blacklist``, which only queries the table on a match.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import DeletedUser, User
+from .token_blacklist import blacklist_filter
+
+logger = logging.getLogger(__name__)
+
+
+class InactiveUserError(Exception):
+    """Raised when a valid token belongs to a deactivated or deleted user."""
+
+
+class InactiveUserRegistry:
+    """In-memory set of user ids whose tokens must be rejected."""
+
+    def __init__(self, reconcile_interval: float = 30.0, deleted_retention: float = None):
+        """
+        Initialize the registry.
+
+        Args:
+            reconcile_interval: Seconds between reloads from the database
+            deleted_retention: Seconds to keep tombstones of deleted users
+                (default: the access token lifetime)
+        """
+        self.reconcile_interval = reconcile_interval
+        if deleted_retention is None:
+            deleted_retention = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        self.deleted_retention = deleted_retention
+        self._inactive = frozenset()
+        self._overrides = {}  # user id -> (is_inactive, recorded_at)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def is_inactive(self, user_id: str) -> bool:
+        """Return True if tokens for ``user_id`` must be rejected."""
+        self._maybe_reload()
+        override = self._overrides.get(user_id)
+        if override is not None:
+            return override[0]
+        return user_id in self._inactive
+
+    def record(self, user_id: str, is_active: bool):
+        """Apply a user save made in this process."""
+        with self._lock:
+            self._overrides[user_id] = (not is_active, time.monotonic())
+
+    def record_deleted(self, user_id: str):
+        """Apply a user delete made in this process."""
+        with self._lock:
+            self._overrides[user_id] = (True, time.monotonic())
+
+    def write_tombstone(self, user_id: str, using: str = None):
+        """
+        Record a hard delete for the reloads of every process.
+
+        Call inside the deleting transaction. Tombstones older than
+        ``deleted_retention`` are pruned at the same time.
+        """
+        now = timezone.now()
+        tombstones = DeletedUser.objects.using(using)
+        tombstones.update_or_create(user_id=user_id, defaults={'deleted_at': now})
+        tombstones.filter(deleted_at__lt=now - timedelta(seconds=self.deleted_retention)).delete()
+
+    def reload(self):
+        """Reload the inactive set (deactivated and recently deleted users) from the database."""
+        started = time.monotonic()
+        deleted_since = timezone.now() - timedelta(seconds=self.deleted_retention)
+        inactive = frozenset(
+            str(user_id) for user_id in User.objects.filter(is_active=False).values_list('id', flat=True)
+        ) | frozenset(
+            str(user_id) for user_id in DeletedUser.objects.filter(
+                deleted_at__gte=deleted_since).values_list('user_id', flat=True)
+        )
+        with self._lock:
+            self._inactive = inactive
+            # Changes recorded after the query started are newer than the snapshot
+            self._overrides = {
+                user_id: override for user_id, override in self._overrides.items()
+                if override[1] >= started
+            }
+            self._loaded_at = started
+        logger.debug(f'Reloaded {len(inactive)} inactive user ids')
+
+    def _maybe_reload(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.reconcile_interval:
+            return
+        # Only the first load blocks; later reloads are skipped while one is running
+        if not self._reload_lock.acquire(blocking=loaded_at is None):
+            return
+        try:
+            if self._loaded_at == loaded_at:
+                self.reload()
+        finally:
+            self._reload_lock.release()
+
+
+inactive_users = InactiveUserRegistry(
+    reconcile_interval=getattr(settings, 'TOKEN_VALIDATION_RECONCILE_INTERVAL', 30),
+)
+
+
+def validate_access_token(raw_token: str) -> AccessToken:
+    """
+    Verify an access token's signature, expiry, type and blacklisting without a DB query.
+
+    Returns:
+        The decoded AccessToken.
+
+    Raises:
+        rest_framework_simplejwt.exceptions.TokenError: If the token is invalid.
+        InactiveUserError: If the token's user is deactivated or deleted.
+    """
+    token = AccessToken(raw_token)
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if not user_id:
+        raise TokenError('Token contained no recognizable user identification')
+    if inactive_users.is_inactive(str(user_id)):
+        raise InactiveUserError('User account is disabled.')
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti and blacklist_filter.is_blacklisted(jti):
+        raise TokenError('Token is blacklisted')
+    return token
@@ -3,14 +3,25 @@ API views for the user service.
 """
 import logging
 from rest_framework import status, generics, permissions
+from rest_framework.exceptions import Throttled
 from rest_framework.response import Response
-from rest_framework.views import APIView
+from rest_framework.views import APIView, exception_handler as drf_exception_handler
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
+from .authentication import auth_user_cache
+from .etags import PreconditionFailed, if_match_versions, if_none_match, user_etag
+from .hashing import PasswordHashingBusy
+from .health import STARTING, UNHEALTHY, health_monitor
+from .last_login import last_login_buffer
 from .models import User
+from .pagination import UserCursorPagination
 from .serializers import (
     UserSerializer,
+    UserReadSerializer,
     UserRegistrationSerializer,
     UserLoginSerializer,
     LogoutSerializer,
@@ -21,6 +32,13 @@ from .serializers import (
 logger = logging.getLogger(__name__)
 
 
+def exception_handler(exc, context):
+    """DRF exception handler that returns a saturated password hashing pool as 429."""
+    if isinstance(exc, PasswordHashingBusy):
+        exc = Throttled(wait=exc.retry_after, detail=str(exc), code='password_hashing_busy')
+    return drf_exception_handler(exc, context)
+
+
 class RegisterView(generics.CreateAPIView):
     """User registration endpoint."""
 
@@ -32,10 +50,11 @@ class RegisterView(generics.CreateAPIView):
         """Create a new user and return tokens."""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
 
-        # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        # User and outstanding refresh token are written in one transaction
+        with transaction.atomic():
+            user = serializer.save()
+            refresh = RefreshToken.for_user(user)
 
         logger.info(f'User registered: {user.email}')
 
@@ -61,6 +80,8 @@ class LoginView(APIView):
 
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            last_login_buffer.record(user)
 
         logger.info(f'User logged in: {user.email}')
 
@@ -93,7 +114,13 @@ class LogoutView(APIView):
 
 
 class CurrentUserView(generics.RetrieveUpdateDestroyAPIView):
-    """Current user profile endpoint."""
+    """
+    Current user profile endpoint.
+
+    Responses carry the user's ETag. ``If-None-Match`` is answered with 304
+    from an ``updated_at``-only lookup, and PUT/PATCH with ``If-Match`` are
+    rejected with 412 if the user changed since the client read it.
+    """
 
     permission_classes = [permissions.IsAuthenticated]
 
@@ -101,17 +128,55 @@ class CurrentUserView(generics.RetrieveUpdateDestroyAPIView):
         """Return the current user."""
         return self.request.user
 
+    def retrieve(self, request, *args, **kwargs):
+        """Return the current user, or 304 if the client's copy is current."""
+        user = request.user
+        if request.headers.get('If-None-Match'):
+            # request.user may come from the auth cache: check the database
+            updated_at = User.objects.for_user(user.pk).filter(pk=user.pk).values_list(
+                'updated_at', flat=True).first()
+            if if_none_match(request, user.pk, updated_at):
+                return _not_modified(user.pk, updated_at)
+            if updated_at is not None and updated_at != user.updated_at:
+                auth_user_cache.invalidate(str(user.pk))
+                user.refresh_from_db()
+        response = Response(self.get_serializer(user).data)
+        response['ETag'] = user_etag(user.pk, user.updated_at)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """Update the profile; the response carries the new ETag."""
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = user_etag(request.user.pk, request.user.updated_at)
+        return response
+
+    def perform_update(self, serializer):
+        """Save the update, first claiming the row if ``If-Match`` was sent."""
+        user = serializer.instance
+        versions = if_match_versions(self.request, user.pk)
+        if versions is None:
+            serializer.save()
+            return
+        with transaction.atomic():
+            # Compare-and-set: only an unchanged row is claimed (and locked)
+            claimed = User.objects.filter(pk=user.pk, updated_at__in=versions).update(
+                updated_at=timezone.now())
+            if not claimed:
+                raise PreconditionFailed()
+            serializer.save()
+
     def get_serializer_class(self):
         """Return appropriate serializer based on request method."""
         if self.request.method in ['PUT', 'PATCH']:
             return UserUpdateSerializer
-        return UserSerializer
+        return UserReadSerializer
 
     def destroy(self, request, *args, **kwargs):
         """Soft delete the current user (deactivate)."""
         user = self.get_object()
         user.is_active = False
-        user.save()
+        # request.user may be cached or read from a replica: write only what changed
+        user.save(update_fields=['is_active', 'updated_at'])
 
         logger.info(f'User deactivated: {user.email}')
 
@@ -135,7 +200,7 @@ class ChangePasswordView(APIView):
 
         user = request.user
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        user.save(update_fields=['password', 'updated_at'])
 
         logger.info(f'Password changed for user: {user.email}')
 
@@ -145,30 +210,60 @@ class ChangePasswordView(APIView):
 
 
 class UserListView(generics.ListAPIView):
-    """List all users (admin only)."""
+    """List all users (admin only), newest first, with cursor pagination."""
 
     queryset = User.objects.filter(is_active=True)
-    serializer_class = UserSerializer
+    serializer_class = UserReadSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = UserCursorPagination
+    # Rows are rendered from values_list tuples, not model instances
+    pagination_fields = tuple(UserSerializer.Meta.fields)
 
 
 class UserDetailView(generics.RetrieveAPIView):
-    """Retrieve a specific user (admin only)."""
+    """Retrieve a specific user (admin only), with ETag / If-None-Match support."""
 
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserReadSerializer
     permission_classes = [permissions.IsAdminUser]
     lookup_field = 'id'
 
+    def get_queryset(self):
+        """Read the user from the primary if this process just wrote it."""
+        return User.objects.for_user(self.kwargs[self.lookup_field]).all()
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return the user, or 304 if the client's copy is current."""
+        if request.headers.get('If-None-Match'):
+            user_id = kwargs[self.lookup_field]
+            updated_at = self.get_queryset().filter(id=user_id).values_list('updated_at', flat=True).first()
+            if if_none_match(request, user_id, updated_at):
+                return _not_modified(user_id, updated_at)
+        user = self.get_object()
+        response = Response(self.get_serializer(user).data)
+        response['ETag'] = user_etag(user.pk, user.updated_at)
+        return response
+
 
 class HealthCheckView(APIView):
-    """Health check endpoint."""
+    """Health check endpoint, served from the cached report of ``users.health``."""
 
+    authentication_classes = []
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        """Return service health status."""
+        """Return service health status; 503 when unhealthy or still starting."""
+        report = health_monitor.report()
+        healthy = report['status'] not in (UNHEALTHY, STARTING)
         return Response({
-            'status': 'healthy',
+            'status': report['status'],
             'service': 'user-service',
-        }, status=status.HTTP_200_OK)
+            'components': report['components'],
+            'checked_at': report['checked_at'],
+        }, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def _not_modified(user_id, updated_at) -> Response:
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = user_etag(user_id, updated_at)
+    return response